@@ -8,11 +8,14 @@ import aiohttp_cors
 from aiohttp import web
 
 from api.views.v1.cache_view import InvalidateGuildCacheView
+from api.views.v1.db_pool_view import DBPoolView
 from api.views.v1.emojis_view import EmojisSyncView
 from api.views.v1.healthcheck_view import HealthcheckView
+from api.views.v1.metrics_view import MetricsView
 from api.views.v1.commands_view import CommandsView, CommandsSyncView
 from common.app_logger import AppLogger
-from common.db import session_context, get_session, execute_post_commit_actions, execute_post_rollback_actions
+from common.db import session_context, commit_session, rollback_session, execute_post_commit_actions, \
+    execute_post_rollback_actions
 from common.exceptions import APIException, APIUnauthorizedException, UserReadableException
 from settings import API_SERVICE_PORT, API_AUTH_TOKEN
 from constants import AppLogCategory
@@ -111,7 +114,7 @@ class APIService:
                 response_status_code = response.status
                 return response
             except Exception as e:
-                await get_session().rollback()
+                await rollback_session()
                 await execute_post_rollback_actions()
                 if isinstance(e, APIException):
                     return api_response(body=e.response_body(), status=e.status)
@@ -120,7 +123,7 @@ class APIService:
                 error = e
                 return api_response(body="Internal error occurred", status=500)
             finally:
-                await get_session().commit()
+                await commit_session()
                 await execute_post_commit_actions()
                 if getattr(handler, 'LOG_REQUEST', True) or error:
                     logging_method = self.logger.error if error else self.logger.info
@@ -146,5 +149,7 @@ views = [
     CommandsView,
     CommandsSyncView,
     EmojisSyncView,
-    InvalidateGuildCacheView
+    InvalidateGuildCacheView,
+    MetricsView,
+    DBPoolView
 ]
@@ -1,5 +1,6 @@
 import cache
 from api.views.base_view import APIViewV1
+from components.guild_settings_components.guild_settings_component import GuildSettingsComponent
 from utils.helpers.api_helpers import api_response
 
 
@@ -15,9 +16,9 @@ class InvalidateGuildCacheView(APIViewV1):
         """
         guild_id = self.request_body.get('guild_id')
         if guild_id:
-            cache.CACHED_GUILD_SETTINGS.pop(guild_id, None)
+            GuildSettingsComponent().invalidate_guild_settings_cache(guild_id=guild_id)
             cache.CACHED_GUILD_XP.pop(guild_id, None)
         else:
-            cache.CACHED_GUILD_SETTINGS.clear()
+            GuildSettingsComponent().invalidate_guild_settings_cache()
             cache.CACHED_GUILD_XP.clear()
         return api_response({'message': 'Guild settings and XP caches invalidated successfully'})
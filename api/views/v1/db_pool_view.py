@@ -0,0 +1,21 @@
+from api.views.base_view import APIViewV1
+from common.db import engine
+from common.db_instrumentation import get_pool_stats, get_slow_queries
+from common.metrics import get_metrics_snapshot
+from utils.helpers.api_helpers import api_response
+
+
+class DBPoolView(APIViewV1):
+    AUTH_REQUIRED = True
+    LOG_REQUEST = False
+    route = '/db_pool'
+
+    async def get(self):
+        """
+        Get live DB connection pool stats, checkout and query latencies, and the slowest statements by fingerprint.
+        """
+        return api_response({
+            'pool': get_pool_stats(engine.pool),  # noqa
+            'metrics': get_metrics_snapshot(prefix='db.'),
+            'slow_queries': get_slow_queries(),
+        })
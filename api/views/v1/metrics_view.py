@@ -0,0 +1,17 @@
+from api.views.base_view import APIViewV1
+from common.metrics import get_metrics_snapshot
+from utils.helpers.api_helpers import api_response
+
+
+class MetricsView(APIViewV1):
+    AUTH_REQUIRED = True
+    LOG_REQUEST = False
+    route = '/metrics'
+
+    async def get(self):
+        """
+        Get a snapshot of the in-memory runtime metrics.
+        Parameters:
+            - prefix (optional): Only return metrics whose names start with this prefix (e.g. 'xp.').
+        """
+        return api_response({'metrics': get_metrics_snapshot(prefix=self.request.query.get('prefix'))})
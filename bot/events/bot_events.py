@@ -6,6 +6,7 @@ import sys
 from api.api_service import APIService
 from bot import register_cogs
 from clients import discord_client, emojis, worker_manager_service
+from components.guild_settings_components.guild_settings_component import GuildSettingsComponent
 from components.guild_user_xp_components.xp_model_component import XPModelComponent
 from components.music_component import MusicComponent
 from constants import ChunkGuildsSetting, AppLogCategory
@@ -49,6 +50,11 @@ async def on_ready():
 
     await XPModelComponent().load_xp_model()
     await MusicComponent().load_radio_streams()
+    try:
+        await GuildSettingsComponent().warm_up_guild_settings_cache(guild.id for guild in discord_client.guilds)
+    except Exception as e:
+        logger.error(f"Guild settings warm-up failed, settings will be loaded lazily: {e}",
+                     category=AppLogCategory.BOT_GENERAL)
     await register_cogs()
     if SYNC_EMOJIS_ON_STARTUP:
         await sync_up_application_emojis(refetch_and_set=False)
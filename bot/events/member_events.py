@@ -5,6 +5,7 @@ import discord
 
 from bot.utils.decorators import extensible_event
 from bot.utils.bot_actions.automod_actions import apply_persistent_roles_to_member, assign_autoroles_to_member
+from bot.utils.bot_actions.xp_actions import invalidate_assignable_roles_cache
 from clients import discord_client
 from common.decorators import require_db_session
 from components.guild_settings_components.guild_user_roles_component import GuildUserRolesComponent
@@ -59,6 +60,8 @@ async def on_member_update(member_before: discord.Member, member_after: discord.
         member_after (discord.Member): The member after the update.
     """
     if member_before.id == discord_client.user.id:
+        if member_before.roles != member_after.roles:
+            invalidate_assignable_roles_cache(member_after.guild.id)  # the bot's top role may have changed
         return
     if {role.id for role in member_before.roles} != {role.id for role in member_after.roles}:
         await GuildUserRolesComponent().set_guild_user_roles(guild_id=member_after.guild.id,
@@ -1,6 +1,8 @@
 """
 This module contains event handlers for message-related events.
 """
+import time
+
 import discord
 
 from bot.utils.bot_actions.automod_actions import perform_message_automoderation
@@ -8,8 +10,10 @@ from bot.utils.bot_actions.basic_actions import delete_message
 from bot.utils.decorators import extensible_event
 from bot.utils.helpers.message_helpers import log_dm
 from clients import discord_client, xp_service
+from common import metrics
 from common.decorators import require_db_session
 from components.guild_settings_components.guild_settings_component import GuildSettingsComponent
+from models.dto.cachables import CachedGuildSettings
 from settings import OWNER_COMMAND_PREFIX, BOT_OWNER_ID
 from strings.general_strings import GeneralStrings
 from system.owner_commands import OwnerCommandsHandler
@@ -17,6 +21,12 @@ from system.owner_commands import OwnerCommandsHandler
 from common.app_logger import AppLogger
 logger: AppLogger = AppLogger('message_events')
 
+_settings_stage_histogram = metrics.histogram("message_pipeline.settings.duration_seconds")
+_music_channel_stage_histogram = metrics.histogram("message_pipeline.music_channel.duration_seconds")
+_automoderation_stage_histogram = metrics.histogram("message_pipeline.automoderation.duration_seconds")
+_xp_stage_histogram = metrics.histogram("message_pipeline.xp.duration_seconds")
+_skipped_messages_counter = metrics.counter("message_pipeline.skipped_messages")
+
 
 @discord_client.event
 @require_db_session
@@ -24,6 +34,9 @@ logger: AppLogger = AppLogger('message_events')
 async def on_message(message: discord.Message):
     """
     Event handler for new messages.
+    Guild messages go through the pipeline stages that apply to their channel (see
+    `CachedGuildSettings.get_message_stages`). The session is lazy, so a DB connection is only used by the stages (or
+    extensions) that need one.
     Args:
         message (discord.Message): The message object.
     """
@@ -39,16 +52,33 @@ async def on_message(message: discord.Message):
         log_dm(message=message)
         return
 
-    guild_settings = await GuildSettingsComponent().get_guild_settings(message.guild.id)
-    if message.channel.id == guild_settings.music_channel_id:
+    guild_settings = GuildSettingsComponent.get_cached_guild_settings(message.guild.id)
+    if not guild_settings:
+        started_at = time.perf_counter()
+        guild_settings = await GuildSettingsComponent().get_guild_settings(message.guild.id)
+        _settings_stage_histogram.observe(time.perf_counter() - started_at)
+    stages = guild_settings.get_message_stages(message.channel.id)
+
+    if stages & CachedGuildSettings.MESSAGE_STAGE_MUSIC_CHANNEL:
+        started_at = time.perf_counter()
         await delete_message(message, reason="Music channel")
+        _music_channel_stage_histogram.observe(time.perf_counter() - started_at)
 
     if message.author.bot:
         return
+    if not stages:
+        _skipped_messages_counter.increment()
+        return
 
-    await perform_message_automoderation(message)
+    if stages & CachedGuildSettings.MESSAGE_STAGES_AUTOMODERATION:
+        started_at = time.perf_counter()
+        await perform_message_automoderation(message)
+        _automoderation_stage_histogram.observe(time.perf_counter() - started_at)
 
-    await xp_service.add_message_to_queue(message)
+    if stages & CachedGuildSettings.MESSAGE_STAGE_XP_GAIN:
+        started_at = time.perf_counter()
+        await xp_service.add_message_to_queue(message)
+        _xp_stage_histogram.observe(time.perf_counter() - started_at)
 
 
 @discord_client.event
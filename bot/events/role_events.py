@@ -1,23 +1,26 @@
 """
 This module contains event handlers for role-related events.
 """
+import discord
+
+from bot.utils.bot_actions.xp_actions import invalidate_assignable_roles_cache
 from bot.utils.decorators import extensible_event
 from clients import discord_client
 
 
 @discord_client.event
 @extensible_event(group='role')
-async def on_guild_role_create(*_):
-    pass
+async def on_guild_role_create(role: discord.Role):
+    invalidate_assignable_roles_cache(role.guild.id)
 
 
 @discord_client.event
 @extensible_event(group='role')
-async def on_guild_role_delete(*_):
-    pass
+async def on_guild_role_delete(role: discord.Role):
+    invalidate_assignable_roles_cache(role.guild.id)
 
 
 @discord_client.event
 @extensible_event(group='role')
-async def on_guild_role_update(*_):
-    pass
+async def on_guild_role_update(role_before: discord.Role, _: discord.Role):
+    invalidate_assignable_roles_cache(role_before.guild.id)
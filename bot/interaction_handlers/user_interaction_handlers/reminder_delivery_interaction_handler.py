@@ -137,7 +137,7 @@ class ReminderDeliveryInteractionHandler(UserInteractionHandler):
             ephemeral=True
         )
         try:
-            await self.source_interaction.message.delete()
+            await self._remove_from_delivery_message(self.source_interaction.message)
         except:
             pass
 
@@ -153,10 +153,33 @@ class ReminderDeliveryInteractionHandler(UserInteractionHandler):
                 f"```{self.reminder.reminder_text}```"))
         try:
             await interaction.message.delete()
-            await self.source_interaction.message.delete()
+        except:
+            pass
+        try:
+            await self._remove_from_delivery_message(self.source_interaction.message)
         except:
             pass
         await interaction.response.send_message(
             embed=get_success_embed("Report submitted! It'll be taken seriously and reviewed ASAP."),
             ephemeral=True
         )
+
+    async def _remove_from_delivery_message(self, message: discord.Message):
+        """
+        Removes the reminder from its delivery message, deleting the message if it was the only reminder in it.
+        Reminders delivered together share a message, with their embeds and actions selects in the same order.
+        Args:
+            message (discord.Message): The delivery message.
+        """
+        view = discord.ui.View.from_message(message, timeout=300)
+        custom_id = f"{ReminderDeliveryAction.qualifier()}-{self.reminder_id}"
+        index = next((index for index, item in enumerate(view.children)
+                      if getattr(item, 'custom_id', None) == custom_id), None)
+        if index is None:
+            return  # already removed
+        if len(view.children) == 1:
+            await message.delete()
+            return
+        view.remove_item(view.children[index])
+        await message.edit(embeds=[embed for embed_index, embed in enumerate(message.embeds) if embed_index != index],
+                           view=view)
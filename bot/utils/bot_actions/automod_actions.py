@@ -11,7 +11,7 @@ from common.decorators import require_db_session
 from components.guild_settings_components.guild_channel_settings_component import GuildChannelSettingsComponent
 from components.guild_settings_components.guild_user_roles_component import GuildUserRolesComponent
 from components.guild_settings_components.guild_settings_component import GuildSettingsComponent
-from constants import GuildLogEvent, AutoResponseMatchType, AppLogCategory
+from constants import GuildLogEvent, AppLogCategory
 
 logger = AppLogger('automod_actions')
 
@@ -130,20 +130,7 @@ async def perform_message_automoderation(message: discord.Message) -> bool:
             if await delete_message(message, reason="Message in gallery channel without attachments."):
                 message_deleted = True
     if not message_deleted and guild_settings.auto_responses:
-        matching_auto_response = None
-        for auto_response in guild_settings.auto_responses:
-            if auto_response.match_type == AutoResponseMatchType.EXACT:
-                if auto_response.trigger.lower().strip() == message.content.lower().strip():
-                    matching_auto_response = auto_response
-                    break
-            elif auto_response.match_type == AutoResponseMatchType.CONTAINS:
-                if auto_response.trigger.lower().strip() in message.content.lower().strip():
-                    matching_auto_response = auto_response
-                    break
-            elif auto_response.match_type == AutoResponseMatchType.STARTS_WITH:
-                if message.content.lower().strip().startswith(auto_response.trigger.lower().strip()):
-                    matching_auto_response = auto_response
-                    break
+        matching_auto_response = guild_settings.get_matching_auto_response(message.content)
         if matching_auto_response:
             sent_message = await message.channel.send(matching_auto_response.response, reference=message)
             await GuildLogger(guild=message.guild).log_event(
@@ -13,6 +13,7 @@ async def send_message(
     channel: discord.abc.Messageable,
     content: str | None = None,
     embed: discord.Embed | None = None,
+    embeds: list[discord.Embed] | None = None,
     file: discord.File | None = None,
     view: discord.ui.View | None = None,
     reply_to: discord.Message | None = None,
@@ -26,6 +27,7 @@ async def send_message(
         channel (discord.abc.Messageable): The channel or user to send the message to.
         content (str | None): The content of the message. Defaults to None.
         embed (discord.Embed | None): The embed to send. Defaults to None.
+        embeds (list[discord.Embed] | None): The embeds to send, instead of a single one. Defaults to None.
         file (discord.File | None): The file to send. Defaults to None.
         view (discord.ui.View | None): The view to send. Defaults to None.
         reply_to (discord.Message | None): The message to reply to. Defaults to None.
@@ -52,6 +54,7 @@ async def send_message(
         await channel.send(
             content=content,
             embed=embed,
+            embeds=embeds,
             file=file,
             view=view,
             reference=reply_to,
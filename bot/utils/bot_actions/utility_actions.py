@@ -1,4 +1,6 @@
+from collections import OrderedDict
 from datetime import UTC, datetime, timedelta
+from typing import Iterator
 
 import aiohttp
 import discord
@@ -11,6 +13,7 @@ from bot.utils.embed_factory.reminder_embeds import get_reminder_delivery_embed
 from bot.utils.view_factory.music_views import get_music_player_view
 from bot.utils.view_factory.reminder_views import get_reminder_delivery_view
 from clients import discord_client
+from common import metrics
 from common.app_logger import AppLogger
 from common.decorators import with_retry, suppress_and_log
 from common.exceptions import UserReadableException
@@ -21,26 +24,100 @@ from models.dto.cachables import CachedReminder
 
 logger = AppLogger(component=__name__)
 
+# Discord allows 5 action rows (one reminder select each) and 6000 embed characters per message
+_MAX_REMINDERS_PER_MESSAGE = 5
+_MAX_EMBEDS_LENGTH_PER_MESSAGE = 6000
+_MAX_CACHED_DM_CHANNELS = 1000
+
+# user ID -> DM channel, least recently used first
+_dm_channels: OrderedDict[int, discord.DMChannel] = OrderedDict()
+
+_dm_channel_cache_hits_counter = metrics.counter("reminders.delivery.dm_channel_cache_hits")
+_dm_channel_cache_misses_counter = metrics.counter("reminders.delivery.dm_channel_cache_misses")
+_reminder_messages_rate = metrics.rate("reminders.delivery.messages_sent")
+
 
 @with_retry(count=3, delay=1)
-async def send_reminder_to_user(reminder: CachedReminder):
+async def get_user_dm_channel(user_id: int) -> discord.DMChannel:
     """
-    Send a reminder to a user.
+    Get the DM channel with a user, from the recently used ones if possible so repeat recipients skip fetching the
+    user and opening the DM.
     Args:
-        reminder (CachedReminder): Cacheable reminder object containing the reminder details.
+        user_id (int): ID of the user.
+    Returns:
+        discord.DMChannel: The DM channel.
     """
-    embed = get_reminder_delivery_embed(reminder=reminder)
-    view = get_reminder_delivery_view(reminder=reminder)
+    if channel := _dm_channels.get(user_id):
+        _dm_channels.move_to_end(user_id)
+        _dm_channel_cache_hits_counter.increment()
+        return channel
+    _dm_channel_cache_misses_counter.increment()
+    user = discord_client.get_user(user_id) or await discord_client.fetch_user(user_id)
+    channel = user.dm_channel or await user.create_dm()
+    _dm_channels[user_id] = channel
+    if len(_dm_channels) > _MAX_CACHED_DM_CHANNELS:
+        _dm_channels.popitem(last=False)
+    return channel
 
-    recipient = await discord_client.fetch_user(reminder.recipient_user_id)
-    await send_message(channel=recipient, embed=embed, view=view)
-    seconds_to_send = (datetime.now(UTC) - reminder.reminder_time).seconds
-    logger.info(f"Sent reminder to user {recipient.display_name} within {seconds_to_send} seconds.",
-                extras={"user_id": reminder.recipient_user_id}, category=AppLogCategory.BOT_GENERAL)
-    if seconds_to_send > 60:
-        logger.warning(f"Reminder delivery took more than 60 seconds ({seconds_to_send} seconds)"
-                       f" for reminder {reminder.user_reminder_id}.",
-                       extras={"user_id": reminder.recipient_user_id})
+
+async def send_reminders_to_user(reminders: list[CachedReminder]) -> dict[int, Exception]:
+    """
+    Send reminders due together to their recipient, in as few messages as possible.
+    Args:
+        reminders (list[CachedReminder]): Cacheable reminder objects of the same recipient.
+    Returns:
+        dict[int, Exception]: reminder ID -> error, for the reminders that could not be sent.
+    """
+    recipient_user_id = reminders[0].recipient_user_id
+    try:
+        channel = await get_user_dm_channel(user_id=recipient_user_id)
+    except Exception as e:
+        return {reminder.user_reminder_id: e for reminder in reminders}
+
+    errors = {}
+    for message_reminders, embeds in _get_reminder_delivery_messages(reminders=reminders):
+        try:
+            await _send_reminder_message(channel=channel, reminders=message_reminders, embeds=embeds)
+        except Exception as e:
+            errors.update({reminder.user_reminder_id: e for reminder in message_reminders})
+            continue
+        _reminder_messages_rate.increment()
+        for reminder in message_reminders:
+            seconds_to_send = int((datetime.now(UTC) - reminder.reminder_time).total_seconds())
+            logger.info(f"Sent reminder to user {channel.recipient} within {seconds_to_send} seconds.",
+                        extras={"user_id": recipient_user_id}, category=AppLogCategory.BOT_GENERAL)
+            if seconds_to_send > 60:
+                logger.warning(f"Reminder delivery took more than 60 seconds ({seconds_to_send} seconds)"
+                               f" for reminder {reminder.user_reminder_id}.",
+                               extras={"user_id": recipient_user_id})
+    return errors
+
+
+def _get_reminder_delivery_messages(
+    reminders: list[CachedReminder]
+) -> Iterator[tuple[list[CachedReminder], list[discord.Embed]]]:
+    """
+    Pack reminders into delivery messages, within Discord's limits on action rows and embed size per message.
+    """
+    message_reminders, embeds, embeds_length = [], [], 0
+    for reminder in reminders:
+        embed = get_reminder_delivery_embed(reminder=reminder)
+        if message_reminders and (len(message_reminders) == _MAX_REMINDERS_PER_MESSAGE
+                                  or embeds_length + len(embed) > _MAX_EMBEDS_LENGTH_PER_MESSAGE):
+            yield message_reminders, embeds
+            message_reminders, embeds, embeds_length = [], [], 0
+        message_reminders.append(reminder)
+        embeds.append(embed)
+        embeds_length += len(embed)
+    if message_reminders:
+        yield message_reminders, embeds
+
+
+@with_retry(count=3, delay=1)
+async def _send_reminder_message(channel: discord.DMChannel,
+                                 reminders: list[CachedReminder],
+                                 embeds: list[discord.Embed]):
+    await send_message(channel=channel, embeds=embeds, view=get_reminder_delivery_view(reminders=reminders))
 
 
 async def handle_reminder_delivery_failure(reminder: CachedReminder, error: Exception):
@@ -51,9 +128,9 @@ async def handle_reminder_delivery_failure(reminder: CachedReminder, error: Exce
         error (Exception): The exception that occurred during the delivery attempt.
     """
     if reminder.is_relayed:
-        reminder_owner = await discord_client.fetch_user(reminder.owner_user_id)
+        owner_channel = await get_user_dm_channel(user_id=reminder.owner_user_id)
         error_message = error.user_message if isinstance(error, UserReadableException) else None
-        await send_message(channel=reminder_owner,
+        await send_message(channel=owner_channel,
                            embed=get_error_embed(f"Failed to deliver reminder to <@!{reminder.recipient_user_id}>.\n"
                                                  f"**Reminder**: `{reminder.clean_reminder_text}`\n"
                                                  + (f"**Reason**: {error_message}" if error_message else "")),
@@ -1,20 +1,57 @@
+from typing import Iterable
+
 import discord
 
-import cache
 from bot.utils.guild_logger import GuildLogger, GuildLogEventField
 from bot.utils.helpers.moderation_helpers import bot_can_assign_role
 from clients import discord_client
 from common.app_logger import AppLogger
+from common.rate_limit import TokenBucket
 from components.guild_settings_components.guild_settings_component import GuildSettingsComponent
+from components.guild_user_xp_components.guild_user_xp_component import GuildUserXPComponent
 from constants import GuildLogEvent, XPLevelUpMessageSubstitutable, AppLogCategory
 
 logger = AppLogger(__name__)
 
+# guild_id -> role_id -> role if it exists and the bot can assign it, else None
+_assignable_roles_cache: dict[int, dict[int, discord.Role | None]] = {}
+
+
+def invalidate_assignable_roles_cache(guild_id: int):
+    """
+    Drops the cached role assignability of a guild. To be called when its roles or the bot's roles change.
+    Args:
+        guild_id (int): Guild ID.
+    """
+    _assignable_roles_cache.pop(guild_id, None)
+
+
+def _get_assignable_roles(guild: discord.Guild, role_ids: Iterable[int]) -> set[discord.Role]:
+    """
+    Resolves role IDs to the roles that exist in the guild and can be assigned by the bot.
+    Args:
+        guild (discord.Guild): Guild to resolve roles in.
+        role_ids (Iterable[int]): Role IDs to resolve.
+    Returns:
+        set[discord.Role]: Assignable roles.
+    """
+    guild_roles_cache = _assignable_roles_cache.setdefault(guild.id, {})
+    roles = set()
+    for role_id in role_ids:
+        if role_id not in guild_roles_cache:
+            role = guild.get_role(role_id)
+            guild_roles_cache[role_id] = role if role and bot_can_assign_role(role) else None
+        if role := guild_roles_cache[role_id]:
+            roles.add(role)
+    return roles
+
 
 async def handle_roles_and_level_up_message_on_level_update(guild_id: int,
                                                             user_id: int,
                                                             level_change_reason: str,
-                                                            channel_id: int | None = None):
+                                                            channel_id: int | None = None,
+                                                            level_up_message_level: int | None = None,
+                                                            rate_limiter: TokenBucket | None = None):
     """
     Handles the level role assignment and level-up message sending when a user's level is updated.
     Args:
@@ -23,6 +60,10 @@ async def handle_roles_and_level_up_message_on_level_update(guild_id: int,
         level_change_reason (str): Reason for the level change, used in logging and role edit audit.
         channel_id (int | None): channel ID that triggered the level update, if any.
             If passed, a level-up message will be sent.
+        level_up_message_level (int | None): level reached by the level-up the message is for. If passed, the message
+            is not sent if the member's level is now below it (e.g. decayed meanwhile).
+        rate_limiter (TokenBucket | None): if passed, a token is taken before each Discord API call, so updates
+            that need none (e.g. roles already held) aren't held back.
     """
     guild = discord_client.get_guild(guild_id)
     if not guild:
@@ -31,42 +72,26 @@ async def handle_roles_and_level_up_message_on_level_update(guild_id: int,
         member = guild.get_member(user_id)
     else:
         try:
+            if rate_limiter:
+                await rate_limiter.acquire()
             member = await guild.fetch_member(user_id)
         except (discord.NotFound, discord.Forbidden):
             member = None
     if not member:
         return
     xp_settings = (await GuildSettingsComponent().get_guild_settings(guild_id)).xp_settings
-    member_xp = cache.CACHED_GUILD_XP[guild_id].get_xp_for(member.id)
+    member_xp = (await GuildUserXPComponent().get_guild_xp(guild_id)).get_xp_for(member.id)
 
-    level_roles_map_member_is_eligible_for = {
-        level_role_level: role_ids for level_role_level, role_ids
-        in xp_settings.level_role_ids_map.items() if level_role_level <= member_xp.level
-    }
-    new_member_level_roles = set()
-    if level_roles_map_member_is_eligible_for:
-        if xp_settings.stack_level_roles:
-            for level_role_level, role_ids in level_roles_map_member_is_eligible_for.items():
-                new_member_level_roles.update(
-                    {guild.get_role(role_id) for role_id in role_ids if guild.get_role(role_id) and
-                     bot_can_assign_role(guild.get_role(role_id))}
-                )
-        else:
-            highest_level_role_level = max(level_roles_map_member_is_eligible_for.keys())
-            new_member_level_roles.update(
-                {guild.get_role(role_id) for role_id in level_roles_map_member_is_eligible_for[highest_level_role_level]
-                 if guild.get_role(role_id) and bot_can_assign_role(guild.get_role(role_id))}
-            )
+    new_member_level_roles = _get_assignable_roles(guild=guild,
+                                                   role_ids=xp_settings.get_level_role_ids(member_xp.level))
 
     existing_member_roles = set(member.roles)
-    new_member_roles = set(member.roles) | set(new_member_level_roles)
-
-    added_roles = set()
-    if existing_member_roles != (existing_member_roles | new_member_level_roles):
-        added_roles = new_member_roles - existing_member_roles
-        removed_roles = existing_member_roles - new_member_roles
-
-        member = await member.edit(roles=new_member_roles, reason=level_change_reason)
+    added_roles = new_member_level_roles - existing_member_roles
+    if added_roles:
+        removed_roles = set()  # level roles are only ever added
+        if rate_limiter:
+            await rate_limiter.acquire()
+        member = await member.edit(roles=existing_member_roles | added_roles, reason=level_change_reason)
         await GuildLogger(guild).log_event(event=GuildLogEvent.EDITED_ROLES,
                                            roles_deltas=(added_roles, removed_roles),
                                            member=member,
@@ -74,6 +99,7 @@ async def handle_roles_and_level_up_message_on_level_update(guild_id: int,
                                            fields=[GuildLogEventField(name='New Level',
                                                                       value=str(member_xp.level))])
     if channel_id \
+            and (level_up_message_level is None or member_xp.level >= level_up_message_level) \
             and xp_settings.level_up_message_enabled \
             and member_xp.level >= xp_settings.level_up_message_minimum_level:
         if not xp_settings.level_up_message_channel_id \
@@ -90,6 +116,8 @@ async def handle_roles_and_level_up_message_on_level_update(guild_id: int,
             if highest_role.id in xp_settings.level_role_ids_map.get(member_xp.level, []):
                 level_up_message_text += "\n" + \
                                          xp_settings.level_role_earn_message_text.format(role_name=highest_role.name)
+        if rate_limiter:
+            await rate_limiter.acquire()
         await channel.send(level_up_message_text)
         logger.info(f"Sent level-up message in guild {guild} for user {member_xp.user_username}"
                     f" on reaching level {member_xp.level}", category=AppLogCategory.BOT_GENERAL)
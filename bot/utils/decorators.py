@@ -5,7 +5,8 @@ from functools import wraps
 import discord
 
 from bot.utils.embed_factory.general_embeds import get_error_embed
-from common.db import session_context, get_session, execute_post_commit_actions, execute_post_rollback_actions
+from common.db import session_context, commit_session, rollback_session, execute_post_commit_actions, \
+    execute_post_rollback_actions
 from common.exceptions import OhanaException, ExternalServiceException, UserReadableException
 from constants import AppLogCategory
 from strings.commands_strings import GeneralCommandsStrings
@@ -82,10 +83,10 @@ def slash_command(guild_only: bool = False,
                         except Exception:
                             pass
 
-                    await get_session().rollback()
+                    await rollback_session()
                     await execute_post_rollback_actions()
                 finally:
-                    await get_session().commit()
+                    await commit_session()
                     await execute_post_commit_actions()
                     if not interaction.response.is_done() and not command_failed:
                         logger.warning(f"Slash Handler {func.__qualname__} did not respond to interaction.",
@@ -155,10 +156,10 @@ def interaction_handler():
                         except Exception:
                             pass
 
-                    await get_session().rollback()
+                    await rollback_session()
                     await execute_post_rollback_actions()
                 finally:
-                    await get_session().commit()
+                    await commit_session()
                     await execute_post_commit_actions()
                     if not interaction.response.is_done() and not command_failed:
                         logger.warning(f"Interaction Handler {func.__qualname__} did not respond to interaction.",
@@ -227,10 +228,10 @@ def context_menu_command(guild_only: bool = False):
                         except Exception:
                             pass
 
-                    await get_session().rollback()
+                    await rollback_session()
                     await execute_post_rollback_actions()
                 finally:
-                    await get_session().commit()
+                    await commit_session()
                     await execute_post_commit_actions()
                     if not interaction.response.is_done() and not command_failed:
                         logger.warning(f"Context menu command {func.__qualname__} did not respond to interaction.",
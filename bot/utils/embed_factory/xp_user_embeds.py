@@ -27,8 +27,7 @@ def get_xp_leaderboard_embed(guild: discord.Guild,
     Returns:
         discord.Embed: The generated embed.
     """
-    author_rank = guild_xp.get_rank_for(author.id,
-                                        resort_members=False)
+    author_rank = guild_xp.get_rank_for(author.id)
     members_xp_page = guild_xp.get_members_xp_page(page,
                                                    page_size=10)
 
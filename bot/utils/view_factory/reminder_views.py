@@ -17,16 +17,24 @@ if TYPE_CHECKING:
         ReminderListInteractionHandler
 
 
-def get_reminder_delivery_view(reminder: CachedReminder) -> View:
+def get_reminder_delivery_view(reminders: list[CachedReminder]) -> View:
     """
-    View for the delivery message of a reminder to the user.
+    View for the delivery message of reminders to the user, with an actions select per reminder.
     Args:
-        reminder (CachedReminder): The reminder to create the view for.
+        reminders (list[CachedReminder]): The reminders delivered in the message, at most 5 (one row each).
     Returns:
         View: The created view.
     """
     view = View(timeout=300)
+    for reminder in reminders:
+        placeholder = "Actions..."
+        if len(reminders) > 1:
+            placeholder = f"Actions for \"{shorten_text(reminder.clean_reminder_text, 100)}\"..."
+        view.add_item(_get_reminder_delivery_select(reminder=reminder, placeholder=placeholder))
+    return view
+
 
+def _get_reminder_delivery_select(reminder: CachedReminder, placeholder: str) -> Select:
     options = [SelectOption(label="Snooze 1 hour",
                             value=f"{ReminderDeliveryAction.SNOOZE_60}"),
                SelectOption(label="Snooze 12 hours",
@@ -58,14 +66,11 @@ def get_reminder_delivery_view(reminder: CachedReminder) -> View:
                 value=f"{ReminderDeliveryAction.BLOCK_ALL}"
             ))
 
-    select_view = Select(placeholder="Actions...",
-                         options=options,
-                         min_values=1,
-                         max_values=1,
-                         custom_id=f"{ReminderDeliveryAction.qualifier()}-{reminder.user_reminder_id}")
-    view.add_item(select_view)
-
-    return view
+    return Select(placeholder=placeholder,
+                  options=options,
+                  min_values=1,
+                  max_values=1,
+                  custom_id=f"{ReminderDeliveryAction.qualifier()}-{reminder.user_reminder_id}")
 
 
 def get_reminder_confirmation_view(interactions_handler: 'ReminderSetupInteractionHandler',
@@ -1,6 +1,7 @@
 """
 This module is meant to be used as cache and more generally as shared memory throughout the application.
 """
+from collections import OrderedDict
 from typing import TYPE_CHECKING, Any
 
 if TYPE_CHECKING:
@@ -9,16 +10,19 @@ if TYPE_CHECKING:
     from services import StandardResponse
     from bot.guild_music_service import GuildMusicService
     from models.dto.radio_stream import RadioStream
+    from models.dto.xp import XPLevelTable
 
 LEVEL_XP_MAP: dict[int, int] = {}  # level -> xp required to reach that level
 XP_LEVEL_MAP: dict[int, int] = {}  # xp -> level
+XP_LEVEL_TABLE: 'XPLevelTable | None' = None  # sorted XP requirements for bisect lookups, set with the XP model
 RANK_IMAGE_FONT_CACHE: dict[int, 'FreeTypeFont'] = {}  # font_size -> ImageFont
 RANK_IMAGE_ITALIC_FONT_CACHE: dict[int, 'FreeTypeFont'] = {}  # font_size -> ImageFont
 
 CACHED_WEB_RESPONSES: dict[str, 'StandardResponse'] = {}  # url -> StandardResponse
 
 CACHED_GUILD_SETTINGS: dict[int, 'CachedGuildSettings'] = {}  # guild_id -> CachedGuildSettings
-CACHED_GUILD_XP: dict[int, 'CachedGuildXP'] = {}
+CACHED_GUILD_XP: OrderedDict[int, 'CachedGuildXP'] = OrderedDict()  # guild_id -> CachedGuildXP, least recently used first
+UNSYNCED_GUILD_XP_IDS: set[int] = set()  # guild IDs with cached XP changes pending a database sync
 
 MUSIC_SERVICES: dict[int, 'GuildMusicService'] = {}  # guild_id -> GuildMusicService
 RADIO_STREAMS: dict[str, 'RadioStream'] = {}  # stream_code -> RadioStream
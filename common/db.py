@@ -6,36 +6,90 @@ from typing import Callable, Coroutine
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from contextlib import asynccontextmanager
 
-from settings import SQL_ECHO, DB_CONFIG
+from common import metrics
+from common.db_instrumentation import InstrumentedAsyncQueuePool, register_query_instrumentation
+from settings import SQL_ECHO, DB_CONFIG, DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_TIMEOUT_SECONDS, \
+    DB_POOL_RECYCLE_SECONDS, DB_POOL_PRE_PING, DB_SLOW_QUERY_THRESHOLD_MS
 
 engine = create_async_engine(
     f"{DB_CONFIG['driver']}://{DB_CONFIG['user']}:{DB_CONFIG['password']}@"
     f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/"
     f"{DB_CONFIG['database']}",
     echo=SQL_ECHO,
-    pool_size=10,
-    max_overflow=20,
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_POOL_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=DB_POOL_PRE_PING,
 )
+register_query_instrumentation(engine.sync_engine,
+                               slow_query_threshold_seconds=DB_SLOW_QUERY_THRESHOLD_MS / 1000)
+metrics.gauge("db.pool.checked_out", getter=lambda: engine.pool.checkedout())
+metrics.gauge("db.pool.overflow", getter=lambda: max(engine.pool.overflow(), 0))  # noqa
+metrics.gauge("db.pool.waiters", getter=lambda: engine.pool.waiter_count)  # noqa
 
 AsyncSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
-# Per context: (session, post_commit_actions, post_rollback_actions)
-_session_ctx: contextvars.ContextVar[tuple[AsyncSession, list[tuple], list[tuple]]] = \
-    contextvars.ContextVar("session")
+
+_session_contexts_counter = metrics.counter("db.session_contexts")
+_sessions_created_counter = metrics.counter("db.sessions_created")
+
+
+class _SessionContext:
+    """
+    State of a session context: the session, created on the first `get_session()` call only, and the actions to
+    execute once its transaction is committed or rolled back.
+    """
+    __slots__ = ('session', 'post_commit_actions', 'post_rollback_actions')
+
+    def __init__(self):
+        self.session: AsyncSession | None = None
+        self.post_commit_actions: list[tuple] = []
+        self.post_rollback_actions: list[tuple] = []
+
+
+_session_ctx: contextvars.ContextVar[_SessionContext] = contextvars.ContextVar("session")
 
 
 @asynccontextmanager
 async def session_context():
-    async with AsyncSessionLocal() as session:
-        token = _session_ctx.set((session, [], []))
-        try:
-            yield session
-        finally:
-            _session_ctx.reset(token)
-            await session.close()
+    """
+    Context in which `get_session()` returns the same session. No session (nor pooled connection) is created unless
+    something in the context actually asks for it.
+    """
+    session_ctx = _SessionContext()
+    token = _session_ctx.set(session_ctx)
+    _session_contexts_counter.increment()
+    try:
+        yield
+    finally:
+        _session_ctx.reset(token)
+        if session_ctx.session is not None:
+            await session_ctx.session.close()
 
 
 def get_session() -> AsyncSession:
-    return _session_ctx.get()[0]
+    session_ctx = _session_ctx.get()
+    if session_ctx.session is None:
+        session_ctx.session = AsyncSessionLocal()
+        _sessions_created_counter.increment()
+    return session_ctx.session
+
+
+async def commit_session():
+    """
+    Commits the current context's session, if one was created.
+    """
+    if (session := _session_ctx.get().session) is not None:
+        await session.commit()
+
+
+async def rollback_session():
+    """
+    Rolls back the current context's session, if one was created.
+    """
+    if (session := _session_ctx.get().session) is not None:
+        await session.rollback()
 
 
 def add_post_commit_action(action: Callable | Coroutine, **params):
@@ -44,22 +98,20 @@ def add_post_commit_action(action: Callable | Coroutine, **params):
     Args:
         action: A callable that will be executed after commit.
     """
-    session, post_commit_actions, post_rollback_actions = _session_ctx.get()
-    post_commit_actions.append((action, params or {}))
-    _session_ctx.set((session, post_commit_actions, post_rollback_actions))
+    _session_ctx.get().post_commit_actions.append((action, params or {}))
 
 
 async def execute_post_commit_actions():
     """
     Executes all actions that were added to the session context after the transaction is committed.
     """
-    session, post_commit_actions, post_rollback_actions = _session_ctx.get()
+    session_ctx = _session_ctx.get()
+    post_commit_actions, session_ctx.post_commit_actions = session_ctx.post_commit_actions, []
     for action, params in post_commit_actions:
         if not inspect.iscoroutinefunction(action):
             action(**params)
         else:
             await action(**params)
-    _session_ctx.set((session, [], post_rollback_actions))
 
 
 def add_post_rollback_action(action: Callable | Coroutine, **params):
@@ -70,19 +122,18 @@ def add_post_rollback_action(action: Callable | Coroutine, **params):
     Returns:
 
     """
-    session, post_commit_actions, post_rollback_actions = _session_ctx.get()
-    post_rollback_actions.append((action, params or {}))
-    _session_ctx.set((session, post_commit_actions, post_rollback_actions))
+    _session_ctx.get().post_rollback_actions.append((action, params or {}))
 
 
 async def execute_post_rollback_actions():
     """
     Executes all actions that were added to the session context after the transaction is rolled back.
     """
-    session, post_commit_actions, post_rollback_actions = _session_ctx.get()
+    session_ctx = _session_ctx.get()
+    post_rollback_actions = session_ctx.post_rollback_actions
+    session_ctx.post_commit_actions, session_ctx.post_rollback_actions = [], []
     for action, params in post_rollback_actions:
         if not inspect.iscoroutinefunction(action):
             action(**params)
         else:
             await action(**params)
-    _session_ctx.set((session, [], []))
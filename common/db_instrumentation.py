@@ -0,0 +1,147 @@
+"""
+Connection pool and query instrumentation for the DB engine.
+"""
+import re
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from common import metrics
+
+_MAX_SLOW_QUERY_FINGERPRINTS = 200
+_MAX_FINGERPRINT_LENGTH = 500
+
+_checkout_duration_histogram = metrics.histogram("db.pool.checkout_duration_seconds")
+_checkout_timeouts_counter = metrics.counter("db.pool.checkout_timeouts")
+_query_duration_histogram = metrics.histogram("db.query.duration_seconds")
+_slow_queries_counter = metrics.counter("db.query.slow_queries")
+
+_STRING_LITERAL_PATTERN = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_LITERAL_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\b")
+_VALUE_LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUE_ROWS_PATTERN = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_PLACEHOLDER_PATTERN = re.compile(r"%s|%\(\w+\)s|:\w+")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# fingerprint -> {count, total_seconds, max_seconds, last_seen_at}, least recently seen first
+_slow_queries: OrderedDict[str, dict] = OrderedDict()
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Async queue pool that tracks how many callers are currently checking out (waiting for) a connection and how long
+    checkouts take.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiter_count: int = 0
+
+    def _do_get(self):
+        self.waiter_count += 1
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            _checkout_timeouts_counter.increment()
+            raise
+        finally:
+            self.waiter_count -= 1
+            _checkout_duration_histogram.observe(time.perf_counter() - started_at)
+
+
+def get_statement_fingerprint(statement: str) -> str:
+    """
+    Normalize a SQL statement so that executions differing only by their values share one fingerprint.
+    Args:
+        statement (str): SQL statement.
+
+    Returns:
+        str: the statement with literals and placeholders replaced by `?`, value lists collapsed and whitespace
+            squashed.
+    """
+    fingerprint = _STRING_LITERAL_PATTERN.sub("?", statement)
+    fingerprint = _PLACEHOLDER_PATTERN.sub("?", fingerprint)
+    fingerprint = _NUMBER_LITERAL_PATTERN.sub("?", fingerprint)
+    fingerprint = _VALUE_LIST_PATTERN.sub("(?)", fingerprint)
+    fingerprint = _VALUE_ROWS_PATTERN.sub("(?)", fingerprint)
+    return _WHITESPACE_PATTERN.sub(" ", fingerprint).strip()[:_MAX_FINGERPRINT_LENGTH]
+
+
+def register_query_instrumentation(engine: Engine, slow_query_threshold_seconds: float):
+    """
+    Time every statement executed by the engine, recording the ones slower than the threshold by fingerprint.
+    Args:
+        engine (Engine): sync engine (`AsyncEngine.sync_engine` for async engines).
+        slow_query_threshold_seconds (float): duration above which a statement is recorded as slow.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # noqa
+        # kept on the execution context, so a failed statement's start time is dropped along with it
+        context.query_started_at = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # noqa
+        duration = time.perf_counter() - context.query_started_at
+        _query_duration_histogram.observe(duration)
+        if duration >= slow_query_threshold_seconds:
+            _record_slow_query(statement=statement, duration=duration)
+
+
+def _record_slow_query(statement: str, duration: float):
+    _slow_queries_counter.increment()
+    fingerprint = get_statement_fingerprint(statement)
+    if not (stats := _slow_queries.get(fingerprint)):
+        stats = _slow_queries[fingerprint] = {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+        if len(_slow_queries) > _MAX_SLOW_QUERY_FINGERPRINTS:
+            _slow_queries.popitem(last=False)
+    else:
+        _slow_queries.move_to_end(fingerprint)
+    stats['count'] += 1
+    stats['total_seconds'] += duration
+    stats['max_seconds'] = max(stats['max_seconds'], duration)
+    stats['last_seen_at'] = time.time()
+
+
+def get_slow_queries() -> list[dict]:
+    """
+    Get the recorded slow statements, slowest in total first.
+    Returns:
+        list[dict]: fingerprint, count, total/average/max duration in seconds and last time seen (epoch seconds).
+    """
+    return sorted(
+        (
+            {
+                'fingerprint': fingerprint,
+                'count': stats['count'],
+                'total_seconds': round(stats['total_seconds'], 4),
+                'average_seconds': round(stats['total_seconds'] / stats['count'], 4),
+                'max_seconds': round(stats['max_seconds'], 4),
+                'last_seen_at': stats['last_seen_at'],
+            } for fingerprint, stats in _slow_queries.items()
+        ),
+        key=lambda slow_query: slow_query['total_seconds'],
+        reverse=True
+    )
+
+
+def get_pool_stats(pool: InstrumentedAsyncQueuePool) -> dict:
+    """
+    Get live stats of a connection pool.
+    Args:
+        pool (InstrumentedAsyncQueuePool): the pool.
+
+    Returns:
+        dict: configured size and overflow, and current checked in/out, overflow and waiting counts.
+    """
+    return {
+        'size': pool.size(),
+        'max_overflow': pool._max_overflow,  # noqa
+        'timeout_seconds': pool.timeout(),
+        'checked_in': pool.checkedin(),
+        'checked_out': pool.checkedout(),
+        'overflow': max(pool.overflow(), 0),
+        'waiters': pool.waiter_count,
+    }
@@ -191,16 +191,16 @@ def require_db_session(coro: coroutine):
     """
     @wraps(coro)
     async def wrapper(*args, **kwargs):
-        from common.db import session_context, get_session
+        from common.db import session_context, commit_session, rollback_session
         async with session_context():
             try:
                 return await coro(*args, **kwargs)
             except Exception as e:
-                await get_session().rollback()
+                await rollback_session()
                 await execute_post_rollback_actions()
                 raise e
             finally:
-                await get_session().commit()
+                await commit_session()
                 await execute_post_commit_actions()
 
     return wrapper
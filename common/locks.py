@@ -0,0 +1,72 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class ReadWriteLock:
+    """
+    Asyncio reader/writer lock. Any number of readers can hold the lock at the same time, while a writer holds it
+    exclusively. A waiting writer blocks new readers so a steady stream of readers cannot starve it.
+    """
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self._reader_count: int = 0
+        self._writer_active: bool = False
+        self._waiting_writer_count: int = 0
+
+    @property
+    def reader_count(self) -> int:
+        return self._reader_count
+
+    @property
+    def writer_active(self) -> bool:
+        return self._writer_active
+
+    async def acquire_read(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._writer_active and not self._waiting_writer_count)
+            self._reader_count += 1
+
+    async def release_read(self):
+        async with self._condition:
+            self._reader_count -= 1
+            if not self._reader_count:
+                self._condition.notify_all()
+
+    async def acquire_write(self):
+        async with self._condition:
+            self._waiting_writer_count += 1
+            try:
+                await self._condition.wait_for(lambda: not self._writer_active and not self._reader_count)
+            except asyncio.CancelledError:
+                self._waiting_writer_count -= 1
+                self._condition.notify_all()  # readers may have been held back by this writer only
+                raise
+            self._waiting_writer_count -= 1
+            self._writer_active = True
+
+    async def release_write(self):
+        async with self._condition:
+            self._writer_active = False
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def read(self):
+        """
+        Hold the lock in shared (reader) mode for the duration of the context.
+        """
+        await self.acquire_read()
+        try:
+            yield
+        finally:
+            await self.release_read()
+
+    @asynccontextmanager
+    async def write(self):
+        """
+        Hold the lock in exclusive (writer) mode for the duration of the context.
+        """
+        await self.acquire_write()
+        try:
+            yield
+        finally:
+            await self.release_write()
@@ -0,0 +1,154 @@
+"""
+In-memory runtime metrics (counters, rates, gauges and histograms), exposed through the management API.
+Metrics are registered lazily by name and live for the lifetime of the process.
+"""
+import time
+from collections import deque
+from typing import Callable
+
+_metrics: dict[str, 'BaseMetric'] = {}
+
+
+class BaseMetric:
+    def __init__(self, name: str, description: str | None = None):
+        self.name: str = name
+        self.description: str | None = description
+
+    def snapshot(self) -> dict | int | float:
+        raise NotImplementedError
+
+
+class Counter(BaseMetric):
+    """
+    Monotonically increasing counter.
+    """
+    def __init__(self, name: str, description: str | None = None):
+        super().__init__(name=name, description=description)
+        self.value: int = 0
+
+    def increment(self, amount: int = 1):
+        self.value += amount
+
+    def snapshot(self) -> int:
+        return self.value
+
+
+class Rate(BaseMetric):
+    """
+    Counter that also keeps per-second buckets for the last `window` seconds to report a moving rate.
+    """
+    def __init__(self, name: str, description: str | None = None, window: int = 60):
+        super().__init__(name=name, description=description)
+        self.total: int = 0
+        self.window: int = window
+        self._buckets: deque[list[int]] = deque()  # [second, count]
+
+    def increment(self, amount: int = 1):
+        self.total += amount
+        now = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == now:
+            self._buckets[-1][1] += amount
+        else:
+            self._buckets.append([now, amount])
+        self._evict(now)
+
+    def _evict(self, now: int):
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+
+    @property
+    def per_second(self) -> float:
+        self._evict(int(time.monotonic()))
+        return sum(count for _, count in self._buckets) / self.window
+
+    def snapshot(self) -> dict:
+        return {"total": self.total, "per_second": round(self.per_second, 3)}
+
+
+class Gauge(BaseMetric):
+    """
+    Point-in-time value. Either set explicitly or computed on read through `getter`.
+    """
+    def __init__(self, name: str, description: str | None = None, getter: Callable[[], int | float] | None = None):
+        super().__init__(name=name, description=description)
+        self.getter: Callable[[], int | float] | None = getter
+        self.value: int | float = 0
+
+    def set(self, value: int | float):
+        self.value = value
+
+    def snapshot(self) -> int | float:
+        return self.getter() if self.getter else self.value
+
+
+class Histogram(BaseMetric):
+    """
+    Keeps the latest `max_samples` observations and reports count, sum and percentiles over them.
+    """
+    def __init__(self, name: str, description: str | None = None, max_samples: int = 1024):
+        super().__init__(name=name, description=description)
+        self.count: int = 0
+        self.sum: float = 0
+        self._samples: deque[float] = deque(maxlen=max_samples)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self._samples.append(value)
+
+    def snapshot(self) -> dict:
+        if not self._samples:
+            return {"count": self.count, "sum": self.sum}
+        sorted_samples = sorted(self._samples)
+
+        def _percentile(percentile: float) -> float:
+            return round(sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * percentile / 100))], 6)
+
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": round(sorted_samples[0], 6),
+            "max": round(sorted_samples[-1], 6),
+            "p50": _percentile(50),
+            "p90": _percentile(90),
+            "p99": _percentile(99),
+        }
+
+
+def _get_or_create(metric_class: type, name: str, **kwargs) -> BaseMetric:
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = metric_class(name=name, **kwargs)
+    elif not isinstance(metric, metric_class):
+        raise TypeError(f"Metric {name} is already registered as {metric.__class__.__name__}.")
+    return metric
+
+
+def counter(name: str, description: str | None = None) -> Counter:
+    return _get_or_create(Counter, name, description=description)  # type: ignore
+
+
+def rate(name: str, description: str | None = None, window: int = 60) -> Rate:
+    return _get_or_create(Rate, name, description=description, window=window)  # type: ignore
+
+
+def gauge(name: str, description: str | None = None, getter: Callable[[], int | float] | None = None) -> Gauge:
+    return _get_or_create(Gauge, name, description=description, getter=getter)  # type: ignore
+
+
+def histogram(name: str, description: str | None = None, max_samples: int = 1024) -> Histogram:
+    return _get_or_create(Histogram, name, description=description, max_samples=max_samples)  # type: ignore
+
+
+def get_metrics_snapshot(prefix: str | None = None) -> dict[str, dict | int | float]:
+    """
+    Returns a snapshot of all registered metrics.
+    Args:
+        prefix (str | None): If provided, only metrics whose names start with it are included.
+    Returns:
+        dict: metric name -> metric snapshot.
+    """
+    return {
+        name: metric.snapshot() for name, metric in sorted(_metrics.items())
+        if not prefix or name.startswith(prefix)
+    }
@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket. Allows bursts of up to `capacity` acquisitions, refilled at `rate` tokens per second.
+    """
+    def __init__(self, rate: float, capacity: int):
+        self.rate: float = rate
+        self.capacity: int = capacity
+        self._tokens: float = capacity
+        self._last_refill: float = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    @property
+    def is_full(self) -> bool:
+        """
+        Whether the bucket has refilled to capacity, behaving like a new one.
+        """
+        self._refill()
+        return self._tokens >= self.capacity
+
+    async def acquire(self):
+        """
+        Take a token, waiting for one to be refilled if the bucket is empty.
+        """
+        self._refill()
+        while self._tokens < 1:
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+            self._refill()
+        self._tokens -= 1
@@ -0,0 +1,195 @@
+from bisect import bisect_left, insort
+from itertools import chain
+from typing import Any, Iterable, Iterator
+
+
+class SortedList:
+    """
+    List that keeps its values sorted, split into bounded sublists so that inserts and removals only shift a small
+    sublist. A Fenwick tree over the sublist lengths resolves positions, making `add`, `remove`, `index` and
+    positional access O(log n) (plus a memmove bounded by the sublist size).
+    Values are expected to be unique and totally ordered (e.g. tuples ending with an ID).
+    """
+    def __init__(self, iterable: Iterable = (), load: int = 1000):
+        self._load: int = load
+        self._len: int = 0
+        self._lists: list[list] = []
+        self._maxes: list = []
+        self._index_tree: list[int] = [0]
+
+        values = sorted(iterable)
+        for start in range(0, len(values), load):
+            sublist = values[start:start + load]
+            self._lists.append(sublist)
+            self._maxes.append(sublist[-1])
+        self._len = len(values)
+        self._rebuild_index()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(self._lists)
+
+    def __contains__(self, value: Any) -> bool:
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return False
+        sublist = self._lists[pos]
+        idx = bisect_left(sublist, value)
+        return idx < len(sublist) and sublist[idx] == value
+
+    def __getitem__(self, index: int | slice) -> Any | list:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return list(self)[index]
+            return self._slice(start, stop)
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("SortedList index out of range")
+        pos, offset = self._locate(index)
+        return self._lists[pos][offset]
+
+    def add(self, value: Any) -> None:
+        """
+        Insert a value in its sorted position.
+        """
+        if not self._maxes:
+            self._lists.append([value])
+            self._maxes.append(value)
+            self._len = 1
+            self._rebuild_index()
+            return
+
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._lists[pos].append(value)
+            self._maxes[pos] = value
+        else:
+            insort(self._lists[pos], value)
+        self._len += 1
+
+        sublist = self._lists[pos]
+        if len(sublist) > self._load * 2:
+            upper_half = sublist[self._load:]
+            del sublist[self._load:]
+            self._maxes[pos] = sublist[-1]
+            self._lists.insert(pos + 1, upper_half)
+            self._maxes.insert(pos + 1, upper_half[-1])
+            self._rebuild_index()
+        else:
+            self._update_index(pos, 1)
+
+    def remove(self, value: Any) -> None:
+        """
+        Remove a value. Raises ValueError if it is not present.
+        """
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            raise ValueError(f"{value} is not in SortedList")
+        sublist = self._lists[pos]
+        idx = bisect_left(sublist, value)
+        if idx == len(sublist) or sublist[idx] != value:
+            raise ValueError(f"{value} is not in SortedList")
+        del sublist[idx]
+        self._len -= 1
+
+        if not sublist:
+            del self._lists[pos]
+            del self._maxes[pos]
+            self._rebuild_index()
+        else:
+            self._maxes[pos] = sublist[-1]
+            self._update_index(pos, -1)
+
+    def discard(self, value: Any) -> None:
+        """
+        Remove a value if present.
+        """
+        if value in self:
+            self.remove(value)
+
+    def index(self, value: Any) -> int:
+        """
+        Return the position of a value. Raises ValueError if it is not present.
+        """
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            raise ValueError(f"{value} is not in SortedList")
+        sublist = self._lists[pos]
+        idx = bisect_left(sublist, value)
+        if idx == len(sublist) or sublist[idx] != value:
+            raise ValueError(f"{value} is not in SortedList")
+        return self._prefix_length(pos) + idx
+
+    def bisect_left(self, value: Any) -> int:
+        """
+        Return the position at which the value would be inserted (before any equal values).
+        """
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return self._len
+        return self._prefix_length(pos) + bisect_left(self._lists[pos], value)
+
+    def _slice(self, start: int, stop: int) -> list:
+        if start >= stop:
+            return []
+        values = []
+        pos, offset = self._locate(start)
+        remaining = stop - start
+        while remaining and pos < len(self._lists):
+            chunk = self._lists[pos][offset:offset + remaining]
+            values.extend(chunk)
+            remaining -= len(chunk)
+            pos += 1
+            offset = 0
+        return values
+
+    def _rebuild_index(self) -> None:
+        size = len(self._lists)
+        tree = [0] * (size + 1)
+        for i, sublist in enumerate(self._lists, 1):
+            tree[i] += len(sublist)
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._index_tree = tree
+
+    def _update_index(self, pos: int, delta: int) -> None:
+        tree = self._index_tree
+        i = pos + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix_length(self, pos: int) -> int:
+        """
+        Total number of values in the sublists before `pos`.
+        """
+        tree = self._index_tree
+        total = 0
+        i = pos
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        """
+        Resolve a flat index into (sublist position, offset within sublist).
+        """
+        tree = self._index_tree
+        size = len(tree) - 1
+        pos = 0
+        remaining = index
+        bit = 1 << (size.bit_length() - 1) if size else 0
+        while bit:
+            next_pos = pos + bit
+            if next_pos <= size and tree[next_pos] <= remaining:
+                pos = next_pos
+                remaining -= tree[next_pos]
+            bit >>= 1
+        return pos, remaining
@@ -0,0 +1,81 @@
+from typing import Hashable, Iterator
+
+from common.sorted_list import SortedList
+
+
+class TimerIndex:
+    """
+    Keyed timers ordered by due time (epoch seconds). Scheduling, rescheduling and cancelling a key are O(log n), so a
+    single timer can be updated without rebuilding the whole index. Keys must be unique and mutually comparable
+    (e.g. IDs), as ties in due time are ordered by key.
+    """
+    def __init__(self):
+        self._timers: SortedList = SortedList()  # (due_at, key)
+        self._due_at_by_key: dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._due_at_by_key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._due_at_by_key
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._due_at_by_key)
+
+    def schedule(self, key: Hashable, due_at: float) -> bool:
+        """
+        Schedule a timer, replacing the key's current one if any.
+        Args:
+            key (Hashable): timer key.
+            due_at (float): due time in epoch seconds.
+
+        Returns:
+            bool: whether the key was not scheduled before.
+        """
+        if (current_due_at := self._due_at_by_key.get(key)) is not None:
+            if current_due_at == due_at:
+                return False
+            self._timers.remove((current_due_at, key))
+        self._due_at_by_key[key] = due_at
+        self._timers.add((due_at, key))
+        return current_due_at is None
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Cancel a key's timer.
+        Args:
+            key (Hashable): timer key.
+
+        Returns:
+            bool: whether the key was scheduled.
+        """
+        if (due_at := self._due_at_by_key.pop(key, None)) is None:
+            return False
+        self._timers.remove((due_at, key))
+        return True
+
+    def get_due_at(self, key: Hashable) -> float | None:
+        return self._due_at_by_key.get(key)
+
+    def peek(self) -> tuple[float, Hashable] | None:
+        """
+        Returns:
+            tuple[float, Hashable] | None: due time and key of the earliest timer, None if there are no timers.
+        """
+        return self._timers[0] if self._timers else None
+
+    def pop_due(self, now: float) -> list[Hashable]:
+        """
+        Remove and return the keys of all timers due at or before a time.
+        Args:
+            now (float): time in epoch seconds.
+
+        Returns:
+            list[Hashable]: due keys, earliest first.
+        """
+        due_keys = []
+        while self._timers and (earliest := self._timers[0])[0] <= now:
+            self._timers.remove(earliest)
+            del self._due_at_by_key[earliest[1]]
+            due_keys.append(earliest[1])
+        return due_keys
@@ -0,0 +1,124 @@
+from typing import Iterable
+
+from constants import AutoResponseMatchType
+
+_NO_MATCH = float('inf')
+# Below this many CONTAINS triggers, C-level substring checks of the (pre-normalized) triggers beat a per-character
+# automaton scan in Python
+_MIN_AUTOMATON_TRIGGERS = 40
+
+
+class TriggerMatcher:
+    """
+    Compiled set of case-insensitive text triggers, each with an `AutoResponseMatchType`. Matching returns the position
+    of the first trigger (in the given order) that matches, like checking them one by one would, but in one pass per
+    match type: a dict lookup for EXACT, a walk down a prefix trie for STARTS_WITH and an Aho-Corasick scan for
+    CONTAINS (plain substring checks when there are only a few). Both triggers and text are lowercased and stripped,
+    as when checking them one by one.
+    """
+    def __init__(self, triggers: Iterable[tuple[str, str]]):
+        """
+        Args:
+            triggers (Iterable[tuple[str, str]]): (trigger text, AutoResponseMatchType) pairs, in priority order.
+        """
+        self._exact: dict[str, int] = {}
+        # Trie and automaton nodes are list indexes, node 0 being the root. `_*_priorities` holds the position of the
+        # first trigger ending at each node (for the automaton, also via its fail links) or _NO_MATCH.
+        self._prefix_children: list[dict[str, int]] = [{}]
+        self._prefix_priorities: list[float] = [_NO_MATCH]
+        self._contains_children: list[dict[str, int]] = [{}]
+        self._contains_priorities: list[float] = [_NO_MATCH]
+        self._contains_fails: list[int] = [0]
+        self._contains_triggers: list[tuple[str, int]] = []
+
+        for priority, (trigger, match_type) in enumerate(triggers):
+            trigger = trigger.lower().strip()
+            if match_type == AutoResponseMatchType.EXACT:
+                self._exact.setdefault(trigger, priority)
+            elif match_type == AutoResponseMatchType.STARTS_WITH:
+                self._insert(self._prefix_children, self._prefix_priorities, trigger, priority)
+            elif match_type == AutoResponseMatchType.CONTAINS:
+                self._contains_triggers.append((trigger, priority))
+        self._has_prefix_triggers: bool = len(self._prefix_children) > 1 or self._prefix_priorities[0] != _NO_MATCH
+        self._use_automaton: bool = len(self._contains_triggers) >= _MIN_AUTOMATON_TRIGGERS
+        if self._use_automaton:
+            for trigger, priority in self._contains_triggers:
+                self._insert(self._contains_children, self._contains_priorities, trigger, priority)
+            self._contains_triggers.clear()
+            self._build_fail_links()
+
+    @staticmethod
+    def _insert(children: list[dict[str, int]], priorities: list[float], trigger: str, priority: int) -> None:
+        node = 0
+        for char in trigger:
+            next_node = children[node].get(char)
+            if next_node is None:
+                next_node = children[node][char] = len(children)
+                children.append({})
+                priorities.append(_NO_MATCH)
+            node = next_node
+        priorities[node] = min(priorities[node], priority)
+
+    def _build_fail_links(self) -> None:
+        """
+        Breadth-first pass linking each automaton node to its longest proper suffix that is also a trie path, and
+        folding the priorities of the triggers ending at that suffix into the node's own.
+        """
+        children = self._contains_children
+        priorities = self._contains_priorities
+        fails = self._contains_fails = [0] * len(children)
+        queue = list(children[0].values())  # depth 1 nodes fail to the root
+        for node in queue:  # the queue grows while iterating
+            for char, child in children[node].items():
+                fail = fails[node]
+                while fail and char not in children[fail]:
+                    fail = fails[fail]
+                fails[child] = children[fail].get(char, 0)
+                priorities[child] = min(priorities[child], priorities[fails[child]])
+                queue.append(child)
+
+    def match(self, text: str) -> int | None:
+        """
+        Find the first trigger matching the text.
+        Args:
+            text (str): text to match, e.g. message content.
+
+        Returns:
+            int | None: position of the first matching trigger in the triggers given on creation, or None.
+        """
+        text = text.lower().strip()
+        best = self._exact.get(text, _NO_MATCH)
+
+        if self._has_prefix_triggers:
+            children = self._prefix_children
+            priorities = self._prefix_priorities
+            node = 0
+            best = min(best, priorities[0])
+            for char in text:
+                node = children[node].get(char)
+                if node is None:
+                    break
+                if priorities[node] < best:
+                    best = priorities[node]
+
+        if self._use_automaton:
+            children = self._contains_children
+            priorities = self._contains_priorities
+            fails = self._contains_fails
+            node = 0
+            best = min(best, priorities[0])
+            for char in text:
+                while node and char not in children[node]:
+                    node = fails[node]
+                node = children[node].get(char, 0)
+                if priorities[node] < best:
+                    best = priorities[node]
+        else:
+            for trigger, priority in self._contains_triggers:  # in priority order
+                if priority >= best:
+                    break
+                if trigger in text:
+                    best = priority
+                    break
+
+        return None if best == _NO_MATCH else int(best)
@@ -1,4 +1,8 @@
+import time
+
+from common.db import add_post_commit_action, add_post_rollback_action
 from components import BaseComponent
+from models.dto.cachables import CachedGuildSettings
 
 
 class BaseGuildSettingsComponent(BaseComponent):
@@ -9,3 +13,16 @@ class BaseGuildSettingsComponent(BaseComponent):
         if cls is BaseGuildSettingsComponent:
             raise TypeError("BaseGuildSettingsComponent is an abstract class and cannot be instantiated directly.")
         return super().__new__(cls)
+
+    @staticmethod
+    def mark_guild_settings_changed(guild_settings: CachedGuildSettings):
+        """
+        To be called when cached guild settings are updated along with a DB write in the current session. Background
+        refreshes that started before the write, or before its commit, won't overwrite the update, and a rolled back
+        update is refreshed from the DB on next access.
+        Args:
+            guild_settings (CachedGuildSettings): The updated cached settings.
+        """
+        guild_settings.mark_changed()
+        add_post_commit_action(guild_settings.mark_changed, written_at=time.monotonic())
+        add_post_rollback_action(guild_settings.mark_stale)
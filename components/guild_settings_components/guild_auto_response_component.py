@@ -33,6 +33,7 @@ class GuildAutoResponseComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Adding auto response for guild {guild_id}.")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         if guild_settings.get_auto_response(trigger=trigger_text):
             raise ValueError(f"Trigger text '{trigger_text}' already exists in guild {guild_id} auto responses.")
         guild_auto_responses_repo = GuildAutoResponseRepo(session=get_session())
@@ -69,6 +70,7 @@ class GuildAutoResponseComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Updating auto response {guild_auto_response_id}.")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id=guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         auto_response = guild_settings.get_auto_response(guild_auto_response_id=guild_auto_response_id)
         update_data = {}
         if trigger_text is not NOT_SET:
@@ -82,6 +84,8 @@ class GuildAutoResponseComponent(BaseGuildSettingsComponent):
         if match_type is not NOT_SET:
             update_data['match_type'] = match_type
             auto_response.match_type = match_type
+        if trigger_text is not NOT_SET or match_type is not NOT_SET:
+            guild_settings.invalidate_auto_response_matcher()
         if delete_original is not NOT_SET:
             update_data['delete_original'] = delete_original
             auto_response.delete_original = delete_original
@@ -106,6 +110,7 @@ class GuildAutoResponseComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Removing auto response {guild_auto_response_id} from guild {guild_id}.")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id=guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         auto_response = guild_settings.get_auto_response(guild_auto_response_id=guild_auto_response_id)
         if not auto_response:
             raise ValueError(f"Auto response with ID {guild_auto_response_id} does not exist in guild {guild_id}.")
@@ -122,8 +127,9 @@ class GuildAutoResponseComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Clearing all auto responses for guild {guild_id}.")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id=guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         if not guild_settings.auto_responses:
             return
         guild_auto_responses_repo = GuildAutoResponseRepo(session=get_session())
         await guild_auto_responses_repo.delete_guild_auto_responses(guild_settings_id=guild_settings.guild_settings_id)
-        guild_settings.auto_responses.clear()
+        guild_settings.clear_auto_responses()
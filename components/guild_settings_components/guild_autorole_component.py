@@ -18,6 +18,7 @@ class GuildAutoroleComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Adding autorole {role_id} to guild {guild_id}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         if role_id in guild_settings.autoroles_ids:
             return
         guild_settings.autoroles_ids.append(role_id)
@@ -36,6 +37,7 @@ class GuildAutoroleComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Removing autorole {role_id} from guild {guild_id}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         if role_id not in guild_settings.autoroles_ids:
             return
         guild_settings.autoroles_ids.remove(role_id)
@@ -53,6 +55,7 @@ class GuildAutoroleComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Clearing all autoroles for guild {guild_id}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         if not guild_settings.autoroles_ids:
             return
         guild_settings.autoroles_ids.clear()
@@ -33,6 +33,7 @@ class GuildChannelSettingsComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Setting guild channel settings for guild_id: {guild_id}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         guild_channel_settings_repo = GuildChannelSettingsRepo(session=get_session())
 
         update_data = {}
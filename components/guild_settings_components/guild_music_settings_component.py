@@ -48,6 +48,7 @@ class GuildMusicSettingsComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Updating music settings for guild_id: {guild_id}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         guild_music_settings_repo = GuildMusicSettingsRepo(session=get_session())
 
         update_data = {}
@@ -34,6 +34,7 @@ class GuildRoleMenuComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Creating role menu for guild {guild_id} in channel {channel_id}.")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         guild_role_menu_repo = GuildRoleMenuRepo(session=get_session())
         role_menu = await guild_role_menu_repo.create_guild_role_menu(
             guild_settings_id=guild_settings.guild_settings_id,
@@ -66,6 +67,7 @@ class GuildRoleMenuComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Updating role menu with ID {guild_role_menu_id}.")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id=guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         role_menu = guild_settings.get_role_menu(guild_role_menu_id=guild_role_menu_id)
         update_data = {}
         if menu_type is not NOT_SET:
@@ -94,6 +96,7 @@ class GuildRoleMenuComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Updating restricted roles for role menu {guild_role_menu_id} in guild {guild_id}.")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id=guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         role_menu = guild_settings.get_role_menu(guild_role_menu_id=guild_role_menu_id)
         removed_role_ids = set(role_menu.restricted_role_ids) - set(role_ids)
         added_role_ids = set(role_ids) - set(role_menu.restricted_role_ids)
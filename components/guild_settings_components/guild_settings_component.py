@@ -1,16 +1,37 @@
+import asyncio
+import time
 from datetime import datetime, UTC
+from itertools import batched
+from typing import Iterable
 
 import cache
-from common import NOT_SET_
+from common import NOT_SET_, metrics
 from common.db import get_session
+from common.decorators import require_db_session
 from components.guild_settings_components import BaseGuildSettingsComponent
 from constants import GuildEventType
 from models.dto.cachables import CachedGuildSettings
 from models.guild_settings_models import GuildSettings
 from repositories.guild_settings_repositories.guild_settings_repository import GuildSettingsRepo
+from settings import GUILD_SETTINGS_WARM_UP_BATCH_SIZE
+from utils.helpers.context_helpers import create_isolated_task
 
 NOT_SET = NOT_SET_()
 
+_in_flight_fetches: dict[int, asyncio.Event] = {}  # guild_id -> set once the fetch shared by concurrent misses is done
+_in_flight_refreshes: dict[int, asyncio.Task] = {}  # guild_id -> background refresh of stale cached settings
+
+_cache_hits_counter = metrics.counter("guild_settings.cache.hits")
+_cache_misses_counter = metrics.counter("guild_settings.cache.misses")
+_coalesced_fetches_counter = metrics.counter("guild_settings.cache.coalesced_fetches")
+_refreshes_counter = metrics.counter("guild_settings.cache.refreshes")
+_invalidations_counter = metrics.counter("guild_settings.cache.invalidations")
+metrics.gauge("guild_settings.cache.hit_rate",
+              getter=lambda: round(_cache_hits_counter.value /
+                                   ((_cache_hits_counter.value + _cache_misses_counter.value) or 1), 4))
+metrics.gauge("guild_settings.cache.resident_guilds", getter=lambda: len(cache.CACHED_GUILD_SETTINGS))
+_warm_up_duration_gauge = metrics.gauge("guild_settings.warm_up.duration_seconds")
+
 
 class GuildSettingsComponent(BaseGuildSettingsComponent):
 
@@ -64,7 +85,8 @@ class GuildSettingsComponent(BaseGuildSettingsComponent):
     async def get_guild_settings(self, guild_id: int, force_fetch: bool = False) -> CachedGuildSettings | None:
         """
         Gets guild settings for guild ID.
-        If settings are cached, it returns the cached version unless force_fetch is True.
+        If settings are cached, it returns the cached version unless force_fetch is True. Stale cached settings are
+        still returned, while a background refresh updates them. Concurrent misses for the same guild share one fetch.
         Args:
             guild_id (int): The ID of the guild to fetch settings for.
             force_fetch (bool): If True, it will force a fresh fetch from the database. Use with care.
@@ -72,10 +94,95 @@ class GuildSettingsComponent(BaseGuildSettingsComponent):
         Returns:
             GuildSettings: The settings for the specified guild ID.
         """
-        if not cache.CACHED_GUILD_SETTINGS.get(guild_id) or force_fetch:
-            await self.fetch_guild_settings(guild_id, create_if_not_exists=True)
+        if not force_fetch and (cached_guild_settings := self.get_cached_guild_settings(guild_id)):
+            return cached_guild_settings
+
+        _cache_misses_counter.increment()
+        await self._fetch_guild_settings_once(guild_id)
         return cache.CACHED_GUILD_SETTINGS.get(guild_id)
 
+    @staticmethod
+    def get_cached_guild_settings(guild_id: int) -> CachedGuildSettings | None:
+        """
+        Gets guild settings only if cached, without fetching them, so it needs neither a component instance nor a DB
+        session. Stale cached settings are still returned, while a background refresh updates them.
+        Args:
+            guild_id (int): The ID of the guild to get settings for.
+
+        Returns:
+            CachedGuildSettings | None: The cached settings, or None if the guild isn't cached.
+        """
+        cached_guild_settings = cache.CACHED_GUILD_SETTINGS.get(guild_id)
+        if cached_guild_settings:
+            _cache_hits_counter.increment()
+            if cached_guild_settings.is_stale and guild_id not in _in_flight_refreshes:
+                _in_flight_refreshes[guild_id] = \
+                    create_isolated_task(GuildSettingsComponent()._refresh_guild_settings(guild_id))
+        return cached_guild_settings
+
+    async def _fetch_guild_settings_once(self, guild_id: int) -> None:
+        """
+        Fetches (creating if needed) and caches guild settings, unless another fetch for the same guild is already in
+        flight, in which case it waits for that one instead. If the shared fetch fails, waiters retry on their own.
+        Args:
+            guild_id (int): The ID of the guild to fetch settings for.
+        """
+        while in_flight_fetch := _in_flight_fetches.get(guild_id):
+            _coalesced_fetches_counter.increment()
+            await in_flight_fetch.wait()
+            if guild_id in cache.CACHED_GUILD_SETTINGS:
+                return
+
+        fetch_done = _in_flight_fetches[guild_id] = asyncio.Event()
+        try:
+            await self.fetch_guild_settings(guild_id, create_if_not_exists=True)
+        finally:
+            _in_flight_fetches.pop(guild_id, None)
+            fetch_done.set()
+
+    @require_db_session
+    async def _refresh_guild_settings(self, guild_id: int) -> None:
+        """
+        Background refresh of stale cached guild settings, in its own session. The cached settings are updated in
+        place, so callers holding them see the refresh, unless they were written or invalidated meanwhile: the
+        refresh may have read the DB before that write was committed, so it's left to a later access.
+        Args:
+            guild_id (int): The ID of the guild to refresh settings for.
+        """
+        self.logger.debug(f"Refreshing stale guild settings for guild ID: {guild_id}")
+        _refreshes_counter.increment()
+        try:
+            if not (cached_guild_settings := cache.CACHED_GUILD_SETTINGS.get(guild_id)):
+                return
+            version = cached_guild_settings.version
+            guild_settings = await GuildSettingsRepo(session=get_session()).get_guild_settings(
+                guild_id=guild_id, load_all_relations=True
+            )
+            if cache.CACHED_GUILD_SETTINGS.get(guild_id) is not cached_guild_settings \
+                    or cached_guild_settings.version != version:
+                return
+            if not guild_settings or not guild_settings.music_settings or not guild_settings.xp_settings:
+                del cache.CACHED_GUILD_SETTINGS[guild_id]  # left to the lazy path, which creates what's missing
+                return
+            cached_guild_settings.refresh_from_orm_object(guild_settings)
+        finally:
+            if _in_flight_refreshes.get(guild_id) is asyncio.current_task():  # not replaced after an invalidation
+                del _in_flight_refreshes[guild_id]
+
+    def invalidate_guild_settings_cache(self, guild_id: int | None = None) -> None:
+        """
+        Drops cached guild settings so they are fetched again on next access, cancelling any background refresh.
+        Args:
+            guild_id (int | None): The ID of the guild to invalidate. If None, all guilds are invalidated.
+        """
+        self.logger.debug(f"Invalidating guild settings cache for guild ID: {guild_id or 'all'}")
+        guild_ids = [guild_id] if guild_id else list(cache.CACHED_GUILD_SETTINGS)
+        for invalidated_guild_id in guild_ids:
+            if refresh := _in_flight_refreshes.pop(invalidated_guild_id, None):
+                refresh.cancel()
+            if cache.CACHED_GUILD_SETTINGS.pop(invalidated_guild_id, None):
+                _invalidations_counter.increment()
+
     async def fetch_guild_settings(self, guild_id: int, create_if_not_exists: bool = False) -> GuildSettings | None:
         """
         Fetches guild settings for a given guild ID from the database and caches it.
@@ -122,6 +229,50 @@ class GuildSettingsComponent(BaseGuildSettingsComponent):
         self._handle_caching(guild_settings=guild_settings)
         return guild_settings
 
+    async def warm_up_guild_settings_cache(self, guild_ids: Iterable[int]) -> int:
+        """
+        Preloads settings for many guilds into the cache, a batch of guilds per query instead of one query per guild.
+        Guilds without settings (or with missing music/XP settings) are skipped and left to the lazy path, which
+        creates what's missing.
+        Args:
+            guild_ids (Iterable[int]): IDs of the guilds to warm up.
+
+        Returns:
+            int: number of guilds whose settings were cached.
+        """
+        if GUILD_SETTINGS_WARM_UP_BATCH_SIZE <= 0:
+            return 0
+        started_at = time.perf_counter()
+        cached_count = 0
+        for guild_ids_batch in batched(guild_ids, GUILD_SETTINGS_WARM_UP_BATCH_SIZE):
+            cached_count += await self._warm_up_guild_settings_batch(guild_ids=guild_ids_batch)
+        duration = time.perf_counter() - started_at
+        _warm_up_duration_gauge.set(round(duration, 3))
+        self.logger.info(f"Warmed up guild settings cache for {cached_count} guilds in {duration:.2f}s.")
+        return cached_count
+
+    @require_db_session
+    async def _warm_up_guild_settings_batch(self, guild_ids: tuple[int, ...]) -> int:
+        """
+        Loads and caches settings for one batch of guilds, in its own short session.
+        Args:
+            guild_ids (tuple[int, ...]): IDs of the guilds in the batch.
+
+        Returns:
+            int: number of guilds whose settings were cached.
+        """
+        guild_settings_list = await GuildSettingsRepo(session=get_session()).get_guild_settings_for_guilds(guild_ids)
+        cached_guild_settings_list = CachedGuildSettings.from_orm_objects([
+            guild_settings for guild_settings in guild_settings_list
+            if guild_settings.music_settings and guild_settings.xp_settings
+            and guild_settings.guild_id not in cache.CACHED_GUILD_SETTINGS  # already loaded (and maybe updated) lazily
+        ])
+        cache.CACHED_GUILD_SETTINGS.update(
+            (cached_guild_settings.guild_id, cached_guild_settings)
+            for cached_guild_settings in cached_guild_settings_list
+        )
+        return len(cached_guild_settings_list)
+
     async def update_guild_settings(self,
                                     guild_id: int,
                                     role_persistence_enabled: bool | NOT_SET_ = NOT_SET,
@@ -139,6 +290,7 @@ class GuildSettingsComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Updating guild settings for guild ID: {guild_id}")
         guild_settings = await self.get_guild_settings(guild_id=guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         guild_settings_repo = GuildSettingsRepo(session=get_session())
         update_data = {}
         if role_persistence_enabled is not NOT_SET:
@@ -69,6 +69,7 @@ class GuildXPSettingsComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Updating XP settings for guild_id: {guild_id}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         guild_xp_settings_repo = GuildXPSettingsRepo(session=get_session())
 
         update_data = {}
@@ -144,9 +145,8 @@ class GuildXPSettingsComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Adding XP level role for guild_id: {guild_id}, role_id: {role_id}, level: {level}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
-        if level not in guild_settings.xp_settings.level_role_ids_map:
-            guild_settings.xp_settings.level_role_ids_map[level] = set()
-        guild_settings.xp_settings.level_role_ids_map[level].add(role_id)
+        self.mark_guild_settings_changed(guild_settings)
+        guild_settings.xp_settings.add_level_role(level=level, role_id=role_id)
         return await GuildXPSettingsRepo(session=get_session()).add_xp_level_role(
             guild_xp_settings_id=guild_xp_settings_id,
             role_id=role_id,
@@ -164,11 +164,9 @@ class GuildXPSettingsComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Updating XP level role for guild_id: {guild_id}, role_id: {role_id}, level: {level}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
-        if old_level in guild_settings.xp_settings.level_role_ids_map:
-            guild_settings.xp_settings.level_role_ids_map[old_level].discard(role_id)
-        if level not in guild_settings.xp_settings.level_role_ids_map:
-            guild_settings.xp_settings.level_role_ids_map[level] = set()
-        guild_settings.xp_settings.level_role_ids_map[level].add(role_id)
+        self.mark_guild_settings_changed(guild_settings)
+        guild_settings.xp_settings.remove_level_role(level=old_level, role_id=role_id)
+        guild_settings.xp_settings.add_level_role(level=level, role_id=role_id)
         await GuildXPSettingsRepo(session=get_session()).update_level_role(
             role_id=role_id,
             level=level,
@@ -184,10 +182,8 @@ class GuildXPSettingsComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Removing XP level role for guild_id: {guild_id}, role_id: {role_id}, level: {level}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
-        if level in guild_settings.xp_settings.level_role_ids_map:
-            guild_settings.xp_settings.level_role_ids_map[level].discard(role_id)
-            if not guild_settings.xp_settings.level_role_ids_map[level]:
-                guild_settings.xp_settings.level_role_ids_map.pop(level, None)
+        self.mark_guild_settings_changed(guild_settings)
+        guild_settings.xp_settings.remove_level_role(level=level, role_id=role_id)
         await GuildXPSettingsRepo(session=get_session()).remove_xp_level_role(
             role_id=role_id,
             level=level
@@ -209,6 +205,7 @@ class GuildXPSettingsComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Adding ignored channel for guild_id: {guild_id}, channel_id: {channel_id}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         guild_settings.xp_settings.ignored_channel_ids.add(channel_id)
         return await GuildXPSettingsRepo(session=get_session()).add_xp_ignored_channel(
             guild_xp_settings_id=guild_xp_settings_id,
@@ -224,6 +221,7 @@ class GuildXPSettingsComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Removing ignored channel for guild_id: {guild_id}, channel_id: {channel_id}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         guild_settings.xp_settings.ignored_channel_ids.discard(channel_id)
         return await GuildXPSettingsRepo(session=get_session()).remove_xp_ignored_channel(
             channel_id=channel_id
@@ -242,6 +240,7 @@ class GuildXPSettingsComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Adding ignored role for guild_id: {guild_id}, role_id: {role_id}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         guild_settings.xp_settings.ignored_role_ids.add(role_id)
         return await GuildXPSettingsRepo(session=get_session()).add_xp_ignored_role(
             guild_xp_settings_id=guild_xp_settings_id,
@@ -257,6 +256,7 @@ class GuildXPSettingsComponent(BaseGuildSettingsComponent):
         """
         self.logger.debug(f"Removing ignored role for guild_id: {guild_id}, role_id: {role_id}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
+        self.mark_guild_settings_changed(guild_settings)
         guild_settings.xp_settings.ignored_role_ids.discard(role_id)
         return await GuildXPSettingsRepo(session=get_session()).remove_xp_ignored_role(
             role_id=role_id
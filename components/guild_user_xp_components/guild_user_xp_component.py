@@ -1,13 +1,40 @@
+import asyncio
+import time
 from datetime import UTC, datetime, timedelta
+from itertools import batched
 from typing import Any
 
+from common import metrics
 from common.db import get_session, add_post_rollback_action
+from common.decorators import require_db_session
 from components.guild_settings_components.guild_settings_component import GuildSettingsComponent
 from components.guild_user_xp_components import BaseGuildUserXPComponent
 import cache
 from models.dto.cachables import CachedGuildXP
 from repositories.guild_settings_repositories.guild_settings_repository import GuildSettingsRepo
 from repositories.guild_settings_repositories.guild_user_xp_repo import GuildUserXPRepo
+from settings import XP_SYNC_UPSERT_CHUNK_SIZE, XP_SYNC_TRANSACTION_PER_CHUNK, XP_CACHE_MEMORY_BUDGET_MB, \
+    XP_CACHE_IDLE_EVICTION_MINUTES
+
+_in_flight_fetches: dict[int, asyncio.Event] = {}  # guild_id -> set once the load shared by concurrent misses is done
+
+_sync_duration_histogram = metrics.histogram("xp.sync.duration_seconds")
+_synced_rows_counter = metrics.counter("xp.sync.synced_rows")
+_failed_rows_counter = metrics.counter("xp.sync.failed_rows")
+metrics.gauge("xp.sync.unsynced_guilds", getter=lambda: len(cache.UNSYNCED_GUILD_XP_IDS))
+metrics.gauge("xp.sync.unsynced_members",
+              getter=lambda: sum(cache.CACHED_GUILD_XP[guild_id].unsynced_member_count
+                                 for guild_id in cache.UNSYNCED_GUILD_XP_IDS if guild_id in cache.CACHED_GUILD_XP))
+_cache_hits_counter = metrics.counter("xp.cache.hits")
+_cache_misses_counter = metrics.counter("xp.cache.misses")
+_cache_evictions_counter = metrics.counter("xp.cache.evictions")
+_coalesced_fetches_counter = metrics.counter("xp.cache.coalesced_fetches")
+metrics.gauge("xp.cache.hit_rate",
+              getter=lambda: round(_cache_hits_counter.value /
+                                   ((_cache_hits_counter.value + _cache_misses_counter.value) or 1), 4))
+metrics.gauge("xp.cache.resident_guilds", getter=lambda: len(cache.CACHED_GUILD_XP))
+metrics.gauge("xp.cache.estimated_bytes",
+              getter=lambda: sum(guild_xp.estimated_bytes for guild_xp in cache.CACHED_GUILD_XP.values()))
 
 
 class GuildUserXPComponent(BaseGuildUserXPComponent):
@@ -21,46 +48,145 @@ class GuildUserXPComponent(BaseGuildUserXPComponent):
         Args:
             guild_id (int): The ID of the guild to fetch XP data for.
             force_refresh_cache (bool): If True and the guild is already cached with pending updates,
-                the cache will be refreshed. Otherwise, an error is raised.
+                the cache will be refreshed. Otherwise, an error is raised, and a full guild XP cached while fetching
+                is kept as is.
         """
         self.logger.debug(f"Fetching XP data for guild {guild_id}")
         guild_settings = await GuildSettingsComponent().get_guild_settings(guild_id)
-        if cache.CACHED_GUILD_XP.get(guild_id) \
-                and not cache.CACHED_GUILD_XP[guild_id].is_synced \
+        if (cached_guild_xp := cache.CACHED_GUILD_XP.get(guild_id)) \
+                and not cached_guild_xp.is_partial \
+                and not cached_guild_xp.is_synced \
                 and not force_refresh_cache:
             raise ValueError(f"Guild {guild_id} already cached with pending updates, yet a fetch was requested.")
-        guild_user_xp_records = await GuildUserXPRepo(session=get_session()).get_all_for_guild(
-            guild_settings_id=guild_settings.guild_settings_id
-        )
-        cache.CACHED_GUILD_XP[guild_id] = CachedGuildXP.from_orm_objects(
-            guild_id=guild_id,
-            guild_settings_id=guild_settings.guild_settings_id,
-            guild_user_xps=guild_user_xp_records
-        )
+        # members of a partial load changed (and maybe synced) while fetching are kept over the rows read
+        partial_guild_xp = cached_guild_xp if cached_guild_xp and cached_guild_xp.is_partial else None
+        if partial_guild_xp:
+            partial_guild_xp.track_changes()
+        try:
+            guild_user_xp_records = await GuildUserXPRepo(session=get_session()).get_all_for_guild(
+                guild_settings_id=guild_settings.guild_settings_id
+            )
+            guild_xp = CachedGuildXP.from_orm_objects(
+                guild_id=guild_id,
+                guild_settings_id=guild_settings.guild_settings_id,
+                guild_user_xps=guild_user_xp_records
+            )
+            if cached_guild_xp := cache.CACHED_GUILD_XP.get(guild_id):
+                if not cached_guild_xp.is_partial and not force_refresh_cache:
+                    cache.CACHED_GUILD_XP.move_to_end(guild_id)
+                    return  # loaded (and possibly updated) by someone else meanwhile
+                if cached_guild_xp.is_partial:
+                    # a partial load cached while fetching may be more recent than the rows read, keep all of it
+                    guild_xp.merge_unsynced_from(cached_guild_xp,
+                                                 all_members=cached_guild_xp is not partial_guild_xp)
+        finally:
+            if partial_guild_xp:
+                partial_guild_xp.track_changes(enabled=False)
+        cache.CACHED_GUILD_XP[guild_id] = guild_xp
+        cache.CACHED_GUILD_XP.move_to_end(guild_id)
 
     async def get_guild_xp(self, guild_id: int) -> CachedGuildXP:
         """
-        Returns the cached XP data for a guild. If not found then the data is fetched and cached.
+        Returns the cached XP data for a guild. If not found (never loaded, evicted or only partially loaded) then the
+        data is fetched and cached. Concurrent misses for the same guild share one load.
         Args:
             guild_id (int): The ID of the guild to get XP data for.
         Returns:
             CachedGuildXP: The cached XP data for the guild.
         """
-        if guild_id not in cache.CACHED_GUILD_XP:
+        if (cached_guild_xp := cache.CACHED_GUILD_XP.get(guild_id)) and not cached_guild_xp.is_partial:
+            _cache_hits_counter.increment()
+            cache.CACHED_GUILD_XP.move_to_end(guild_id)
+        else:
+            _cache_misses_counter.increment()
+            await self._fetch_guild_xp_once(guild_id)
+        guild_xp = cache.CACHED_GUILD_XP[guild_id]
+        guild_xp.touch()
+        return guild_xp
+
+    async def _fetch_guild_xp_once(self, guild_id: int) -> None:
+        """
+        Fetches and caches the full XP data of a guild, unless another fetch for the same guild is already in flight,
+        in which case it waits for that one instead. If the shared fetch fails, waiters retry on their own.
+        Args:
+            guild_id (int): The ID of the guild to fetch XP data for.
+        """
+        while in_flight_fetch := _in_flight_fetches.get(guild_id):
+            _coalesced_fetches_counter.increment()
+            await in_flight_fetch.wait()
+            if (cached_guild_xp := cache.CACHED_GUILD_XP.get(guild_id)) and not cached_guild_xp.is_partial:
+                return
+
+        fetch_done = _in_flight_fetches[guild_id] = asyncio.Event()
+        try:
             await self.fetch_guild_xp(guild_id)
-        return cache.CACHED_GUILD_XP[guild_id]
+        finally:
+            _in_flight_fetches.pop(guild_id, None)
+            fetch_done.set()
+
+    async def get_guild_xp_for_decay(self, guild_id: int) -> CachedGuildXP:
+        """
+        Returns the cached XP data for a guild, accepting a partial load of its decay-eligible members.
+        Args:
+            guild_id (int): The ID of the guild to get XP data for.
+        Returns:
+            CachedGuildXP: The cached (possibly partial) XP data for the guild.
+        """
+        if guild_xp := cache.CACHED_GUILD_XP.get(guild_id):
+            return guild_xp
+        return await self.get_guild_xp(guild_id)
+
+    def evict_guild_xp_cache(self) -> int:
+        """
+        Evicts cached guild XP, least recently used first, while the cache is over its memory budget or the guild has
+        been idle for longer than XP_CACHE_IDLE_EVICTION_MINUTES. Guilds with changes pending a sync are never evicted.
+        Evicted guilds are reloaded transparently by `get_guild_xp`.
+        Should be called while no XP processing is in progress (e.g. right after a sync, under the global XP lock).
+        Returns:
+            int: number of evicted guilds.
+        """
+        budget_bytes = XP_CACHE_MEMORY_BUDGET_MB * 1024 * 1024
+        idle_cutoff = time.monotonic() - XP_CACHE_IDLE_EVICTION_MINUTES * 60
+        total_bytes = sum(guild_xp.estimated_bytes for guild_xp in cache.CACHED_GUILD_XP.values()) \
+            if budget_bytes else 0
+
+        evicted_guild_ids = []
+        for guild_id, guild_xp in cache.CACHED_GUILD_XP.items():
+            over_budget = budget_bytes and total_bytes > budget_bytes
+            is_idle = XP_CACHE_IDLE_EVICTION_MINUTES and guild_xp.last_accessed_at < idle_cutoff
+            if not over_budget and not is_idle:
+                break  # every guild after this one was accessed more recently
+            if not guild_xp.is_synced or guild_id in cache.UNSYNCED_GUILD_XP_IDS:
+                continue
+            evicted_guild_ids.append(guild_id)
+            total_bytes -= guild_xp.estimated_bytes
+
+        for guild_id in evicted_guild_ids:
+            cache.CACHED_GUILD_XP.pop(guild_id, None)
+        if evicted_guild_ids:
+            _cache_evictions_counter.increment(len(evicted_guild_ids))
+            self.logger.debug(f"Evicted XP cache for {len(evicted_guild_ids)} guilds.")
+        return len(evicted_guild_ids)
 
     async def sync_up_guild_user_xp(self) -> None:
         """
         Syncs up all the cached guild user XP data to the database.
+        Rows are upserted in chunks of XP_SYNC_UPSERT_CHUNK_SIZE. If XP_SYNC_TRANSACTION_PER_CHUNK is enabled, each
+        chunk is committed in its own transaction and a failing chunk only re-marks its own members as unsynced.
         """
         self.logger.debug(f"Syncing up XP data.")
+        sync_start = time.perf_counter()
         upsert_data: dict[tuple[int, int], dict[str, Any]] = {}
-        guild_ids = list(cache.CACHED_GUILD_XP.keys())
+        upsert_member_xps: dict[tuple[int, int], CachedGuildXP.MemberXP] = {}
+        synced_guild_xps: list[CachedGuildXP] = []
+        guild_ids = list(cache.UNSYNCED_GUILD_XP_IDS)
         for guild_id in guild_ids:
-            cached_guild_xp = cache.CACHED_GUILD_XP[guild_id]
+            if not (cached_guild_xp := cache.CACHED_GUILD_XP.get(guild_id)):
+                cache.UNSYNCED_GUILD_XP_IDS.discard(guild_id)  # no longer cached, nothing to sync
+                continue
             for member_xp in cached_guild_xp.get_unsynced_xps():
-                upsert_data[(cached_guild_xp.guild_settings_id, member_xp.user_id)] = {
+                upsert_key = (cached_guild_xp.guild_settings_id, member_xp.user_id)
+                upsert_data[upsert_key] = {
                     "user_username": member_xp.user_username,
                     "xp": member_xp.xp,
                     "level": member_xp.level,
@@ -71,16 +197,55 @@ class GuildUserXPComponent(BaseGuildUserXPComponent):
                     "latest_decay_time": member_xp.latest_decay_time,
                     "latest_message_time": member_xp.latest_message_time,
                 }
-                member_xp.is_synced = True
-                add_post_rollback_action(member_xp.set_sync_status, is_synced=False)
-            cached_guild_xp.is_synced = True
+                upsert_member_xps[upsert_key] = member_xp
+            synced_guild_xps.append(cached_guild_xp)
 
         if upsert_data:
-            await GuildUserXPRepo(session=get_session()).bulk_upsert_guild_user_xp(upsert_data)
+            if XP_SYNC_TRANSACTION_PER_CHUNK:
+                for chunk_keys in batched(upsert_data.keys(), XP_SYNC_UPSERT_CHUNK_SIZE):
+                    try:
+                        await self._sync_up_guild_user_xp_chunk(
+                            upsert_data={upsert_key: upsert_data[upsert_key] for upsert_key in chunk_keys},
+                            member_xps=[upsert_member_xps[upsert_key] for upsert_key in chunk_keys]
+                        )
+                    except Exception as e:
+                        _failed_rows_counter.increment(len(chunk_keys))
+                        self.logger.error(f"Failed to sync a chunk of {len(chunk_keys)} XP rows, "
+                                          f"they will be retried on the next sync: {e}")
+            else:
+                for member_xp in upsert_member_xps.values():
+                    member_xp.is_synced = True
+                    add_post_rollback_action(member_xp.set_sync_status, is_synced=False)
+                await GuildUserXPRepo(session=get_session()).bulk_upsert_guild_user_xp(
+                    upsert_data, chunk_size=XP_SYNC_UPSERT_CHUNK_SIZE
+                )
+
+        for cached_guild_xp in synced_guild_xps:
+            if not cached_guild_xp.unsynced_member_count:
+                cached_guild_xp.is_synced = True
+        _synced_rows_counter.increment(len(upsert_data))
+        _sync_duration_histogram.observe(time.perf_counter() - sync_start)
+
+    @require_db_session
+    async def _sync_up_guild_user_xp_chunk(self,
+                                           upsert_data: dict[tuple[int, int], dict[str, Any]],
+                                           member_xps: list[CachedGuildXP.MemberXP]) -> None:
+        """
+        Upserts one chunk of XP rows in its own short transaction.
+        On failure, the members of this chunk are marked as unsynced again through post-rollback actions.
+        Args:
+            upsert_data (dict[tuple[int, int], dict[str, Any]]): Upsert data for the chunk.
+            member_xps (list[CachedGuildXP.MemberXP]): Cached member XPs the chunk was built from.
+        """
+        for member_xp in member_xps:
+            member_xp.is_synced = True
+            add_post_rollback_action(member_xp.set_sync_status, is_synced=False)
+        await GuildUserXPRepo(session=get_session()).bulk_upsert_guild_user_xp(upsert_data)
 
     async def fetch_guild_xp_for_decay_eligible_guilds(self):
         """
-        Fetches the XP data for all guilds that are eligible for decay and have members pending decay.
+        Fetches the XP data of members eligible for decay, for guilds that are not cached yet.
+        Only the eligible members are loaded, as partial guild XP that `get_guild_xp` completes when needed.
         """
         self.logger.debug("Fetching XP data for guilds eligible for decay.")
         guild_settings_with_decay_enabled = await GuildSettingsRepo(session=get_session()).\
@@ -98,13 +263,8 @@ class GuildUserXPComponent(BaseGuildUserXPComponent):
                 grace_days = guild_settings.xp_settings.xp_decay_grace_period_days
                 cutoff_datetime = datetime.now(UTC) - timedelta(days=grace_days)
                 guild_settings_ids_to_decay_cutoff_datetime_pairs.append((guild_settings.id, cutoff_datetime))
-        guild_settings_ids = await GuildUserXPRepo(session=get_session()).\
-            get_guild_settings_ids_with_decay_eligible_members(
-                guild_settings_id_last_message_time_pairs=guild_settings_ids_to_decay_cutoff_datetime_pairs
-            )
-
-        guild_user_xps = await GuildUserXPRepo(session=get_session()).get_all_for_guilds(
-            guild_settings_ids=guild_settings_ids
+        guild_user_xps = await GuildUserXPRepo(session=get_session()).get_decay_eligible_for_guilds(
+            guild_settings_id_last_message_time_pairs=guild_settings_ids_to_decay_cutoff_datetime_pairs
         )
         guild_settings_id_guild_user_xps_map = {}
         for guild_user_xp in guild_user_xps:
@@ -114,8 +274,11 @@ class GuildUserXPComponent(BaseGuildUserXPComponent):
             guild_settings_id_guild_user_xps_map[guild_settings_id].append(guild_user_xp)
         for guild_settings_id, guild_user_xps in guild_settings_id_guild_user_xps_map.items():
             guild_id = guild_settings_id_guild_id_map[guild_settings_id]
+            if guild_id in cache.CACHED_GUILD_XP:
+                continue  # loaded meanwhile, don't replace it
             cache.CACHED_GUILD_XP[guild_id] = CachedGuildXP.from_orm_objects(
                 guild_id=guild_id,
                 guild_settings_id=guild_settings_id,
-                guild_user_xps=guild_user_xps
+                guild_user_xps=guild_user_xps,
+                is_partial=True
             )
@@ -1,6 +1,7 @@
 from components.asset_component import AssetComponent
 from components.guild_user_xp_components import BaseGuildUserXPComponent
 from constants import DefinedAsset
+from models.dto.xp import XPLevelTable
 import cache
 
 
@@ -20,3 +21,4 @@ class XPModelComponent(BaseGuildUserXPComponent):
         for key, value in xp_model.items():
             cache.LEVEL_XP_MAP[int(key)] = int(value)
             cache.XP_LEVEL_MAP[int(value)] = int(key)
+        cache.XP_LEVEL_TABLE = XPLevelTable(level_xp_map=cache.LEVEL_XP_MAP)
@@ -1,5 +1,6 @@
 import random
 from datetime import datetime, UTC, timedelta
+from typing import Iterable
 
 from components.guild_settings_components.guild_settings_component import GuildSettingsComponent
 from components.guild_user_xp_components import BaseGuildUserXPComponent
@@ -7,7 +8,7 @@ import cache
 from components.guild_user_xp_components.guild_user_xp_component import GuildUserXPComponent
 from constants import XPSettingsMessageCountMode
 from models.dto.cachables import CachedGuildXP, CachedGuildSettings
-from models.dto.xp import XPAction, XPDecayItem
+from models.dto.xp import XPAction
 
 
 class XPProcessingComponent(BaseGuildUserXPComponent):
@@ -20,15 +21,18 @@ class XPProcessingComponent(BaseGuildUserXPComponent):
                               guild_id: int,
                               message_time: datetime,
                               user_username: str,
-                              is_booster: bool) -> bool:
+                              is_booster: bool,
+                              message_count: int = 1) -> bool:
         """
         Handle all changes related to user XP upon user message.
         Args:
             user_id (int): user ID that sent the message.
             guild_id (int): guild ID the message was sent to.
-            message_time (datetime): time the message was sent.
+            message_time (datetime): time the message was sent (latest message time if coalesced).
             user_username (str): username of the user who sent the message.
             is_booster (bool): whether the user is eligible for the booster gain multiplier.
+            message_count (int): number of messages coalesced into this call. XP is gained at most once per
+                timeframe either way, so only the message count is affected.
 
         Returns:
             bool: whether the user's level was updated during this flow.
@@ -45,7 +49,7 @@ class XPProcessingComponent(BaseGuildUserXPComponent):
             member_xp.latest_gain_time -= timedelta(seconds=xp_settings.xp_gain_timeframe)
 
         if xp_settings.message_count_mode == XPSettingsMessageCountMode.PER_MESSAGE:
-            member_xp.register_message(message_time=message_time)
+            member_xp.register_message(message_time=message_time, count=message_count)
 
         if (datetime.now(UTC) - member_xp.latest_gain_time).seconds >= xp_settings.xp_gain_timeframe:
             if xp_settings.message_count_mode == XPSettingsMessageCountMode.PER_TIMEFRAME:
@@ -82,31 +86,41 @@ class XPProcessingComponent(BaseGuildUserXPComponent):
 
         return level != level_before_action
 
-    async def process_user_xp_decay(self, decay_item: XPDecayItem) -> bool:
+    async def process_guild_xp_decay(self, guild_id: int, member_ids: Iterable[int]) -> list[int]:
         """
-        Process user XP decay.
+        Process XP decay for several members of a guild at once.
+        Settings are resolved once, decay amounts and new levels are computed in batch, and the changes are applied to
+        the cache in a single pass without awaiting, so no other XP processing can interleave with it.
         Args:
-            decay_item (XPDecayItem): DTO containing decay details.
+            guild_id (int): guild ID.
+            member_ids (Iterable[int]): IDs of the members due for decay.
 
         Returns:
-            bool: whether the user's level was updated during this flow.
+            list[int]: IDs of the members whose level was updated during this flow.
         """
-        self.logger.debug("Processing user XP decay.")
-        member_xp = await self._get_member_xp(guild_id=decay_item.guild_id, user_id=decay_item.member_id,
-                                              user_username=decay_item.username)
-        xp_settings = (await GuildSettingsComponent().get_guild_settings(decay_item.guild_id)).xp_settings
-
-        decay_grace_days = xp_settings.xp_decay_grace_period_days
-        decay_cutoff = datetime.now(UTC) - timedelta(days=decay_grace_days)
-        if member_xp.latest_message_time and member_xp.latest_message_time > decay_cutoff:
-            return False  # no need to decay anymore
-
-        decay_amount = int(member_xp.xp * (xp_settings.xp_decay_per_day_percentage / 100))
-        level = self.get_level_at_xp(xp=member_xp.xp - decay_amount, xp_settings=xp_settings)
-        level_before_action = member_xp.level
-        member_xp.decay_xp(amount=decay_amount, new_level=level)
-
-        return level != level_before_action
+        self.logger.debug(f"Processing XP decay for guild {guild_id}.")
+        xp_settings = (await GuildSettingsComponent().get_guild_settings(guild_id)).xp_settings
+        guild_xp = await GuildUserXPComponent().get_guild_xp_for_decay(guild_id=guild_id)
+
+        decay_cutoff = datetime.now(UTC) - timedelta(days=xp_settings.xp_decay_grace_period_days)
+        member_xps = [
+            member_xp for member_id in member_ids
+            if (member_xp := guild_xp.get_xp_for(member_id))
+            and not (member_xp.latest_message_time and member_xp.latest_message_time > decay_cutoff)  # active again
+        ]
+        decay_ratio = xp_settings.xp_decay_per_day_percentage / 100
+        decay_amounts = [int(member_xp.xp * decay_ratio) for member_xp in member_xps]
+        levels = self.get_levels_at_xps(
+            xps=[member_xp.xp - decay_amount for member_xp, decay_amount in zip(member_xps, decay_amounts)],
+            xp_settings=xp_settings
+        )
+
+        level_updated_member_ids = []
+        for member_xp, decay_amount, level in zip(member_xps, decay_amounts, levels):
+            if level != member_xp.level:
+                level_updated_member_ids.append(member_xp.user_id)
+            member_xp.decay_xp(amount=decay_amount, new_level=level)
+        return level_updated_member_ids
 
     # noinspection PyMethodMayBeStatic
     async def _get_member_xp(self, guild_id: int, user_id: int, user_username: str) -> CachedGuildXP.MemberXP:
@@ -120,9 +134,7 @@ class XPProcessingComponent(BaseGuildUserXPComponent):
         Returns:
             CachedGuildXP.MemberXP: member XP object.
         """
-        if guild_id not in cache.CACHED_GUILD_XP:
-            await GuildUserXPComponent().fetch_guild_xp(guild_id=guild_id)
-        guild_xp = cache.CACHED_GUILD_XP[guild_id]
+        guild_xp = await GuildUserXPComponent().get_guild_xp(guild_id=guild_id)
         if not guild_xp.get_xp_for(user_id):
             guild_xp.initiate_member_xp(user_id=user_id, user_username=user_username)
         return guild_xp.get_xp_for(user_id)
@@ -138,12 +150,17 @@ class XPProcessingComponent(BaseGuildUserXPComponent):
         Returns:
             int: level.
         """
-        level = 0
-        for xp_requirement, xp_level in cache.XP_LEVEL_MAP.items():
-            if xp >= xp_requirement:
-                level = xp_level
-            else:
-                break
-        if level > xp_settings.max_level:
-            level = xp_settings.max_level
-        return level
+        return cache.XP_LEVEL_TABLE.get_level_at_xp(xp=xp, max_level=xp_settings.max_level)
+
+    # noinspection PyMethodMayBeStatic
+    def get_levels_at_xps(self, xps: Iterable[int], xp_settings: CachedGuildSettings.XPSettings) -> list[int]:
+        """
+        Batch version of `get_level_at_xp`, for bulk operations such as decay or XP transfers.
+        Args:
+            xps (Iterable[int]): XP values.
+            xp_settings (CachedGuildSettings.XPSettings): XP settings to use.
+
+        Returns:
+            list[int]: levels, in the same order as the given XP values.
+        """
+        return cache.XP_LEVEL_TABLE.get_levels_at_xps(xps=xps, max_level=xp_settings.max_level)
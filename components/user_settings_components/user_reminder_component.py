@@ -1,19 +1,36 @@
-from datetime import datetime, timedelta, UTC
+from datetime import datetime, UTC
+from typing import Iterable
 
-from common.db import get_session
+from common.db import get_session, add_post_commit_action
 from common.exceptions import UserReadableException
 from components.user_settings_components import BaseUserSettingsComponent
 from components.user_settings_components.user_settings_component import UserSettingsComponent
 from constants import REMINDER_YEAR_DAY_FORMAT, ReminderRecurrenceConditionedType, ReminderStatus, \
-    ReminderRecurrenceType, ReminderRecurrenceBasicUnit
+    ReminderRecurrenceType
+from models.dto.cachables import CachedReminder
 from models.user_settings_models import UserReminder, UserReminderRecurrence, UserReminderBlockedUser
 from repositories.user_settings_repositories.user_reminder_repo import UserReminderRepo
 from repositories.user_settings_repositories.user_settings_repo import UserSettingsRepo
-from utils.helpers.datetime_helpers import from_timestamp, get_next_year_day, get_next_weekday, get_next_month_day
+from utils.helpers.datetime_helpers import from_timestamp
+from utils.helpers.recurrence_helpers import get_next_occurrence
+
+
+def _reschedule_reminders(reminder_ids: tuple[int, ...]):
+    from clients import reminder_service
+    reminder_service.mark_reminders_changed(*reminder_ids)
 
 
 class UserReminderComponent(BaseUserSettingsComponent):
 
+    @staticmethod
+    def _notify_reminders_changed(*reminder_ids: int):
+        """
+        Have the reminder service reschedule reminders from the database once the current transaction is committed.
+        Args:
+            *reminder_ids (int): IDs of the created, updated or deleted reminders.
+        """
+        add_post_commit_action(_reschedule_reminders, reminder_ids=reminder_ids)
+
     async def create_reminder(self,
                               reminder_text: str,
                               reminder_time: datetime,
@@ -48,12 +65,14 @@ class UserReminderComponent(BaseUserSettingsComponent):
                 user_id=recipient_user_id
             )
             self.logger.debug(f"Created default user settings for reminder recipient {recipient_user_id}.")
-        return await user_reminder_repo.create_reminder(owner_user_settings_id=owner_user_settings.id,
-                                                        recipient_user_settings_id=recipient_user_settings.id,
-                                                        reminder_text=reminder_text,
-                                                        reminder_time=reminder_time,
-                                                        is_snoozed=is_snoozed,
-                                                        snoozed_from_reminder_id=snoozed_from_reminder_id)
+        reminder = await user_reminder_repo.create_reminder(owner_user_settings_id=owner_user_settings.id,
+                                                            recipient_user_settings_id=recipient_user_settings.id,
+                                                            reminder_text=reminder_text,
+                                                            reminder_time=reminder_time,
+                                                            is_snoozed=is_snoozed,
+                                                            snoozed_from_reminder_id=snoozed_from_reminder_id)
+        self._notify_reminders_changed(reminder.id)
+        return reminder
 
     async def get_user_reminders(self, user_id: int) -> list[UserReminder]:
         """
@@ -79,6 +98,7 @@ class UserReminderComponent(BaseUserSettingsComponent):
         self.logger.debug(f"Deleting reminder with ID {reminder_id}.")
         user_reminder_repo = UserReminderRepo(session=get_session())
         await user_reminder_repo.delete_reminder(reminder_id=reminder_id)
+        self._notify_reminders_changed(reminder_id)
 
     async def update_reminder(self,
                               reminder_id: int | None = None,
@@ -112,6 +132,7 @@ class UserReminderComponent(BaseUserSettingsComponent):
             update_data['status'] = status
 
         await user_reminder_repo.update_reminder(reminder_id=reminder_id, reminder=reminder, **update_data)
+        self._notify_reminders_changed(reminder_id or reminder.id)
 
     async def set_reminder_recurrence(self,
                                       recurrence_type: str | None,
@@ -138,6 +159,7 @@ class UserReminderComponent(BaseUserSettingsComponent):
         self.logger.debug(f"Setting recurrence for reminder {reminder.id} wih recurrence type {recurrence_type}.")
         year_day = None
         repo = UserReminderRepo(session=get_session())
+        self._notify_reminders_changed(reminder.id)
         if recurrence_type == ReminderRecurrenceType.BASIC:
             if not basic_interval or not basic_unit:
                 raise ValueError("For BASIC recurrence type, basic_interval and basic_unit must be provided.")
@@ -238,6 +260,41 @@ class UserReminderComponent(BaseUserSettingsComponent):
                                                                  load_user_settings=load_users,
                                                                  load_recurrence_settings=load_recurrence)
 
+    async def get_reminders_changed_since(self,
+                                          updated_since: datetime,
+                                          due_from: datetime,
+                                          due_before: datetime) -> list[UserReminder]:
+        """
+        Get reminders (of any status) updated since a specific datetime, along with the active reminders scheduled to
+        be delivered in a window. Users and recurrence settings are loaded.
+        Args:
+            updated_since (datetime): The datetime after which the reminder or its recurrence should have been updated.
+            due_from (datetime): Start of the delivery window (inclusive).
+            due_before (datetime): End of the delivery window (exclusive).
+
+        Returns:
+            list[UserReminder]: List of reminders that match the criteria.
+        """
+        self.logger.debug(f"Getting reminders updated since {updated_since} "
+                          f"or scheduled to deliver between {due_from} and {due_before}.")
+        user_reminder_repo = UserReminderRepo(session=get_session())
+        return await user_reminder_repo.get_reminders_changed_since(updated_since=updated_since,
+                                                                    due_from=due_from,
+                                                                    due_before=due_before)
+
+    async def get_reminders_by_ids(self, reminder_ids: Iterable[int]) -> list[UserReminder]:
+        """
+        Get reminders (of any status) by their IDs. Users and recurrence settings are loaded.
+        Args:
+            reminder_ids (Iterable[int]): IDs of the reminders to fetch.
+
+        Returns:
+            list[UserReminder]: The reminders found, missing IDs are skipped.
+        """
+        self.logger.debug(f"Fetching reminders with IDs {reminder_ids}.")
+        user_reminder_repo = UserReminderRepo(session=get_session())
+        return await user_reminder_repo.get_reminders_by_ids(reminder_ids=reminder_ids)
+
     async def validate_relayed_reminder_deliverability(self, reminder_id: int):
         """ 
         Checks if the owner can relay reminders in general and specifically to this recipient.
@@ -270,125 +327,56 @@ class UserReminderComponent(BaseUserSettingsComponent):
             reminder_id (int): ID of the reminder.
         """
         self.logger.debug(f"Handling post-delivery for reminder with ID {reminder_id}.")
-        repo = UserReminderRepo(session=get_session())
+        self._notify_reminders_changed(reminder_id)
         reminder = await self.get_reminder(reminder_id=reminder_id,
                                            load_user_settings=True,
                                            load_recurrence_settings=True)
-        if not reminder.recurrence:
-            await repo.update_reminder(reminder_id=reminder_id, status=ReminderStatus.ARCHIVED)
-            return
-
-        next_delivery_at = reminder.reminder_time
-        # while loop is necessary for the case of app downtime, to avoid repeating reminders that are already due
-        while next_delivery_at <= datetime.now(UTC):
-            if reminder.recurrence.recurrence_type == ReminderRecurrenceType.BASIC:
-                next_delivery_at = self._get_basic_next_delivery_at(reminder=reminder)
-            elif reminder.recurrence.recurrence_type == ReminderRecurrenceType.CONDITIONED:
-                try:
-                    next_delivery_at = self._get_conditioned_next_delivery_at(reminder=reminder)
-                except Exception as e:
-                    self.logger.error(f"Error while trying to get next_delivery_at for reminder"
-                                      f" {reminder.id}. Setting reminder to archived and awaiting manual action. "
-                                      f"Error: {e}")
-                    await repo.update_reminder(reminder_id=reminder.id, status=ReminderStatus.ARCHIVED)
-                    return
-            else:
-                raise ValueError("Reminder recurrence settings must have either basic or conditioned details.")
-            reminder.reminder_time = next_delivery_at
-            self.logger.debug(f"Next delivery time for reminder {reminder_id} is {next_delivery_at}.")
-
-        if reminder.recurrence.ends_at and next_delivery_at > reminder.recurrence.ends_at:
-            self.logger.debug(f"Next delivery time {next_delivery_at} is after the recurrence ends at "
-                              f"{reminder.recurrence.ends_at}. Archiving reminder {reminder_id}.")
-            await repo.update_reminder(reminder_id=reminder_id, status=ReminderStatus.ARCHIVED)
-            return
-
-        await repo.update_reminder(reminder_id=reminder_id,
-                                   reminder_time=next_delivery_at)
-
-    def _get_basic_next_delivery_at(self, reminder: UserReminder) -> datetime:
-        """
-        Calculate the next delivery time for a reminder with basic recurrence settings.
-        Args:
-            reminder (UserReminder): The reminder object with basic recurrence settings.
+        await self.handle_reminders_post_delivery(reminders=[CachedReminder.from_orm_object(reminder)])
 
-        Returns:
-            datetime: The next delivery time for the reminder.
-        """
-        self.logger.debug(f"Calculating next delivery time for reminder {reminder.id} with basic recurrence settings.")
-        match reminder.recurrence.basic_unit:
-            case ReminderRecurrenceBasicUnit.HOUR:
-                return reminder.reminder_time + timedelta(hours=reminder.recurrence.basic_interval)
-            case ReminderRecurrenceBasicUnit.DAY:
-                return reminder.reminder_time + timedelta(days=reminder.recurrence.basic_interval)
-            case _:
-                raise ValueError(f"Unsupported basic interval unit {reminder.recurrence.basic_unit}.")
-
-    def _get_conditioned_next_delivery_at(self, reminder: UserReminder, recursive_limit=5,
-                                          recursion_resolving_reference=None) -> datetime:
+    async def handle_reminders_post_delivery(self, reminders: Iterable[CachedReminder]) -> dict[int, datetime | None]:
         """
-        Calculate the next delivery time for a reminder with conditioned recurrence settings.
+        Handle post-delivery actions for several delivered reminders at once: non-recurring reminders (and recurring
+        ones past their recurrence end) are archived, the others are moved to their next delivery time.
+        Next delivery times are computed from the cached recurrence settings and all changes are written in a single
+        UPDATE statement.
         Args:
-            reminder (UserReminder): The reminder object with conditioned recurrence settings.
+            reminders (Iterable[CachedReminder]): delivered reminders, with their delivery time at delivery.
 
         Returns:
-            datetime: The next delivery time for the reminder.
+            dict[int, datetime | None]: reminder ID -> next delivery time, None if the reminder was archived.
         """
-        self.logger.debug(f"Calculating next delivery time for reminder "
-                          f"{reminder.id} with conditioned recurrence settings.")
-        localized_deliver_at = from_timestamp(utc_timestamp=int(reminder.reminder_time.timestamp()),
-                                              timezone=reminder.owner.timezone)
-        recursion_resolving_reference = recursion_resolving_reference or {}
-        if reminder.recurrence.conditioned_type == ReminderRecurrenceConditionedType.DAY_OF_YEAR:
-            next_delivery_at = get_next_year_day(
-                from_datetime=localized_deliver_at,
-                year_day=reminder.recurrence.conditioned_year_day
-            )
-        elif reminder.recurrence.conditioned_type == ReminderRecurrenceConditionedType.DAYS_OF_WEEK:
-            condition_days = sorted(reminder.recurrence.conditioned_days)
-            if len(condition_days) == 1 or condition_days[-1] <= localized_deliver_at.weekday():
-                next_weekday = condition_days[0]
-            else:
-                next_weekday = condition_days[i := 0]
-                while next_weekday <= localized_deliver_at.weekday():
-                    next_weekday = condition_days[i := i + 1]
-            next_delivery_at = get_next_weekday(from_datetime=localized_deliver_at,
-                                                weekday=next_weekday)
-        elif reminder.recurrence.conditioned_type == ReminderRecurrenceConditionedType.DAYS_OF_MONTH:
-            days_to_skip = recursion_resolving_reference.get("days_to_skip", set())
-            condition_days = sorted(reminder.recurrence.conditioned_days)
-            for day_to_skip in days_to_skip:
-                condition_days.remove(day_to_skip) if day_to_skip in condition_days else None
-            if not condition_days:  # ideally should never happen
-                self.logger.error(f"It happened... reminder {reminder.id}")
-                next_month_day = reminder.recurrence.conditioned_days[0]
-            else:
-                if len(condition_days) == 1 or condition_days[-1] <= localized_deliver_at.day:
-                    next_month_day = condition_days[0]
-                else:
-                    next_month_day = condition_days[i := 0]
-                    while next_month_day <= localized_deliver_at.day:
-                        next_month_day = condition_days[i := i + 1]
-            next_delivery_at = get_next_month_day(from_datetime=localized_deliver_at,
-                                                  month_day=next_month_day)
-            recursion_resolving_reference["days_to_skip"] = ({next_month_day}
-                                                             | recursion_resolving_reference.get("days_to_skip", set()))
-            next_delivery_at = from_timestamp(utc_timestamp=int(next_delivery_at.timestamp()))
-        else:
-            raise ValueError(f"Unsupported reminder condition type {reminder.recurrence.conditioned_type}.")
+        now = datetime.now(UTC)
+        next_delivery_times: dict[int, datetime | None] = {}
+        for reminder in reminders:
+            next_delivery_times[reminder.user_reminder_id] = None
+            if not reminder.recurrence:
+                continue
+            try:
+                next_delivery_at = get_next_occurrence(reminder_time=reminder.reminder_time,
+                                                       recurrence=reminder.recurrence,
+                                                       timezone=reminder.owner_timezone,
+                                                       after=now)
+            except Exception as e:
+                self.logger.error(f"Error while trying to get next_delivery_at for reminder"
+                                  f" {reminder.user_reminder_id}. Setting reminder to archived and awaiting manual "
+                                  f"action. Error: {e}")
+                continue
+            if reminder.recurrence.ends_at and next_delivery_at > reminder.recurrence.ends_at:
+                self.logger.debug(f"Next delivery time {next_delivery_at} is after the recurrence ends at "
+                                  f"{reminder.recurrence.ends_at}. Archiving reminder {reminder.user_reminder_id}.")
+                continue
+            self.logger.debug(f"Next delivery time for reminder {reminder.user_reminder_id} is {next_delivery_at}.")
+            next_delivery_times[reminder.user_reminder_id] = next_delivery_at
 
-        if next_delivery_at == reminder.reminder_time:
-            # purpose of recursion logic: example: if there are days set to 28, 29, 30, 31, and it's a non-leap feb,
-            # the reminder will send 4 times at once, need to check if new delivery_at is the same and skip accordingly
-            if recursive_limit == 0:
-                raise RecursionError("Recursion limit reached.")
-            next_delivery_at = self._get_conditioned_next_delivery_at(
-                reminder=reminder,
-                recursive_limit=recursive_limit - 1,
-                recursion_resolving_reference=recursion_resolving_reference
-            )
-
-        return from_timestamp(next_delivery_at.timestamp())  # return as UTC for DB storage
+        self.logger.debug(f"Handling post-delivery for {len(next_delivery_times)} reminders.")
+        repo = UserReminderRepo(session=get_session())
+        await repo.update_reminders_post_delivery(
+            archived_reminder_ids=[reminder_id for reminder_id, next_delivery_at in next_delivery_times.items()
+                                   if not next_delivery_at],
+            reminder_times={reminder_id: next_delivery_at for reminder_id, next_delivery_at in
+                            next_delivery_times.items() if next_delivery_at}
+        )
+        return next_delivery_times
 
     async def block_user_from_relaying_reminders(self, user_id: int, blocked_user_id: int):
         """
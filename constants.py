@@ -333,18 +333,12 @@ class BackgroundWorker(OhanaEnum):
 
     # worker for refreshing cached/queued reminders
     REMINDER_QUEUE_PRODUCER = "Reminder Queue Producer"
-    # worker for sending reminders
-    REMINDER_QUEUE_CONSUMER = "Reminder Queue Consumer"
     # worker for cleaning cache (web requests, yt info)
     CACHE_CLEANUP = "Cache Cleanup"
     # worker for log ingestion (logs are kept in async queue and processed here)
     LOG_INGESTION = "Log Ingestion"
     # worker for syncing xp with the database
     XP_DB_SYNC = "XP Database Sync"
-    # worker for processing messages for xp gain
-    XP_MESSAGE_QUEUE_CONSUMER = "XP Message Queue Consumer"
-    # worker for processing XP actions adjusting member XP - from commands
-    XP_ACTION_QUEUE_CONSUMER = "XP Action Queue Consumer"
     # worker for enqueuing members pending xp decay
     XP_DECAY_QUEUE_PRODUCER = "XP Decay Queue Producer"
     # worker for decaying members XP
@@ -355,23 +349,26 @@ class BackgroundWorker(OhanaEnum):
 
 PERIODIC_WORKER_FREQUENCY = {
     BackgroundWorker.REMINDER_QUEUE_PRODUCER: 30,
-    BackgroundWorker.REMINDER_QUEUE_CONSUMER: 5,
     BackgroundWorker.CACHE_CLEANUP: 30,
     BackgroundWorker.XP_DB_SYNC: 30,
-    BackgroundWorker.XP_MESSAGE_QUEUE_CONSUMER: 0.1,
-    BackgroundWorker.XP_ACTION_QUEUE_CONSUMER: 3,
     BackgroundWorker.XP_DECAY_QUEUE_PRODUCER: 3600,
     BackgroundWorker.XP_DECAY_QUEUE_CONSUMER: 300,
     BackgroundWorker.LOG_INGESTION: 1,
 }
 
+# Random extra delay (up to this many seconds) added to each periodic run, so runs don't line up with each other
+PERIODIC_WORKER_JITTER = {
+    BackgroundWorker.REMINDER_QUEUE_PRODUCER: 2,
+    BackgroundWorker.CACHE_CLEANUP: 5,
+    BackgroundWorker.XP_DB_SYNC: 3,
+    BackgroundWorker.XP_DECAY_QUEUE_PRODUCER: 60,
+    BackgroundWorker.XP_DECAY_QUEUE_CONSUMER: 30,
+}
+
 WORKER_RETRY_ON_ERROR_DELAY = {
     BackgroundWorker.REMINDER_QUEUE_PRODUCER: 10,
-    BackgroundWorker.REMINDER_QUEUE_CONSUMER: 5,
     BackgroundWorker.CACHE_CLEANUP: 60,
     BackgroundWorker.XP_DB_SYNC: 30,
-    BackgroundWorker.XP_MESSAGE_QUEUE_CONSUMER: 0.1,
-    BackgroundWorker.XP_ACTION_QUEUE_CONSUMER: 3,
     BackgroundWorker.XP_DECAY_QUEUE_PRODUCER: 7200,
     BackgroundWorker.XP_DECAY_QUEUE_CONSUMER: 600,
     BackgroundWorker.LOG_INGESTION: 1,
@@ -1,9 +1,15 @@
 """
 DTOs to be used for frequently accessed DB data.
 """
+import time
+from array import array
 from datetime import datetime, UTC
+from heapq import heapify, heappop, heappush
 
+import cache
 from common import NOT_SET_
+from common.sorted_list import SortedList
+from common.trigger_matcher import TriggerMatcher
 from constants import ReminderRecurrenceType, ReminderRecurrenceConditionedType, REMINDER_YEAR_DAY_FORMAT, \
     DiscordTimestamp
 from models.guild_settings_models import GuildSettings, GuildChannelSettings, GuildAutorole, GuildAutoResponse, \
@@ -14,9 +20,23 @@ from utils.helpers.text_manipulation_helpers import get_days_of_week_from_number
 
 NOT_SET = NOT_SET_()
 
+_NO_TIME = float('-inf')  # sentinel for a missing timestamp in a timestamp column
+_USER_ID_MASK = (1 << 64) - 1
+# Measured per-member overhead outside the columns: username string, user ID -> row map entry and ranked key
+_ESTIMATED_MEMBER_OVERHEAD_BYTES = 224
+_ESTIMATED_DECAY_HEAP_ENTRY_BYTES = 48
+_DAY_SECONDS = 86400
+
 
 class CachedGuildSettings:
-    
+    # Message pipeline stages, as bits of `get_message_stages`
+    MESSAGE_STAGE_MUSIC_CHANNEL = 1
+    MESSAGE_STAGE_MESSAGE_LIMITING = 2
+    MESSAGE_STAGE_GALLERY = 4
+    MESSAGE_STAGE_AUTO_RESPONSES = 8
+    MESSAGE_STAGE_XP_GAIN = 16
+    MESSAGE_STAGES_AUTOMODERATION = MESSAGE_STAGE_MESSAGE_LIMITING | MESSAGE_STAGE_GALLERY | MESSAGE_STAGE_AUTO_RESPONSES
+
     class Autoresponse:
         def __init__(self,
                      guild_auto_response_id: int, trigger: str, response: str,
@@ -62,11 +82,58 @@ class CachedGuildSettings:
             self.level_up_message_text: str | None = level_up_message_text
             self.level_up_message_minimum_level: int = level_up_message_minimum_level
             self.max_level: int | None = max_level
-            self.stack_level_roles: bool = stack_level_roles
+            self._stack_level_roles: bool = stack_level_roles
             self.level_role_earn_message_text: str | None = level_role_earn_message_text
+            # modify through add_level_role/remove_level_role to keep the level role table up to date
             self.level_role_ids_map: dict[int, set[int]] = level_role_ids_map
             self.ignored_channel_ids: set[int] = ignored_channel_ids
             self.ignored_role_ids: set[int] = ignored_role_ids
+            # level -> level role IDs a member at that level should have, up to the highest level with roles
+            self._level_role_table: list[frozenset[int]] = []
+            self._build_level_role_table()
+
+        @property
+        def stack_level_roles(self) -> bool:
+            return self._stack_level_roles
+
+        @stack_level_roles.setter
+        def stack_level_roles(self, value: bool):
+            self._stack_level_roles = value
+            self._build_level_role_table()
+
+        def add_level_role(self, level: int, role_id: int):
+            if level not in self.level_role_ids_map:
+                self.level_role_ids_map[level] = set()
+            self.level_role_ids_map[level].add(role_id)
+            self._build_level_role_table()
+
+        def remove_level_role(self, level: int, role_id: int):
+            if level in self.level_role_ids_map:
+                self.level_role_ids_map[level].discard(role_id)
+                if not self.level_role_ids_map[level]:
+                    self.level_role_ids_map.pop(level, None)
+            self._build_level_role_table()
+
+        def _build_level_role_table(self):
+            """
+            Precomputes the level role IDs for every level: all roles up to the level if level roles stack,
+            otherwise the roles of the highest level with roles reached.
+            """
+            level_role_table = []
+            level_role_ids = frozenset()
+            for level in range(max(self.level_role_ids_map, default=-1) + 1):
+                if role_ids := self.level_role_ids_map.get(level):
+                    level_role_ids = level_role_ids | role_ids if self._stack_level_roles else frozenset(role_ids)
+                level_role_table.append(level_role_ids)
+            self._level_role_table = level_role_table
+
+        def get_level_role_ids(self, level: int) -> frozenset[int]:
+            """
+            Returns the IDs of the level roles a member at the given level should have.
+            """
+            if not self._level_role_table or level < 0:
+                return frozenset()
+            return self._level_role_table[min(level, len(self._level_role_table) - 1)]
 
     def __init__(self, guild_id: int, guild_settings_id: int):
         self.guild_id: int = guild_id
@@ -80,12 +147,14 @@ class CachedGuildSettings:
         self.channel_id_is_gallery_channel: dict[int, bool] = {}
         self.autoroles_ids: list[int] = []
         self.auto_responses: list[CachedGuildSettings.Autoresponse] = []
+        self._auto_response_matcher: TriggerMatcher | None = None  # compiled on first match after auto responses change
         self.role_menus: list[CachedGuildSettings.RoleMenu] = []
         self._message_id_role_menu_map: dict[int, CachedGuildSettings.RoleMenu] = {}
         self.xp_settings: CachedGuildSettings.XPSettings = ...
 
-        self._cached_at = datetime.now(UTC)
+        self._cached_at = time.monotonic()
         self._is_stale = False
+        self._version: int = 0  # bumped on every write, so refreshes started before one can be discarded
 
     @classmethod
     def from_orm_object(cls, guild_settings: GuildSettings) -> 'CachedGuildSettings':
@@ -93,7 +162,14 @@ class CachedGuildSettings:
         To be called only when all relations are loaded.
         """
         instance = cls(guild_id=guild_settings.guild_id, guild_settings_id=guild_settings.id)
-        instance.set_attributes(
+        instance.refresh_from_orm_object(guild_settings)
+        return instance
+
+    def refresh_from_orm_object(self, guild_settings: GuildSettings):
+        """
+        Updates all values in place from the ORM object, to be called only when all relations are loaded.
+        """
+        self.set_attributes(
             guild_settings=guild_settings,
             guild_channel_settings=guild_settings.channels_settings,
             guild_autoroles=guild_settings.autoroles,
@@ -102,7 +178,15 @@ class CachedGuildSettings:
             guild_xp_settings=guild_settings.xp_settings,
             guild_music_settings=guild_settings.music_settings
         )
-        return instance
+        self._cached_at = time.monotonic()
+        self._is_stale = False
+
+    @classmethod
+    def from_orm_objects(cls, guild_settings_list: list[GuildSettings]) -> list['CachedGuildSettings']:
+        """
+        Bulk version of `from_orm_object`, to be called only when all relations are loaded.
+        """
+        return [cls.from_orm_object(guild_settings) for guild_settings in guild_settings_list]
 
     def set_attributes(self,
                        guild_settings: GuildSettings | NOT_SET_ = NOT_SET,
@@ -139,6 +223,7 @@ class CachedGuildSettings:
                     delete_original=autoresponse.delete_original
                 ) for autoresponse in guild_auto_responses
             ]
+            self._auto_response_matcher = None
         if guild_role_menus is not NOT_SET:
             self.role_menus = [
                 CachedGuildSettings.RoleMenu(
@@ -202,6 +287,7 @@ class CachedGuildSettings:
                 delete_original=delete_original
             )
         )
+        self._auto_response_matcher = None
 
     def remove_auto_response(self, guild_auto_response_id: int):
         """
@@ -211,6 +297,33 @@ class CachedGuildSettings:
             autoresponse for autoresponse in self.auto_responses
             if autoresponse.guild_auto_response_id != guild_auto_response_id
         ]
+        self._auto_response_matcher = None
+
+    def clear_auto_responses(self):
+        """
+        Removes all auto-responses from the cached settings.
+        """
+        self.auto_responses = []
+        self._auto_response_matcher = None
+
+    def invalidate_auto_response_matcher(self):
+        """
+        To be called after editing the trigger or match type of a cached auto-response in place.
+        """
+        self._auto_response_matcher = None
+
+    def get_matching_auto_response(self, content: str) -> 'CachedGuildSettings.Autoresponse | None':
+        """
+        Retrieves the first auto-response (in order) whose trigger matches the message content.
+        """
+        if not self.auto_responses:
+            return None
+        if self._auto_response_matcher is None:
+            self._auto_response_matcher = TriggerMatcher(
+                (autoresponse.trigger, autoresponse.match_type) for autoresponse in self.auto_responses
+            )
+        position = self._auto_response_matcher.match(content)
+        return self.auto_responses[position] if position is not None else None
 
     def get_auto_response(self,
                           guild_auto_response_id: int | None = None,
@@ -265,8 +378,43 @@ class CachedGuildSettings:
 
     @property
     def is_stale(self) -> bool:
-        return self._is_stale or \
-            (datetime.now(UTC) - self._cached_at).total_seconds() > 60 * 60  # 60 minutes
+        return self._is_stale or time.monotonic() - self._cached_at > 60 * 60  # 60 minutes
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def mark_changed(self, written_at: float | None = None):
+        """
+        Records a write of these settings.
+        Args:
+            written_at (float | None): for the commit of a write, monotonic time of the write. If the settings were
+                refreshed since, that refresh read the DB before the commit, so they are marked stale.
+        """
+        self._version += 1
+        if written_at is not None and self._cached_at > written_at:
+            self._is_stale = True
+
+    def mark_stale(self):
+        self._is_stale = True
+
+    def get_message_stages(self, channel_id: int) -> int:
+        """
+        Bitmap of the message pipeline stages (MESSAGE_STAGE_*) that apply to messages in a channel, so messages no
+        feature cares about can be dropped early.
+        """
+        stages = 0
+        if channel_id == self.music_channel_id:
+            stages |= self.MESSAGE_STAGE_MUSIC_CHANNEL
+        if channel_id in self.channel_id_message_limiting_role_id:
+            stages |= self.MESSAGE_STAGE_MESSAGE_LIMITING
+        if channel_id in self.channel_id_is_gallery_channel:
+            stages |= self.MESSAGE_STAGE_GALLERY
+        if self.auto_responses:
+            stages |= self.MESSAGE_STAGE_AUTO_RESPONSES
+        if self.xp_settings.xp_gain_enabled and channel_id not in self.xp_settings.ignored_channel_ids:
+            stages |= self.MESSAGE_STAGE_XP_GAIN
+        return stages
 
 
 class CachedReminder:
@@ -348,7 +496,8 @@ class CachedReminder:
                  reminder_text: str,
                  reminder_time: datetime,
                  was_snoozed: bool,
-                 recurrence: RecurrenceSettings | None):
+                 recurrence: RecurrenceSettings | None,
+                 owner_timezone: str | None = None):
         self.user_reminder_id: int = user_reminder_id
         self.owner_user_id: int = owner_user_id
         self.recipient_user_id: int = recipient_user_id
@@ -356,6 +505,7 @@ class CachedReminder:
         self.reminder_time: datetime = reminder_time
         self.was_snoozed: bool = was_snoozed
         self.recurrence: CachedReminder.RecurrenceSettings | None = recurrence
+        self.owner_timezone: str | None = owner_timezone  # conditioned recurrences follow the owner's calendar
 
     @classmethod
     def from_orm_object(cls, reminder: UserReminder) -> 'CachedReminder':
@@ -376,7 +526,8 @@ class CachedReminder:
             reminder_text=reminder.reminder_text,
             reminder_time=reminder.reminder_time,
             was_snoozed=reminder.is_snoozed,
-            recurrence=recurrence
+            recurrence=recurrence,
+            owner_timezone=reminder.owner.timezone
         )
 
     def __lt__(self, other: 'CachedReminder'):
@@ -409,6 +560,7 @@ class CachedReminder:
         self.reminder_text = reminder.reminder_text
         self.reminder_time = reminder.reminder_time
         self.was_snoozed = reminder.is_snoozed
+        self.owner_timezone = reminder.owner.timezone
         self.recurrence = self.RecurrenceSettings(
             status=reminder.recurrence.status,
             recurrence_type=reminder.recurrence.recurrence_type,
@@ -422,34 +574,119 @@ class CachedReminder:
 
 
 class CachedGuildXP:
+    """
+    Cached XP of all members of a guild, stored column-wise in parallel arrays (one row per member) to keep the
+    memory footprint small for large guilds. Timestamps are stored as epoch seconds.
+    `MemberXP` objects are lightweight views over a row and are created on access.
+    A partial guild XP only holds the members that were loaded for decay and must be fully loaded before other use.
+    """
 
     class MemberXP:
-        def __init__(self, guild_xp: 'CachedGuildXP', user_id: int, user_username: str, xp: int, level: int,
-                     message_count: int, latest_gain_time: datetime, latest_level_up_message_time: datetime | None,
-                     decayed_xp: int, latest_decay_time: datetime | None, latest_message_time: datetime):
+        """
+        View over a single member's row in the columns of a CachedGuildXP.
+        """
+        __slots__ = ('guild_xp', '_row')
+
+        def __init__(self, guild_xp: 'CachedGuildXP', row: int):
             self.guild_xp: 'CachedGuildXP' = guild_xp  # backref just in case
-            self.user_id: int = user_id
-            self.user_username: str = user_username
-            self.xp: int = xp
-            self.level: int = level
-            self.message_count: int = message_count
-            self.latest_gain_time: datetime = latest_gain_time
-            self.latest_level_up_message_time: datetime | None = latest_level_up_message_time
-            self.decayed_xp: int = decayed_xp
-            self.latest_decay_time: datetime | None = latest_decay_time
-            self.latest_message_time: datetime = latest_message_time
-
-            self._is_synced: bool = True
+            self._row: int = row
+
+        def __eq__(self, other):
+            return isinstance(other, CachedGuildXP.MemberXP) and other.guild_xp is self.guild_xp \
+                and other._row == self._row
+
+        def __hash__(self):
+            return hash((id(self.guild_xp), self._row))
+
+        @property
+        def user_id(self) -> int:
+            return self.guild_xp._user_ids[self._row]
+
+        @property
+        def user_username(self) -> str:
+            return self.guild_xp._user_usernames[self._row]
+
+        @user_username.setter
+        def user_username(self, value: str):
+            if self.guild_xp._user_usernames[self._row] != value:
+                self.guild_xp._user_usernames[self._row] = value
+
+        @property
+        def xp(self) -> int:
+            return self.guild_xp._xps[self._row]
+
+        @xp.setter
+        def xp(self, value: int):
+            previous_xp = self.guild_xp._xps[self._row]
+            self.guild_xp._xps[self._row] = value
+            self.guild_xp.update_rank_for(member_xp=self, previous_xp=previous_xp)
+
+        @property
+        def level(self) -> int:
+            return self.guild_xp._levels[self._row]
+
+        @level.setter
+        def level(self, value: int):
+            self.guild_xp._levels[self._row] = value
+
+        @property
+        def message_count(self) -> int:
+            return self.guild_xp._message_counts[self._row]
+
+        @message_count.setter
+        def message_count(self, value: int):
+            self.guild_xp._message_counts[self._row] = value
+
+        @property
+        def decayed_xp(self) -> int:
+            return self.guild_xp._decayed_xps[self._row]
+
+        @decayed_xp.setter
+        def decayed_xp(self, value: int):
+            self.guild_xp._decayed_xps[self._row] = value
+
+        @property
+        def latest_gain_time(self) -> datetime:
+            return _from_epoch(self.guild_xp._latest_gain_times[self._row])
+
+        @latest_gain_time.setter
+        def latest_gain_time(self, value: datetime):
+            self.guild_xp._latest_gain_times[self._row] = _to_epoch(value)
+
+        @property
+        def latest_level_up_message_time(self) -> datetime | None:
+            return _from_epoch(self.guild_xp._latest_level_up_message_times[self._row])
+
+        @latest_level_up_message_time.setter
+        def latest_level_up_message_time(self, value: datetime | None):
+            self.guild_xp._latest_level_up_message_times[self._row] = _to_epoch(value)
+
+        @property
+        def latest_decay_time(self) -> datetime | None:
+            return _from_epoch(self.guild_xp._latest_decay_times[self._row])
+
+        @latest_decay_time.setter
+        def latest_decay_time(self, value: datetime | None):
+            self.guild_xp._latest_decay_times[self._row] = _to_epoch(value)
+
+        @property
+        def latest_message_time(self) -> datetime:
+            return _from_epoch(self.guild_xp._latest_message_times[self._row])
+
+        @latest_message_time.setter
+        def latest_message_time(self, value: datetime):
+            self.guild_xp._latest_message_times[self._row] = _to_epoch(value)
 
         @property
         def is_synced(self) -> bool:
-            return self._is_synced
+            return self.user_id not in self.guild_xp._unsynced_member_ids
 
         @is_synced.setter
         def is_synced(self, value: bool):
-            self._is_synced = value
-            if self.guild_xp.is_synced and not self._is_synced:
-                self.guild_xp.is_synced = False
+            if value:
+                self.guild_xp.mark_member_synced(self.user_id)
+            else:
+                self.guild_xp.mark_member_unsynced(self.user_id)
 
         def set_sync_status(self, is_synced: bool) -> None:
             """
@@ -460,11 +697,9 @@ class CachedGuildXP:
         def decay_xp(self, amount: int, new_level: int | None = None):
             self.decayed_xp += amount
             self.latest_decay_time = datetime.now(UTC)
-            self.xp -= amount
+            self.xp = max(self.xp - amount, 0)
             if new_level is not None:
                 self.level = new_level
-            if self.xp < 0:
-                self.xp = 0
             self.is_synced = False
 
         def gain_xp(self, amount: int, new_level: int | None = None):
@@ -474,17 +709,15 @@ class CachedGuildXP:
             self.latest_gain_time = datetime.now(UTC)
             self.is_synced = False
 
-        def register_message(self, message_time: datetime | None = None):
-            self.message_count += 1
+        def register_message(self, message_time: datetime | None = None, count: int = 1):
+            self.message_count += count
             self.latest_message_time = message_time or datetime.now(UTC)
             self.is_synced = False
 
         def offset_xp(self, amount: int, new_level: int | None = None):
-            self.xp += amount
+            self.xp = max(self.xp + amount, 0)
             if new_level is not None:
                 self.level = new_level
-            if self.xp < 0:
-                self.xp = 0
             self.is_synced = False
 
         def register_level_up_message(self):
@@ -494,8 +727,10 @@ class CachedGuildXP:
         @classmethod
         def from_orm_object(cls, guild_xp: 'CachedGuildXP',
                             guild_user_xp: GuildUserXP) -> 'CachedGuildXP.MemberXP':
-            return cls(
-                guild_xp=guild_xp,
+            """
+            Appends the ORM object's data as a new row of the guild XP and returns its view.
+            """
+            row = guild_xp._append_row(
                 user_id=guild_user_xp.user_id,
                 user_username=guild_user_xp.user_username,
                 xp=guild_user_xp.xp,
@@ -507,14 +742,53 @@ class CachedGuildXP:
                 latest_decay_time=guild_user_xp.latest_decay_time,
                 latest_message_time=guild_user_xp.latest_message_time
             )
+            return cls(guild_xp=guild_xp, row=row)
 
-    def __init__(self, guild_id: int, guild_settings_id: int):
+    def __init__(self, guild_id: int, guild_settings_id: int, is_partial: bool = False):
         self.guild_id: int = guild_id
         self.guild_settings_id: int = guild_settings_id
-        self._member_xps: list[CachedGuildXP.MemberXP] = None  # noqa: to be set later
-        self._member_id_member_xp_map: dict[int, CachedGuildXP.MemberXP] = {}
+        self.is_partial: bool = is_partial
+        # member columns, one row per member
+        self._user_ids: array = array('q')
+        self._user_usernames: list[str] = []
+        self._xps: array = array('q')
+        self._levels: array = array('i')
+        self._message_counts: array = array('q')
+        self._decayed_xps: array = array('q')
+        self._latest_gain_times: array = array('d')
+        self._latest_level_up_message_times: array = array('d')
+        self._latest_decay_times: array = array('d')
+        self._latest_message_times: array = array('d')
+        self._member_id_row_map: dict[int, int] = {}
+        # rank key (see _rank_key) for every member, kept sorted so ranks and leaderboard pages are O(log n) lookups
+        self._ranked_member_keys: SortedList = SortedList()
+        # decay key (see _decay_key) for every member, as a min-heap built on first use for the guild's grace period
+        self._decay_heap: list[int] = []
+        self._decay_heap_grace_days: int | None = None
 
         self._is_synced: bool = True
+        self._unsynced_member_ids: set[int] = set()
+        self._changed_member_ids: set[int] | None = None  # members changed since `track_changes`, None if not tracked
+        self.last_accessed_at: float = time.monotonic()
+
+    def touch(self):
+        """
+        Marks the guild XP as recently used, for cache eviction.
+        """
+        self.last_accessed_at = time.monotonic()
+
+    @property
+    def estimated_bytes(self) -> int:
+        """
+        Returns an estimate of the memory held by this guild XP.
+        """
+        column_bytes = sum(column.itemsize * len(column) for column in (
+            self._user_ids, self._xps, self._levels, self._message_counts, self._decayed_xps,
+            self._latest_gain_times, self._latest_level_up_message_times, self._latest_decay_times,
+            self._latest_message_times
+        ))
+        return column_bytes + self.member_count * _ESTIMATED_MEMBER_OVERHEAD_BYTES \
+            + len(self._decay_heap) * _ESTIMATED_DECAY_HEAP_ENTRY_BYTES
 
     @property
     def is_synced(self) -> bool:
@@ -523,41 +797,94 @@ class CachedGuildXP:
     @is_synced.setter
     def is_synced(self, value: bool):
         self._is_synced = value
+        if value:
+            cache.UNSYNCED_GUILD_XP_IDS.discard(self.guild_id)
+        else:
+            cache.UNSYNCED_GUILD_XP_IDS.add(self.guild_id)
+
+    @property
+    def unsynced_member_count(self) -> int:
+        return len(self._unsynced_member_ids)
+
+    def mark_member_unsynced(self, user_id: int):
+        """
+        Adds the member to the dirty set of this guild and the guild to the global dirty set.
+        """
+        self._unsynced_member_ids.add(user_id)
+        if self._changed_member_ids is not None:
+            self._changed_member_ids.add(user_id)
+        if self._is_synced:
+            self.is_synced = False
+
+    def track_changes(self, enabled: bool = True):
+        """
+        Starts (or stops) recording which members change, whether they get synced or not. Used while a load that is
+        to replace this instance is in flight, as changes synced meanwhile may be missing from the rows it read.
+        """
+        self._changed_member_ids = set() if enabled else None
+
+    def mark_member_synced(self, user_id: int):
+        self._unsynced_member_ids.discard(user_id)
 
     @property
     def member_count(self) -> int:
         """
         Returns the total number of members with XP in the guild.
         """
-        return len(self._member_xps)
+        return len(self._user_ids)
+
+    def _append_row(self, user_id: int, user_username: str, xp: int, level: int, message_count: int,
+                    latest_gain_time: datetime, latest_level_up_message_time: datetime | None, decayed_xp: int,
+                    latest_decay_time: datetime | None, latest_message_time: datetime) -> int:
+        """
+        Appends a member row to the columns and returns its index. Does not touch the ranked index.
+        """
+        row = len(self._user_ids)
+        self._user_ids.append(user_id)
+        self._user_usernames.append(user_username)
+        self._xps.append(xp)
+        self._levels.append(level)
+        self._message_counts.append(message_count)
+        self._decayed_xps.append(decayed_xp)
+        self._latest_gain_times.append(_to_epoch(latest_gain_time))
+        self._latest_level_up_message_times.append(_to_epoch(latest_level_up_message_time))
+        self._latest_decay_times.append(_to_epoch(latest_decay_time))
+        self._latest_message_times.append(_to_epoch(latest_message_time))
+        self._member_id_row_map[user_id] = row
+        return row
 
     def get_xp_for(self, user_id: int) -> 'CachedGuildXP.MemberXP':
-        return self._member_id_member_xp_map.get(user_id)
+        row = self._member_id_row_map.get(user_id)
+        return CachedGuildXP.MemberXP(guild_xp=self, row=row) if row is not None else None
 
     def initiate_member_xp(self, user_id: int, user_username: str) -> 'CachedGuildXP.MemberXP':
         """
         Initiates a new member XP entry for the given user.
         """
-        if user_id in self._member_id_member_xp_map:
+        if user_id in self._member_id_row_map:
             raise ValueError(f"Member XP for user {user_id} already exists.")
         if not user_username:
             raise ValueError("user_username must be provided.")
 
-        member_xp = CachedGuildXP.MemberXP(
-            guild_xp=self,
+        now = datetime.now(UTC)
+        row = self._append_row(
             user_id=user_id,
             user_username=user_username,
             xp=0,
             level=0,
             message_count=0,
-            latest_gain_time=datetime.now(UTC),
+            latest_gain_time=now,
             latest_level_up_message_time=None,
             decayed_xp=0,
             latest_decay_time=None,
-            latest_message_time=datetime.now(UTC)
+            latest_message_time=now
         )
-        self._member_xps.append(member_xp)
-        self._member_id_member_xp_map[user_id] = member_xp
+        self._ranked_member_keys.add(_rank_key(xp=0, user_id=user_id))
+        if self._decay_heap_grace_days is not None:
+            heappush(self._decay_heap, _decay_key(
+                due_time=self._get_decay_due_time(row, self._decay_heap_grace_days * _DAY_SECONDS), user_id=user_id
+            ))
+        member_xp = CachedGuildXP.MemberXP(guild_xp=self, row=row)
         member_xp.is_synced = False
         return member_xp
 
@@ -567,49 +894,168 @@ class CachedGuildXP:
         """
         if self.is_synced:
             return []
-        return [member_xp for member_xp in self._member_xps if not member_xp.is_synced]
+        return [CachedGuildXP.MemberXP(guild_xp=self, row=self._member_id_row_map[user_id])
+                for user_id in self._unsynced_member_ids]
 
-    def get_xps_with_last_message_time_before(self, time: datetime) -> list['CachedGuildXP.MemberXP']:
+    def _get_decay_due_time(self, row: int, grace_seconds: int) -> float:
         """
-        Returns a list of member XPs that have their last message time before the given time.
+        Returns the epoch time the member of the given row is due for decay at: once the grace period has passed
+        since their latest message, and at most once a day.
         """
-        return [member_xp for member_xp in self._member_xps if member_xp.latest_message_time < time]
+        # a missing decay time is -inf, so it never wins the max
+        return max(self._latest_message_times[row] + grace_seconds, self._latest_decay_times[row] + _DAY_SECONDS)
 
-    def resort_members_by_xp(self):
+    def _rebuild_decay_heap(self, grace_days: int):
+        grace_seconds = grace_days * _DAY_SECONDS
+        self._decay_heap = [
+            _decay_key(due_time=max(latest_message_time + grace_seconds, latest_decay_time + _DAY_SECONDS),
+                       user_id=user_id)
+            for user_id, latest_message_time, latest_decay_time
+            in zip(self._user_ids, self._latest_message_times, self._latest_decay_times)
+        ]
+        heapify(self._decay_heap)
+        self._decay_heap_grace_days = grace_days
+
+    def pop_decay_due_xps(self, grace_days: int, time: datetime) -> list['CachedGuildXP.MemberXP']:
         """
-        Resorts the member XP list by XP in descending order.
+        Returns member XPs due for decay at the given time and reschedules them for a day later.
+        The decay schedule is a min-heap keyed on the due time, refreshed lazily: members who became active since they
+        were scheduled are pushed back to their actual due time when popped. Members without XP are skipped.
+        Only the due entries are touched, so this costs O(k log n) for k due members instead of a full scan.
+        Args:
+            grace_days (int): decay grace period of the guild. The schedule is rebuilt if it changed.
+            time (datetime): time to check due members at.
         """
-        self._member_xps.sort(key=lambda member_xp: member_xp.xp, reverse=True)
+        if self._decay_heap_grace_days != grace_days:
+            self._rebuild_decay_heap(grace_days)
+        grace_seconds = grace_days * _DAY_SECONDS
+        now = _to_epoch(time)
+        due_xps = []
+        rescheduled_keys = []
+        while self._decay_heap and self._decay_heap[0] >> 64 <= now:
+            user_id = heappop(self._decay_heap) & _USER_ID_MASK
+            row = self._member_id_row_map[user_id]
+            if (due_time := self._get_decay_due_time(row, grace_seconds)) > now:
+                rescheduled_keys.append(_decay_key(due_time=due_time, user_id=user_id))
+                continue
+            rescheduled_keys.append(_decay_key(due_time=now + _DAY_SECONDS, user_id=user_id))
+            if self._xps[row] > 0:
+                due_xps.append(CachedGuildXP.MemberXP(guild_xp=self, row=row))
+        for decay_key in rescheduled_keys:  # pushed afterward, an entry can still round down to a due second
+            heappush(self._decay_heap, decay_key)
+        return due_xps
+
+    def update_rank_for(self, member_xp: 'CachedGuildXP.MemberXP', previous_xp: int):
+        """
+        Moves the member to its new position in the ranked index after an XP change.
+        """
+        if previous_xp == member_xp.xp:
+            return
+        self._ranked_member_keys.remove(_rank_key(xp=previous_xp, user_id=member_xp.user_id))
+        self._ranked_member_keys.add(_rank_key(xp=member_xp.xp, user_id=member_xp.user_id))
 
     def get_members_xp_page(self, page: int, page_size: int = 10) -> list['CachedGuildXP.MemberXP']:
         """
-        Returns a paginated list of member XPs sorted by XP in descending order.
+        Returns a paginated list of member XPs sorted by XP in descending order (ties broken by user ID).
         """
-        self.resort_members_by_xp()
         start_index = (page - 1) * page_size
         end_index = start_index + page_size
-        return self._member_xps[start_index:end_index]
+        return [CachedGuildXP.MemberXP(guild_xp=self, row=self._member_id_row_map[rank_key & _USER_ID_MASK])
+                for rank_key in self._ranked_member_keys[start_index:end_index]]
 
-    def get_rank_for(self, member_id: int, resort_members: bool = True) -> int:
+    def get_rank_for(self, member_id: int) -> int:
         """
         Returns the rank of the member in the guild based on their XP.
         """
-        if member_id not in self._member_id_member_xp_map:
-            return len(self._member_xps) + 1
-        if resort_members:
-            self._member_xps.sort(key=lambda member_xp: member_xp.xp, reverse=True)
-        sorted_member_ids = [member_xp.user_id for member_xp in self._member_xps]
-        return sorted_member_ids.index(member_id) + 1
+        if (row := self._member_id_row_map.get(member_id)) is None:
+            return self.member_count + 1
+        return self._ranked_member_keys.index(_rank_key(xp=self._xps[row], user_id=member_id)) + 1
+
+    def merge_unsynced_from(self, other: 'CachedGuildXP', all_members: bool = False):
+        """
+        Copies the members with changes pending a sync, or changed since `other.track_changes`, from another instance
+        of the same guild (e.g. a partial load) into this one, so that replacing the cached instance does not lose
+        them. Copied members are marked unsynced.
+        Args:
+            other (CachedGuildXP): The instance to copy members from.
+            all_members (bool): Copy all members of the other instance, e.g. if it was loaded after this one.
+        """
+        if all_members:
+            user_ids = other._user_ids
+        else:
+            user_ids = other._unsynced_member_ids | (other._changed_member_ids or set())
+        for member_xp in [other.get_xp_for(user_id) for user_id in user_ids]:
+            if not (own_member_xp := self.get_xp_for(member_xp.user_id)):
+                own_member_xp = self.initiate_member_xp(user_id=member_xp.user_id,
+                                                        user_username=member_xp.user_username)
+            own_member_xp.user_username = member_xp.user_username
+            own_member_xp.xp = member_xp.xp
+            own_member_xp.level = member_xp.level
+            own_member_xp.message_count = member_xp.message_count
+            own_member_xp.latest_gain_time = member_xp.latest_gain_time
+            own_member_xp.latest_level_up_message_time = member_xp.latest_level_up_message_time
+            own_member_xp.decayed_xp = member_xp.decayed_xp
+            own_member_xp.latest_decay_time = member_xp.latest_decay_time
+            own_member_xp.latest_message_time = member_xp.latest_message_time
+            own_member_xp.is_synced = False
+        self._decay_heap_grace_days = None  # due times may have changed, rebuild on next use
 
     @classmethod
-    def from_orm_objects(cls, guild_id, guild_settings_id, guild_user_xps: list[GuildUserXP]) -> 'CachedGuildXP':
+    def from_orm_objects(cls, guild_id, guild_settings_id, guild_user_xps: list[GuildUserXP],
+                         is_partial: bool = False) -> 'CachedGuildXP':
         """
         Creates a CachedGuildXP instance from ORM objects.
         """
-        instance = cls(guild_id=guild_id, guild_settings_id=guild_settings_id)
-        instance._member_xps = [
-            CachedGuildXP.MemberXP.from_orm_object(guild_xp=instance, guild_user_xp=guild_user_xp)
-            for guild_user_xp in guild_user_xps
-        ]
-        instance._member_id_member_xp_map = {member_xp.user_id: member_xp for member_xp in instance._member_xps}
+        instance = cls(guild_id=guild_id, guild_settings_id=guild_settings_id, is_partial=is_partial)
+        # fill the columns one at a time, a row-by-row append costs ~10 calls per member
+        instance._user_ids.extend(guild_user_xp.user_id for guild_user_xp in guild_user_xps)
+        instance._user_usernames = [guild_user_xp.user_username for guild_user_xp in guild_user_xps]
+        instance._xps.extend(guild_user_xp.xp for guild_user_xp in guild_user_xps)
+        instance._levels.extend(guild_user_xp.level for guild_user_xp in guild_user_xps)
+        instance._message_counts.extend(guild_user_xp.message_count for guild_user_xp in guild_user_xps)
+        instance._decayed_xps.extend(guild_user_xp.decayed_xp for guild_user_xp in guild_user_xps)
+        instance._latest_gain_times.extend(_to_epoch(guild_user_xp.latest_gain_time)
+                                           for guild_user_xp in guild_user_xps)
+        instance._latest_level_up_message_times.extend(_to_epoch(guild_user_xp.latest_level_up_message_time)
+                                                       for guild_user_xp in guild_user_xps)
+        instance._latest_decay_times.extend(_to_epoch(guild_user_xp.latest_decay_time)
+                                            for guild_user_xp in guild_user_xps)
+        instance._latest_message_times.extend(_to_epoch(guild_user_xp.latest_message_time)
+                                              for guild_user_xp in guild_user_xps)
+        instance._member_id_row_map = {user_id: row for row, user_id in enumerate(instance._user_ids)}
+        instance._ranked_member_keys = SortedList(map(_rank_key, instance._xps, instance._user_ids))
         return instance
+
+
+def _rank_key(xp: int, user_id: int) -> int:
+    """
+    Packs (-xp, user_id) into a single int, ordering members by XP descending, ties broken by user ID.
+    A plain int takes a fraction of the memory of a tuple of two ints.
+    """
+    return (-xp << 64) | user_id
+
+
+def _decay_key(due_time: float, user_id: int) -> int:
+    """
+    Packs (due epoch second, user_id) into a single int for the decay heap. The due time is rounded down (and clamped
+    to 0, as it is -inf for members without message nor decay time), popped entries are checked against their exact
+    due time.
+    """
+    return (int(max(due_time, 0)) << 64) | user_id
+
+
+def _to_epoch(value: datetime | None) -> float:
+    """
+    Converts a datetime to epoch seconds for columnar storage (None is stored as a sentinel).
+    """
+    if value is None:
+        return _NO_TIME
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.timestamp()
+
+
+def _from_epoch(value: float) -> datetime | None:
+    if value == _NO_TIME:
+        return None
+    return datetime.fromtimestamp(value, UTC)
@@ -1,4 +1,7 @@
+from array import array
+from bisect import bisect_right
 from datetime import datetime
+from typing import Iterable
 
 
 class XPAction:
@@ -14,6 +17,59 @@ class XPAction:
         return f"XPAction(guild_id={self.guild_id}, member_id={self.member_id}, xp_offset={self.xp_offset})"
 
 
+class XPMessageEvent:
+    """
+    One or more queued messages from the same member, folded into a single event for XP processing.
+    """
+    def __init__(self, guild_id: int, member_id: int, username: str, channel_id: int, message_time: datetime,
+                 is_booster: bool):
+        self.guild_id: int = guild_id
+        self.member_id: int = member_id
+        self.username: str = username
+        self.channel_id: int = channel_id  # channel of the latest message, used for level-up messages
+        self.first_message_time: datetime = message_time
+        self.latest_message_time: datetime = message_time
+        self.is_booster: bool = is_booster
+        self.message_count: int = 1
+
+    def add_message(self, channel_id: int, message_time: datetime, is_booster: bool):
+        self.channel_id = channel_id
+        self.latest_message_time = max(self.latest_message_time, message_time)
+        self.is_booster = is_booster
+        self.message_count += 1
+
+    def __str__(self):
+        return (f"XPMessageEvent(guild_id={self.guild_id}, member_id={self.member_id}, "
+                f"message_count={self.message_count})")
+
+
+class XPLevelUpdate:
+    """
+    Pending level role/level-up message handling for a member, coalescing level changes until it is handled.
+    """
+    def __init__(self, guild_id: int, member_id: int, level_change_reason: str, channel_id: int | None = None,
+                 level_up_message_level: int | None = None):
+        self.guild_id: int = guild_id
+        self.member_id: int = member_id
+        self.level_change_reason: str = level_change_reason
+        self.channel_id: int | None = channel_id  # set if a level-up message should be sent
+        # level reached by the level-up the message is for, it's only sent if the member is still at least at it
+        self.level_up_message_level: int | None = level_up_message_level
+        self.update_count: int = 1
+
+    def add_update(self, level_change_reason: str, channel_id: int | None = None,
+                   level_up_message_level: int | None = None):
+        self.level_change_reason = level_change_reason
+        if channel_id:
+            self.channel_id = channel_id
+            self.level_up_message_level = level_up_message_level
+        self.update_count += 1
+
+    def __str__(self):
+        return (f"XPLevelUpdate(guild_id={self.guild_id}, member_id={self.member_id}, "
+                f"update_count={self.update_count})")
+
+
 class XPDecayItem:
     def __init__(self, guild_id: int, member_id: int, username: str, next_decay: datetime):
         self.guild_id: int = guild_id
@@ -29,3 +85,36 @@ class XPDecayItem:
 
     def __str__(self):
         return f"XPDecayItem(guild_id={self.guild_id}, member_id={self.member_id}, next_decay={self.next_decay})"
+
+
+class XPLevelTable:
+    """
+    XP requirements of the XP model as sorted `array('q')` columns, for bisect-based level lookups.
+    Thresholds truncated at a given max level are built once and reused, so clamping costs nothing per lookup.
+    """
+    def __init__(self, level_xp_map: dict[int, int]):
+        sorted_requirements = sorted(level_xp_map.items(), key=lambda level_xp: (level_xp[1], level_xp[0]))
+        self.thresholds: array = array('q', [xp for _, xp in sorted_requirements])
+        self.levels: array = array('q', [level for level, _ in sorted_requirements])
+        self._clamped_thresholds: dict[int, array] = {}
+
+    def _get_thresholds(self, max_level: int | None) -> array:
+        if max_level is None:
+            return self.thresholds
+        if (thresholds := self._clamped_thresholds.get(max_level)) is None:
+            thresholds = self._clamped_thresholds[max_level] = self.thresholds[:bisect_right(self.levels, max_level)]
+        return thresholds
+
+    def get_level_at_xp(self, xp: int, max_level: int | None = None) -> int:
+        """
+        Returns the highest level whose XP requirement is met by `xp`, capped at `max_level` if given.
+        """
+        index = bisect_right(self._get_thresholds(max_level), xp) - 1
+        return self.levels[index] if index >= 0 else 0
+
+    def get_levels_at_xps(self, xps: Iterable[int], max_level: int | None = None) -> list[int]:
+        """
+        Batch version of `get_level_at_xp`, resolving the clamped thresholds once for the whole batch.
+        """
+        thresholds, levels = self._get_thresholds(max_level), self.levels
+        return [levels[index] if (index := bisect_right(thresholds, xp) - 1) >= 0 else 0 for xp in xps]
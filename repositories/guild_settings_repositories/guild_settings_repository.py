@@ -1,7 +1,7 @@
 from typing import Iterable
 
 from sqlalchemy import select, update
-from sqlalchemy.orm import joinedload, load_only, contains_eager
+from sqlalchemy.orm import joinedload, load_only, contains_eager, selectinload
 
 from models.guild_settings_models import GuildSettings, GuildRoleMenu, GuildXPSettings
 from repositories import BaseRepo
@@ -60,6 +60,23 @@ class GuildSettingsRepo(BaseRepo):
             query = query.options(load_only(*only))
         return (await self._session.execute(query)).unique().scalar_one_or_none()
 
+    async def get_guild_settings_for_guilds(self, guild_ids: Iterable[int]) -> list[GuildSettings]:
+        """
+        Retrieve guild settings with all relations loaded for several guild IDs at once.
+        Relations are loaded with one `IN (...)` query each instead of joins, so the row count doesn't multiply.
+        """
+        query = select(GuildSettings).where(GuildSettings.guild_id.in_(guild_ids)).options(
+            selectinload(GuildSettings.channels_settings),
+            selectinload(GuildSettings.autoroles),
+            selectinload(GuildSettings.auto_responses),
+            selectinload(GuildSettings.role_menus).selectinload(GuildRoleMenu.restricted_roles),
+            selectinload(GuildSettings.music_settings),
+            selectinload(GuildSettings.xp_settings).selectinload(GuildXPSettings.level_roles),
+            selectinload(GuildSettings.xp_settings).selectinload(GuildXPSettings.ignored_channels),
+            selectinload(GuildSettings.xp_settings).selectinload(GuildXPSettings.ignored_roles),
+        )
+        return list((await self._session.execute(query)).scalars().all())
+
     async def update_guild_settings(self, guild_settings_id: int, **update_data) -> None:
         """
         Update guild settings for a specific guild.
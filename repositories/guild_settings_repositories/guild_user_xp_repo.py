@@ -1,4 +1,5 @@
 from datetime import datetime
+from itertools import batched
 from typing import Any
 
 from sqlalchemy import or_, and_, select
@@ -51,7 +52,9 @@ class GuildUserXPRepo(BaseRepo):
             select(GuildUserXP).filter(GuildUserXP.guild_settings_id == guild_settings_id)
         )).scalars().all()
 
-    async def bulk_upsert_guild_user_xp(self, upsert_data: dict[tuple[int, int], dict[str, Any]]):
+    async def bulk_upsert_guild_user_xp(self,
+                                        upsert_data: dict[tuple[int, int], dict[str, Any]],
+                                        chunk_size: int | None = None):
         """
         Bulk upsert guild user XP records.
         Upsert data will be formatted as such:
@@ -67,43 +70,47 @@ class GuildUserXPRepo(BaseRepo):
                 'latest_message_time': datetime
             }}
         if a record matching (guild_settings_id, user_id) key is found, then it will be updated with the provided data.
+        If chunk_size is given, rows are split into multiple statements of at most chunk_size rows each
+        (within the current transaction), keeping each statement below max_allowed_packet.
         """
-        stmt = insert(GuildUserXP).values([
+        rows = [
             {
                 'guild_settings_id': guild_settings_id,
                 'user_id': user_id,
                 **data
             } for (guild_settings_id, user_id), data in upsert_data.items()
-        ])
-
-        stmt = stmt.on_duplicate_key_update(
-            user_username=stmt.inserted.user_username,
-            xp=stmt.inserted.xp,
-            level=stmt.inserted.level,
-            message_count=stmt.inserted.message_count,
-            latest_gain_time=stmt.inserted.latest_gain_time,
-            latest_level_up_message_time=stmt.inserted.latest_level_up_message_time,
-            decayed_xp=stmt.inserted.decayed_xp,
-            latest_decay_time=stmt.inserted.latest_decay_time,
-            latest_message_time=stmt.inserted.latest_message_time,
-        )
-
-        await self._session.execute(stmt)
+        ]
+        for chunk in batched(rows, chunk_size or len(rows) or 1):
+            stmt = insert(GuildUserXP).values(list(chunk))
+            stmt = stmt.on_duplicate_key_update(
+                user_username=stmt.inserted.user_username,
+                xp=stmt.inserted.xp,
+                level=stmt.inserted.level,
+                message_count=stmt.inserted.message_count,
+                latest_gain_time=stmt.inserted.latest_gain_time,
+                latest_level_up_message_time=stmt.inserted.latest_level_up_message_time,
+                decayed_xp=stmt.inserted.decayed_xp,
+                latest_decay_time=stmt.inserted.latest_decay_time,
+                latest_message_time=stmt.inserted.latest_message_time,
+            )
+            await self._session.execute(stmt)
         await self._session.flush()
 
-    async def get_guild_settings_ids_with_decay_eligible_members(
+    async def get_decay_eligible_for_guilds(
             self, guild_settings_id_last_message_time_pairs: list[tuple[int, datetime]]
-    ) -> list[int]:
+    ) -> list[GuildUserXP]:
         """
-        Get unique guild_setting_id values where any of the conditions are met for each pair in the given list:
+        Get the guild user XP records eligible for decay, where any of the conditions are met for each pair in the
+        given list:
             - guild_settings_id matches the given guild_settings_id.
-            - latest_message_time is older than the current time.
+            - latest_message_time is older than the given time.
+        Records without XP are left out as there is nothing to decay.
         Args:
             guild_settings_id_last_message_time_pairs (list[tuple[int, datetime]]): List of tuples containing
                 guild_settings_id and max latest_message_time to filter by.
 
         Returns:
-            list[int]: List of unique guild_settings_id values that match the conditions.
+            list[GuildUserXP]: List of GuildUserXP records that match the conditions.
         """
         if not guild_settings_id_last_message_time_pairs:
             return []
@@ -114,23 +121,5 @@ class GuildUserXPRepo(BaseRepo):
             for guild_settings_id, last_message_time in guild_settings_id_last_message_time_pairs
         ]
 
-        query = select(GuildUserXP.guild_settings_id).filter(
-            or_(*or_conditions)
-        ).distinct()
-        result = await self._session.execute(query)
-        return [row[0] for row in result]
-
-    async def get_all_for_guilds(self, guild_settings_ids: list[int]) -> list[GuildUserXP]:
-        """
-        Get all guild user XP records for a list of guilds.
-        Args:
-            guild_settings_ids (list[int]): List of guild settings IDs to filter by.
-
-        Returns:
-            list[GuildUserXP]: List of GuildUserXP records for the specified guilds.
-        """
-        if not guild_settings_ids:
-            return []
-        return (await self._session.execute(
-            select(GuildUserXP).filter(GuildUserXP.guild_settings_id.in_(guild_settings_ids))
-        )).scalars().all()
+        query = select(GuildUserXP).filter(or_(*or_conditions)).filter(GuildUserXP.xp > 0)
+        return (await self._session.execute(query)).scalars().all()
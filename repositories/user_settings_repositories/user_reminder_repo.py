@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Iterable, Any
+from typing import Iterable, Any, Collection
 
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, or_, and_, case, literal
 from sqlalchemy.orm import joinedload, contains_eager, load_only
 
 from constants import ReminderRecurrenceStatus, ReminderStatus
@@ -87,6 +87,38 @@ class UserReminderRepo(BaseRepo):
         result = await self._session.execute(query)
         return result.scalars().all()
 
+    async def get_reminders_changed_since(self,
+                                          updated_since: datetime,
+                                          due_from: datetime,
+                                          due_before: datetime) -> list[UserReminder]:
+        """
+        Get reminders of any status whose reminder or recurrence was updated after the specified time, along with the
+        active reminders due in the specified window. Owner, recipient and recurrence settings are loaded.
+        """
+        query = select(UserReminder) \
+            .outerjoin(UserReminderRecurrence, UserReminderRecurrence.user_reminder_id == UserReminder.id) \
+            .where(or_(UserReminder.updated_at > updated_since,
+                       UserReminderRecurrence.updated_at > updated_since,
+                       and_(UserReminder.status == ReminderStatus.ACTIVE,
+                            UserReminder.reminder_time >= due_from,
+                            UserReminder.reminder_time < due_before))) \
+            .options(contains_eager(UserReminder.recurrence),
+                     joinedload(UserReminder.owner),
+                     joinedload(UserReminder.recipient))
+        result = await self._session.execute(query)
+        return result.unique().scalars().all()
+
+    async def get_reminders_by_ids(self, reminder_ids: Iterable[int]) -> list[UserReminder]:
+        """
+        Get reminders by their IDs, of any status. Owner, recipient and recurrence settings are loaded.
+        """
+        query = select(UserReminder).where(UserReminder.id.in_(reminder_ids)) \
+            .options(joinedload(UserReminder.recurrence),
+                     joinedload(UserReminder.owner),
+                     joinedload(UserReminder.recipient))
+        result = await self._session.execute(query)
+        return result.unique().scalars().all()
+
     async def update_reminder(self,
                               reminder_id: int | None = None,
                               reminder: UserReminder | None = None,
@@ -107,6 +139,31 @@ class UserReminderRepo(BaseRepo):
         else:
             raise ValueError("Either reminder_id or reminder must be provided.")
 
+    async def update_reminders_post_delivery(self,
+                                             archived_reminder_ids: Collection[int],
+                                             reminder_times: dict[int, datetime]) -> None:
+        """
+        Archive delivered reminders and move the others to their next delivery time, in a single UPDATE statement.
+        """
+        if not archived_reminder_ids and not reminder_times:
+            return
+        update_data = {}
+        if archived_reminder_ids:
+            update_data['status'] = case((UserReminder.id.in_(archived_reminder_ids), ReminderStatus.ARCHIVED),
+                                         else_=UserReminder.status)
+        if reminder_times:
+            update_data['reminder_time'] = case(
+                *((UserReminder.id == reminder_id, literal(reminder_time, UserReminder.reminder_time.type))
+                  for reminder_id, reminder_time in reminder_times.items()),
+                else_=UserReminder.reminder_time
+            )
+        await self._session.execute(
+            update(UserReminder)
+            .where(UserReminder.id.in_([*archived_reminder_ids, *reminder_times]))
+            .values(**update_data)
+        )
+        await self._session.flush()
+
     # noinspection PyTypeChecker
     async def create_reminder_recurrence(self,
                                          user_reminder_id: int,
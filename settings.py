@@ -30,6 +30,12 @@ DB_CONFIG = {
     "port": int(os.environ['DB_PORT']),
     "database": os.environ['DB_NAME'],
 }
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 20))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get('DB_POOL_TIMEOUT_SECONDS', 30))
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get('DB_POOL_RECYCLE_SECONDS', -1))  # -1 = never recycle
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'false').lower() == 'true'
+DB_SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('DB_SLOW_QUERY_THRESHOLD_MS', 500))
 
 # App configs
 SYNC_COMMANDS_ON_STARTUP = os.environ.get('SYNC_COMMANDS_ON_STARTUP', 'true').lower() == 'true'
@@ -38,3 +44,17 @@ ENABLE_API_SERVICE = os.environ.get('ENABLE_API_SERVICE', 'true').lower() == 'tr
 API_SERVICE_PORT = int(os.environ.get('API_SERVICE_PORT', 8000))
 OWNER_COMMAND_PREFIX = os.environ.get('OWNER_COMMAND_PREFIX', '..')
 CHUNK_GUILDS_SETTING = os.environ.get('CHUNK_GUILDS_SETTING', ChunkGuildsSetting.LAZY)
+GUILD_SETTINGS_WARM_UP_BATCH_SIZE = int(os.environ.get('GUILD_SETTINGS_WARM_UP_BATCH_SIZE', 500))  # 0 = no warm-up
+
+# XP processing
+XP_MESSAGE_CONSUMER_SHARDS = int(os.environ.get('XP_MESSAGE_CONSUMER_SHARDS', 0))  # 0 = single consumer
+XP_CONSUMER_BATCH_SIZE = int(os.environ.get('XP_CONSUMER_BATCH_SIZE', 500))  # max messages/actions per batch
+XP_CONSUMER_BATCH_WAIT_MS = int(os.environ.get('XP_CONSUMER_BATCH_WAIT_MS', 20))  # max wait to fill a batch
+XP_SYNC_UPSERT_CHUNK_SIZE = int(os.environ.get('XP_SYNC_UPSERT_CHUNK_SIZE', 1000))  # rows per upsert statement
+XP_SYNC_TRANSACTION_PER_CHUNK = os.environ.get('XP_SYNC_TRANSACTION_PER_CHUNK', 'true').lower() == 'true'
+XP_CACHE_MEMORY_BUDGET_MB = int(os.environ.get('XP_CACHE_MEMORY_BUDGET_MB', 256))  # 0 = no budget
+XP_CACHE_IDLE_EVICTION_MINUTES = int(os.environ.get('XP_CACHE_IDLE_EVICTION_MINUTES', 60))  # 0 = never idle-evict
+
+# Reminders
+REMINDER_FULL_RECONCILE_MINUTES = int(os.environ.get('REMINDER_FULL_RECONCILE_MINUTES', 10))  # full reload interval
+REMINDER_DELIVERY_CONCURRENCY = int(os.environ.get('REMINDER_DELIVERY_CONCURRENCY', 10))  # max concurrent sends
@@ -0,0 +1,274 @@
+"""
+Occurrences of recurring reminders, computed directly rather than by stepping through every missed occurrence.
+
+Conditioned recurrences follow the owner's calendar, keeping the time of day of the reminder in UTC: each occurrence
+is the next matching calendar day of the previous one (in the timezone it was in), at the same UTC time. Between two
+UTC offset transitions of the timezone, the calendar day of every occurrence is therefore shifted from its UTC day by
+the same amount, so the occurrences there are simply the matching calendar days and can be jumped over at once.
+"""
+import calendar
+import math
+import sys
+from bisect import bisect_right
+from datetime import datetime, date, timedelta, UTC
+from functools import lru_cache
+from typing import Iterator
+
+import pytz
+
+from constants import REMINDER_YEAR_DAY_FORMAT, ReminderRecurrenceBasicUnit, ReminderRecurrenceConditionedType
+from models.dto.cachables import CachedReminder
+
+_SECONDS_PER_DAY = 86400
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_LEAP_YEAR = 2000  # for parsing year days, February 29 included
+
+
+class _TimezoneCalendar:
+    """
+    UTC offset transitions of a timezone, as epoch seconds, resolved the way pytz resolves them.
+    """
+    def __init__(self, timezone: str | None):
+        tz = pytz.timezone(timezone) if timezone else pytz.utc
+        if transition_times := getattr(tz, '_utc_transition_times', None):
+            self._transitions: list[int] = [int((transition_time - _EPOCH).total_seconds())
+                                            for transition_time in transition_times]
+            self._offsets: list[int] = [int(info[0].total_seconds()) for info in tz._transition_info]  # noqa
+        else:
+            self._transitions = [-sys.maxsize]
+            self._offsets = [int(tz.utcoffset(None).total_seconds())]
+
+    def get_day_shift(self, utc_day: int, second_of_day: int) -> tuple[int, int]:
+        """
+        Get by how many days the local calendar day differs from the UTC day at a time, and until when it does.
+        Args:
+            utc_day (int): UTC day, in days since the epoch.
+            second_of_day (int): UTC time of day, in seconds.
+
+        Returns:
+            tuple[int, int]: the day shift (-1, 0 or 1) and the last UTC day at which the time is still under the same
+                UTC offset.
+        """
+        index = max(0, bisect_right(self._transitions, utc_day * _SECONDS_PER_DAY + second_of_day) - 1)
+        day_shift = (second_of_day + self._offsets[index]) // _SECONDS_PER_DAY
+        if index + 1 == len(self._transitions):
+            return day_shift, sys.maxsize
+        return day_shift, (self._transitions[index + 1] - second_of_day - 1) // _SECONDS_PER_DAY
+
+
+@lru_cache(maxsize=512)
+def _get_timezone_calendar(timezone: str | None) -> _TimezoneCalendar:
+    return _TimezoneCalendar(timezone)
+
+
+@lru_cache(maxsize=4096)
+def _get_month_days(year: int, month: int, days: tuple[int, ...]) -> tuple[int, ...]:
+    """
+    Days of a month matching month day conditions, as ordinals. Days past the end of the month fall on its last day.
+    """
+    first_day = date(year, month, 1).toordinal()
+    last_month_day = calendar.monthrange(year, month)[1]
+    return tuple(sorted({first_day + min(day, last_month_day) - 1 for day in days}))
+
+
+class _ConditionedRule:
+    """
+    Calendar days matching the conditions of a conditioned recurrence, days being date ordinals.
+    """
+    def is_match(self, day: int) -> bool:
+        raise NotImplementedError
+
+    def get_next(self, day: int) -> int:
+        """
+        First matching day after a day.
+        """
+        raise NotImplementedError
+
+    def get_previous(self, day: int) -> int:
+        """
+        Last matching day before a day.
+        """
+        raise NotImplementedError
+
+    def get_following(self, day: int) -> int:
+        """
+        Calendar day of the occurrence following one on a day.
+        """
+        return self.get_next(day)
+
+
+class _DaysOfWeekRule(_ConditionedRule):
+
+    def __init__(self, weekdays: list[int]):
+        if not weekdays:
+            raise ValueError("Days of week recurrence must have at least one weekday.")
+        self._weekdays: frozenset[int] = frozenset(weekdays)
+
+    def is_match(self, day: int) -> bool:
+        return (day + 6) % 7 in self._weekdays
+
+    def get_next(self, day: int) -> int:
+        return next(day + offset for offset in range(1, 8) if self.is_match(day + offset))
+
+    def get_previous(self, day: int) -> int:
+        return next(day - offset for offset in range(1, 8) if self.is_match(day - offset))
+
+
+class _DaysOfMonthRule(_ConditionedRule):
+
+    def __init__(self, month_days: list[int]):
+        if not month_days:
+            raise ValueError("Days of month recurrence must have at least one month day.")
+        self._month_days: tuple[int, ...] = tuple(sorted(set(month_days)))
+
+    def is_match(self, day: int) -> bool:
+        day_date = date.fromordinal(day)
+        return day in _get_month_days(day_date.year, day_date.month, self._month_days)
+
+    def get_next(self, day: int) -> int:
+        day_date = date.fromordinal(day)
+        if (matching_day := next((matching_day for matching_day in
+                                  _get_month_days(day_date.year, day_date.month, self._month_days)
+                                  if matching_day > day), None)) is not None:
+            return matching_day
+        year, month = (day_date.year + 1, 1) if day_date.month == 12 else (day_date.year, day_date.month + 1)
+        return _get_month_days(year, month, self._month_days)[0]
+
+    def get_previous(self, day: int) -> int:
+        day_date = date.fromordinal(day)
+        if (matching_day := next((matching_day for matching_day in
+                                  reversed(_get_month_days(day_date.year, day_date.month, self._month_days))
+                                  if matching_day < day), None)) is not None:
+            return matching_day
+        year, month = (day_date.year - 1, 12) if day_date.month == 1 else (day_date.year, day_date.month - 1)
+        return _get_month_days(year, month, self._month_days)[-1]
+
+
+class _DayOfYearRule(_ConditionedRule):
+
+    def __init__(self, year_day: str):
+        year_day_date = datetime.strptime(f"{year_day} {_LEAP_YEAR}", f"{REMINDER_YEAR_DAY_FORMAT} %Y")
+        self._month: int = year_day_date.month
+        self._day: int = year_day_date.day
+
+    def _get_year_day(self, year: int) -> int:
+        return date(year, self._month, min(self._day, calendar.monthrange(year, self._month)[1])).toordinal()
+
+    def is_match(self, day: int) -> bool:
+        return day == self._get_year_day(date.fromordinal(day).year)
+
+    def get_next(self, day: int) -> int:
+        year = date.fromordinal(day).year
+        return year_day if (year_day := self._get_year_day(year)) > day else self._get_year_day(year + 1)
+
+    def get_previous(self, day: int) -> int:
+        year = date.fromordinal(day).year
+        return year_day if (year_day := self._get_year_day(year)) < day else self._get_year_day(year - 1)
+
+    def get_following(self, day: int) -> int:
+        # always the next year's, even from a day before this year's
+        return self._get_year_day(date.fromordinal(day).year + 1)
+
+
+def _get_conditioned_rule(recurrence: CachedReminder.RecurrenceSettings) -> _ConditionedRule:
+    match recurrence.conditioned_type:
+        case ReminderRecurrenceConditionedType.DAYS_OF_WEEK:
+            return _DaysOfWeekRule(weekdays=recurrence.conditioned_days)
+        case ReminderRecurrenceConditionedType.DAYS_OF_MONTH:
+            return _DaysOfMonthRule(month_days=recurrence.conditioned_days)
+        case ReminderRecurrenceConditionedType.DAY_OF_YEAR:
+            return _DayOfYearRule(year_day=recurrence.conditioned_year_day)
+        case _:
+            raise ValueError(f"Unsupported reminder condition type {recurrence.conditioned_type}.")
+
+
+def _get_basic_interval(recurrence: CachedReminder.RecurrenceSettings) -> timedelta:
+    if not recurrence.basic_interval or recurrence.basic_interval < 0:
+        raise ValueError(f"Unsupported basic interval {recurrence.basic_interval}.")
+    match recurrence.basic_interval_unit:
+        case ReminderRecurrenceBasicUnit.HOUR:
+            return timedelta(hours=recurrence.basic_interval)
+        case ReminderRecurrenceBasicUnit.DAY:
+            return timedelta(days=recurrence.basic_interval)
+        case _:
+            raise ValueError(f"Unsupported basic interval unit {recurrence.basic_interval_unit}.")
+
+
+def _iter_conditioned_occurrences(reminder_time: datetime,
+                                  rule: _ConditionedRule,
+                                  timezone: str | None,
+                                  after: datetime | None) -> Iterator[datetime]:
+    timezone_calendar = _get_timezone_calendar(timezone)
+    utc_day, second_of_day = divmod(int(reminder_time.timestamp()), _SECONDS_PER_DAY)
+    # first UTC day at which the time of day is after `after`
+    after_day = None if after is None else math.floor((after.timestamp() - second_of_day) / _SECONDS_PER_DAY) + 1
+    day_shift, _ = timezone_calendar.get_day_shift(utc_day, second_of_day)
+    while True:
+        utc_day = rule.get_following(utc_day + _EPOCH_ORDINAL + day_shift) - _EPOCH_ORDINAL - day_shift
+        day_shift, segment_end_day = timezone_calendar.get_day_shift(utc_day, second_of_day)
+        while (after_day is not None and utc_day < after_day
+               and rule.is_match(local_day := utc_day + _EPOCH_ORDINAL + day_shift)):
+            # until the offset changes, the following occurrences are on the next matching days: jump to the first
+            # one after `after`, or to the first one under the next offset
+            target_day = rule.get_next(max(after_day + _EPOCH_ORDINAL + day_shift, local_day + 1) - 1)
+            if rule.get_previous(target_day) - _EPOCH_ORDINAL - day_shift > segment_end_day:
+                target_day = rule.get_next(rule.get_previous(segment_end_day + _EPOCH_ORDINAL + day_shift + 1))
+            utc_day = target_day - _EPOCH_ORDINAL - day_shift
+            day_shift, segment_end_day = timezone_calendar.get_day_shift(utc_day, second_of_day)
+        if after_day is None or utc_day >= after_day:
+            after_day = None
+            yield datetime.fromtimestamp(utc_day * _SECONDS_PER_DAY + second_of_day, UTC)
+
+
+def iter_occurrences(reminder_time: datetime,
+                     recurrence: CachedReminder.RecurrenceSettings,
+                     timezone: str | None = None,
+                     after: datetime | None = None) -> Iterator[datetime]:
+    """
+    Lazily iterate over the occurrences of a recurring reminder that follow a delivery time.
+    Args:
+        reminder_time (datetime): delivery time the occurrences follow (excluded).
+        recurrence (CachedReminder.RecurrenceSettings): recurrence settings of the reminder.
+        timezone (str | None): timezone of the reminder owner, whose calendar conditioned recurrences follow. None
+            for UTC.
+        after (datetime | None): if given, iteration starts directly at the first occurrence after this datetime.
+
+    Returns:
+        Iterator[datetime]: infinite iterator of occurrences, in UTC.
+    """
+    if recurrence.is_basic:
+        interval = _get_basic_interval(recurrence)
+        occurrence = reminder_time + interval
+        if after is not None and occurrence <= after:
+            occurrence += ((after - occurrence) // interval + 1) * interval
+        while True:
+            yield occurrence
+            occurrence += interval
+    elif recurrence.is_conditioned:
+        yield from _iter_conditioned_occurrences(reminder_time=reminder_time,
+                                                 rule=_get_conditioned_rule(recurrence),
+                                                 timezone=timezone,
+                                                 after=after)
+    else:
+        raise ValueError("Reminder recurrence settings must have either basic or conditioned details.")
+
+
+def get_next_occurrence(reminder_time: datetime,
+                        recurrence: CachedReminder.RecurrenceSettings,
+                        timezone: str | None,
+                        after: datetime) -> datetime:
+    """
+    Get the first delivery time of a recurring reminder after a datetime, without going through the ones before.
+    Args:
+        reminder_time (datetime): current delivery time of the reminder, returned as is if already after `after`.
+        recurrence (CachedReminder.RecurrenceSettings): recurrence settings of the reminder.
+        timezone (str | None): timezone of the reminder owner. None for UTC.
+        after (datetime): datetime the delivery time should be after.
+
+    Returns:
+        datetime: the next delivery time.
+    """
+    if reminder_time > after:
+        return reminder_time
+    return next(iter_occurrences(reminder_time=reminder_time, recurrence=recurrence, timezone=timezone, after=after))
@@ -1,28 +1,70 @@
 import asyncio
+import time
 from collections import defaultdict
 from datetime import datetime, UTC, timedelta
 
+from common import metrics
 from common.app_logger import AppLogger
+from common.db import add_post_commit_action, add_post_rollback_action
 from common.decorators import periodic_worker, require_db_session
 from common.exceptions import UserReadableException
+from common.timer_index import TimerIndex
 from components.user_settings_components.user_reminder_component import UserReminderComponent
-from constants import BackgroundWorker, AppLogCategory
+from constants import BackgroundWorker, AppLogCategory, ReminderStatus
 from models.dto.cachables import CachedReminder
+from models.user_settings_models import UserReminder
+from settings import REMINDER_FULL_RECONCILE_MINUTES, REMINDER_DELIVERY_CONCURRENCY
+from utils.helpers.context_helpers import create_isolated_task
+
+# Only reminders due within this window are scheduled in memory
+REMINDER_SCHEDULING_HORIZON = timedelta(hours=1)
+# Incremental reloads look this far behind the previous watermark, for changes committed after being timestamped
+_WATERMARK_OVERLAP = timedelta(minutes=1)
+# Change notifications are kept this long, outliving any load that started before them
+_CHANGE_RETENTION_SECONDS = 300
+# Delay before retrying reminders whose post-delivery transaction was rolled back
+_DELIVERY_RETRY_DELAY_SECONDS = 5
 
 
 class ReminderService:
     """
     Service to host the reminder workers.
+    Reminders due within the scheduling horizon are kept in a timer index keyed by reminder ID. The producer only
+    applies what changed since its previous run (and reminders entering the horizon), while reminders created,
+    updated or deleted through `UserReminderComponent` are rescheduled as soon as their transaction is committed.
+    A single loop timer is armed for the earliest scheduled reminder. When it fires, all due reminders are sent
+    concurrently, at most REMINDER_DELIVERY_CONCURRENCY recipients at a time, then their post-delivery is handled in
+    one batch. Reminders of the same recipient due within the same second are coalesced into a single message.
     """
     _instance: 'ReminderService' = None
-    lock = asyncio.Lock()
 
     def __init__(self):
         super().__init__()
         self.reminder_component = UserReminderComponent()
-        self._queue: asyncio.PriorityQueue['CachedReminder'] = asyncio.PriorityQueue()
+        self._timers: TimerIndex = TimerIndex()
         self._user_id_reminder_map: dict[int, set[CachedReminder]] = defaultdict(set)
         self._reminder_id_reminder_map: dict[int, CachedReminder] = {}
+        # Reminders taken for delivery are left alone until their delivery is committed (or rolled back)
+        self._delivering_reminder_ids: set[int] = set()
+        # Reminder ID -> monotonic time of its latest change notification. Rows loaded by a pass that started before
+        # that are stale, the reminder is left to the pass reloading it.
+        self._reminder_changed_at: dict[int, float] = {}
+        self._changed_reminder_ids: set[int] = set()
+        self._refresh_task: asyncio.Task | None = None
+        self._watermark: datetime | None = None
+        self._horizon: datetime | None = None
+        self._last_full_reload_at: float = 0
+        self._delivery_timer: asyncio.TimerHandle | None = None
+        self._delivery_timer_due_at: float | None = None
+        self._delivery_semaphore = asyncio.Semaphore(REMINDER_DELIVERY_CONCURRENCY)
+        self._delivery_tasks: set[asyncio.Task] = set()
+        self._delivery_lag_histogram = metrics.histogram("reminders.delivery.lag_seconds")
+        self._delivery_duration_histogram = metrics.histogram("reminders.delivery.duration_seconds")
+        self._delivery_failures_counter = metrics.counter("reminders.delivery.failures")
+        self._delivery_sent_rate = metrics.rate("reminders.delivery.sent")
+        self._delivery_coalesced_counter = metrics.counter("reminders.delivery.coalesced")
+        metrics.gauge("reminders.scheduled", getter=lambda: len(self._timers))
+        metrics.gauge("reminders.delivery.in_flight", getter=lambda: len(self._delivering_reminder_ids))
         self.logger = AppLogger(self.__class__.__name__)
 
     def __new__(cls, *args, **kwargs) -> 'ReminderService':
@@ -34,82 +76,295 @@ class ReminderService:
     @periodic_worker(name=BackgroundWorker.REMINDER_QUEUE_PRODUCER)
     async def reminder_producer(self):
         """
-        Refresh queued reminders from the database.
+        Reconcile scheduled reminders with the database. The first run, and one every REMINDER_FULL_RECONCILE_MINUTES,
+        reloads all active reminders within the horizon. Other runs only load the reminders updated since the previous
+        run and the ones that entered the horizon since. Changes are applied without awaiting, so deliveries are
+        never blocked by the producer.
         """
-        reminders = await self.reminder_component.get_reminders_before_time(
-            before_datetime=datetime.now(UTC) + timedelta(hours=1), load_users=True, load_recurrence=True
+        started_at = time.monotonic()
+        now = datetime.now(UTC)
+        horizon = now + REMINDER_SCHEDULING_HORIZON
+        is_full_reload = (self._watermark is None
+                          or started_at - self._last_full_reload_at >= REMINDER_FULL_RECONCILE_MINUTES * 60)
+        if is_full_reload:
+            reminders = await self.reminder_component.get_reminders_before_time(
+                before_datetime=horizon, load_users=True, load_recurrence=True
+            )
+        else:
+            reminders = await self.reminder_component.get_reminders_changed_since(
+                updated_since=self._watermark - _WATERMARK_OVERLAP, due_from=self._horizon, due_before=horizon
+            )
+
+        added_reminder_count, removed_reminder_count = self._apply_reminders(
+            reminders=reminders, horizon=horizon, loaded_at=started_at
         )
-        reminder_id_reminder_map = {reminder.id: reminder for reminder in reminders}
-        newly_added_reminder_count = 0
-        removed_reminder_count = 0
-        async with self.lock:
-            queued_reminders: list[CachedReminder] = []
-            while not self._queue.empty():
-                queued_reminders.append(await self._queue.get())
-                self._queue.task_done()
-            for queued_reminder in queued_reminders:
-                if queued_reminder.user_reminder_id not in reminder_id_reminder_map:
-                    queued_reminders.remove(queued_reminder)
-                    self._user_id_reminder_map[queued_reminder.owner_user_id].discard(queued_reminder)
-                    self._reminder_id_reminder_map.pop(queued_reminder.user_reminder_id, None)
+        if is_full_reload:
+            loaded_reminder_ids = {reminder.id for reminder in reminders}
+            for reminder_id in list(self._timers):
+                if reminder_id not in loaded_reminder_ids and self._unschedule_reminder(reminder_id=reminder_id,
+                                                                                          loaded_at=started_at):
                     removed_reminder_count += 1
-            for reminder in reminders:
-                if reminder.id not in self._reminder_id_reminder_map:
-                    cached_reminder = CachedReminder.from_orm_object(reminder)
-                    self._reminder_id_reminder_map[reminder.id] = cached_reminder
-                    self._user_id_reminder_map[reminder.owner.user_id].add(cached_reminder)
-                    await self._queue.put(cached_reminder)
-                    newly_added_reminder_count += 1
-                else:
-                    cached_reminder = self._reminder_id_reminder_map[reminder.id]
-                    cached_reminder.update_from_orm_object(reminder)
-                    await self._queue.put(cached_reminder)
-        if newly_added_reminder_count or removed_reminder_count:
+            self._last_full_reload_at = started_at
+        self._watermark, self._horizon = now, horizon
+        self._arm_delivery_timer(force=True)  # also corrects any drift between the loop clock and the wall clock
+        self._prune_reminder_changes(before=started_at - _CHANGE_RETENTION_SECONDS)
+
+        if added_reminder_count or removed_reminder_count:
             self.logger.info(
-                f"Refreshed reminders: {newly_added_reminder_count} added, {removed_reminder_count} removed."
+                f"Refreshed reminders: {added_reminder_count} added, {removed_reminder_count} removed."
             )
         else:
             self.logger.debug("No reminders to refresh.")
 
+    def _arm_delivery_timer(self, force: bool = False):
+        """
+        Arm the delivery timer for the earliest scheduled reminder, if it is not already armed for it.
+        Args:
+            force (bool): re-arm even if already armed for the earliest reminder.
+        """
+        earliest_timer = self._timers.peek()
+        due_at = earliest_timer[0] if earliest_timer else None
+        if due_at == self._delivery_timer_due_at and not force:
+            return
+        if self._delivery_timer:
+            self._delivery_timer.cancel()
+            self._delivery_timer = None
+        self._delivery_timer_due_at = due_at
+        if due_at is not None:
+            loop = asyncio.get_running_loop()
+            self._delivery_timer = loop.call_at(loop.time() + max(due_at - time.time(), 0), self._on_delivery_timer)
+
+    def _on_delivery_timer(self):
+        """
+        Start delivering all due reminders, then re-arm the timer for the next one.
+        """
+        self._delivery_timer, self._delivery_timer_due_at = None, None
+        if due_reminder_ids := self._timers.pop_due(now=time.time()):
+            taken_at = time.monotonic()
+            self._delivering_reminder_ids.update(due_reminder_ids)
+            self._mark_reminders_handled(reminder_ids=due_reminder_ids, handled_at=taken_at)
+            task = create_isolated_task(self._deliver_reminders(
+                reminders=[self._reminder_id_reminder_map[reminder_id] for reminder_id in due_reminder_ids],
+                started_at=taken_at
+            ))
+            self._delivery_tasks.add(task)
+            task.add_done_callback(self._delivery_tasks.discard)
+        self._arm_delivery_timer()
+
+    async def _deliver_reminders(self, reminders: list[CachedReminder], started_at: float):
+        """
+        Send reminders that became due together, then handle their post-delivery in one batch.
+        Args:
+            reminders (list[CachedReminder]): due reminders, taken for delivery.
+            started_at (float): monotonic time at which the reminders were taken for delivery.
+        """
+        # (recipient user ID, due second) -> reminders
+        reminder_groups: dict[tuple[int, int], list[CachedReminder]] = defaultdict(list)
+        for reminder in reminders:
+            reminder_groups[(reminder.recipient_user_id, int(reminder.reminder_time.timestamp()))].append(reminder)
+        self._delivery_coalesced_counter.increment(len(reminders) - len(reminder_groups))
+        results = await asyncio.gather(*(self._deliver_reminder_group(group) for group in reminder_groups.values()),
+                                       return_exceptions=True)
+        for group, result in zip(reminder_groups.values(), results):
+            if isinstance(result, Exception):
+                self.logger.error(f"Error while delivering reminders "
+                                  f"{[reminder.user_reminder_id for reminder in group]}: {result}")
+        await self._handle_post_delivery(reminders=reminders, started_at=started_at)
+
+    async def _deliver_reminder_group(self, reminders: list[CachedReminder]):
+        async with self._delivery_semaphore:
+            started_at = time.perf_counter()
+            try:
+                await self._send_reminders(reminders)
+            finally:
+                self._delivery_duration_histogram.observe(time.perf_counter() - started_at)
+
+    @require_db_session
+    async def _handle_post_delivery(self, reminders: list[CachedReminder], started_at: float):
+        reminder_ids = [reminder.user_reminder_id for reminder in reminders]
+        add_post_rollback_action(self._retry_deliveries, reminder_ids=reminder_ids)
+        next_delivery_times = await self.reminder_component.handle_reminders_post_delivery(reminders=reminders)
+        add_post_commit_action(self._finish_deliveries, next_delivery_times=next_delivery_times, started_at=started_at)
+
+    def mark_reminders_changed(self, *reminder_ids: int):
+        """
+        Reschedule reminders from the database in the background, e.g. once they were created, updated or deleted.
+        Args:
+            *reminder_ids (int): IDs of the changed reminders.
+        """
+        changed_at = time.monotonic()
+        for reminder_id in reminder_ids:
+            self._reminder_changed_at[reminder_id] = changed_at
+        self._changed_reminder_ids.update(reminder_ids)
+        if not self._refresh_task or self._refresh_task.done():
+            self._refresh_task = create_isolated_task(self._refresh_changed_reminders())
+
+    async def _refresh_changed_reminders(self):
+        # the loop condition is checked after each batch's session is closed, so no notification can be missed
+        while self._changed_reminder_ids:
+            await self._refresh_changed_reminders_batch()
+
+    @require_db_session
+    async def _refresh_changed_reminders_batch(self):
+        started_at = time.monotonic()
+        reminder_ids, self._changed_reminder_ids = self._changed_reminder_ids, set()
+        reminders = await self.reminder_component.get_reminders_by_ids(reminder_ids=reminder_ids)
+        self._apply_reminders(reminders=reminders,
+                              horizon=datetime.now(UTC) + REMINDER_SCHEDULING_HORIZON,
+                              loaded_at=started_at)
+        for deleted_reminder_id in reminder_ids - {reminder.id for reminder in reminders}:
+            self._unschedule_reminder(reminder_id=deleted_reminder_id, loaded_at=started_at)
+        self._arm_delivery_timer()
+
+    def _apply_reminders(self, reminders: list[UserReminder], horizon: datetime, loaded_at: float) -> tuple[int, int]:
+        """
+        Schedule the loaded reminders that are active and due within the horizon, unschedule the others.
+        Args:
+            reminders (list[UserReminder]): reminders loaded with their users and recurrence settings.
+            horizon (datetime): scheduling horizon.
+            loaded_at (float): monotonic time at which loading the reminders started.
+
+        Returns:
+            tuple[int, int]: number of newly scheduled and of unscheduled reminders.
+        """
+        added_reminder_count = removed_reminder_count = 0
+        for reminder in reminders:
+            if reminder.status == ReminderStatus.ACTIVE and reminder.reminder_time < horizon:
+                added_reminder_count += self._schedule_reminder(reminder=reminder, loaded_at=loaded_at)
+            else:
+                removed_reminder_count += self._unschedule_reminder(reminder_id=reminder.id, loaded_at=loaded_at)
+        return added_reminder_count, removed_reminder_count
+
+    def _is_stale(self, reminder_id: int, loaded_at: float) -> bool:
+        return (reminder_id in self._delivering_reminder_ids
+                or self._reminder_changed_at.get(reminder_id, 0) >= loaded_at)
+
+    def _schedule_reminder(self, reminder: UserReminder, loaded_at: float) -> bool:
+        """
+        Schedule a reminder or update its schedule.
+        Returns:
+            bool: whether the reminder was newly scheduled.
+        """
+        if self._is_stale(reminder_id=reminder.id, loaded_at=loaded_at):
+            return False
+        if cached_reminder := self._reminder_id_reminder_map.get(reminder.id):
+            cached_reminder.update_from_orm_object(reminder)
+        else:
+            cached_reminder = CachedReminder.from_orm_object(reminder)
+            self._reminder_id_reminder_map[reminder.id] = cached_reminder
+            self._user_id_reminder_map[cached_reminder.owner_user_id].add(cached_reminder)
+        return self._timers.schedule(key=reminder.id, due_at=cached_reminder.reminder_time.timestamp())
+
+    def _unschedule_reminder(self, reminder_id: int, loaded_at: float) -> bool:
+        """
+        Unschedule a reminder, if scheduled.
+        Returns:
+            bool: whether the reminder was scheduled.
+        """
+        if self._is_stale(reminder_id=reminder_id, loaded_at=loaded_at):
+            return False
+        return self._remove_reminder(reminder_id=reminder_id)
+
+    def _remove_reminder(self, reminder_id: int) -> bool:
+        """
+        Unschedule a reminder and forget it, if scheduled.
+        Returns:
+            bool: whether the reminder was scheduled.
+        """
+        was_scheduled = self._timers.cancel(reminder_id)
+        if cached_reminder := self._reminder_id_reminder_map.pop(reminder_id, None):
+            owner_reminders = self._user_id_reminder_map[cached_reminder.owner_user_id]
+            owner_reminders.discard(cached_reminder)
+            if not owner_reminders:
+                del self._user_id_reminder_map[cached_reminder.owner_user_id]
+        return was_scheduled
+
+    def _mark_reminders_handled(self, reminder_ids: list[int], handled_at: float):
+        """
+        Record that the service itself changed reminders (taken for or done with delivery), so that rows loaded by a
+        pass that started before are ignored instead of rescheduling them at their already delivered time.
+        """
+        for reminder_id in reminder_ids:
+            self._reminder_changed_at[reminder_id] = max(self._reminder_changed_at.get(reminder_id, 0), handled_at)
+
+    def _prune_reminder_changes(self, before: float):
+        """
+        Forget change notifications older than a time.
+        """
+        self._reminder_changed_at = {
+            reminder_id: changed_at for reminder_id, changed_at in self._reminder_changed_at.items()
+            if changed_at >= before or reminder_id in self._changed_reminder_ids
+        }
+
+    def _finish_deliveries(self, next_delivery_times: dict[int, datetime | None], started_at: float):
+        """
+        Release delivered reminders to reconciliation, rescheduling the recurring ones at their next delivery time
+        without reloading them. Reminders changed while being delivered are reloaded instead.
+        Args:
+            next_delivery_times (dict[int, datetime | None]): reminder ID -> next delivery time, None if archived.
+            started_at (float): monotonic time at which the reminders were taken for delivery.
+        """
+        horizon = datetime.now(UTC) + REMINDER_SCHEDULING_HORIZON
+        changed_reminder_ids = []
+        for reminder_id, next_delivery_at in next_delivery_times.items():
+            self._delivering_reminder_ids.discard(reminder_id)
+            if self._reminder_changed_at.get(reminder_id, 0) > started_at:
+                changed_reminder_ids.append(reminder_id)
+            elif next_delivery_at and next_delivery_at < horizon:
+                self._reminder_id_reminder_map[reminder_id].reminder_time = next_delivery_at
+                self._timers.schedule(key=reminder_id, due_at=next_delivery_at.timestamp())
+            else:
+                self._remove_reminder(reminder_id=reminder_id)
+        self._mark_reminders_handled(reminder_ids=list(next_delivery_times), handled_at=time.monotonic())
+        if changed_reminder_ids:
+            self.mark_reminders_changed(*changed_reminder_ids)
+        self._arm_delivery_timer()
+
+    def _retry_deliveries(self, reminder_ids: list[int]):
+        """
+        Release reminders whose post-delivery was rolled back and schedule them again after a short delay.
+        """
+        for reminder_id in reminder_ids:
+            self._delivering_reminder_ids.discard(reminder_id)
+            if reminder_id in self._reminder_id_reminder_map:
+                self._timers.schedule(key=reminder_id, due_at=time.time() + _DELIVERY_RETRY_DELAY_SECONDS)
+        self._mark_reminders_handled(reminder_ids=reminder_ids, handled_at=time.monotonic())
+        self._arm_delivery_timer()
+
     @require_db_session
-    @periodic_worker(name=BackgroundWorker.REMINDER_QUEUE_CONSUMER, initial_delay=5)
-    async def reminder_consumer(self):
-        """
-        Consume due reminders from the queue and send them.
-        """
-        reminders_to_send = set()
-        async with self.lock:
-            while not self._queue.empty():
-                if (reminder := await self._queue.get()).reminder_time <= datetime.now(UTC):
-                    reminders_to_send.add(reminder)
-                    self._queue.task_done()
-                else:
-                    await self._queue.put(reminder)
-                    self._queue.task_done()
-                    break
-            for reminder in reminders_to_send:
-                await self._send_reminder(reminder)
-
-    async def _send_reminder(self, reminder: CachedReminder):
-        """
-        Send a reminder to the user.
+    async def _send_reminders(self, reminders: list[CachedReminder]):
+        """
+        Send reminders of the same recipient, together.
         Args:
-            reminder: The reminder to send.
+            reminders: The reminders to send.
         """
-        from bot.utils.bot_actions.utility_actions import send_reminder_to_user, handle_reminder_delivery_failure
-        try:
+        from bot.utils.bot_actions.utility_actions import send_reminders_to_user, handle_reminder_delivery_failure
+        errors: dict[int, Exception] = {}
+        deliverable_reminders = []
+        for reminder in reminders:
             if reminder.is_relayed:
-                await self.reminder_component.validate_relayed_reminder_deliverability(
-                    reminder_id=reminder.user_reminder_id
-                )
-            await send_reminder_to_user(reminder=reminder)
-        except Exception as e:
-            if not isinstance(e, UserReadableException):
+                try:
+                    await self.reminder_component.validate_relayed_reminder_deliverability(
+                        reminder_id=reminder.user_reminder_id
+                    )
+                except Exception as e:
+                    errors[reminder.user_reminder_id] = e
+                    continue
+            deliverable_reminders.append(reminder)
+        if deliverable_reminders:
+            errors.update(await send_reminders_to_user(reminders=deliverable_reminders))
+
+        for reminder in reminders:
+            if not (error := errors.get(reminder.user_reminder_id)):
+                self._delivery_sent_rate.increment()
+                self._delivery_lag_histogram.observe((datetime.now(UTC) - reminder.reminder_time).total_seconds())
+                continue
+            self._delivery_failures_counter.increment()
+            if not isinstance(error, UserReadableException):
                 self.logger.warning(f"Failed to send reminder {reminder.user_reminder_id} "
-                                    f"to user {reminder.recipient_user_id}: {e}",
+                                    f"to user {reminder.recipient_user_id}: {error}",
                                     extras={"user_id": reminder.recipient_user_id},
                                     category=AppLogCategory.BOT_GENERAL)
             if reminder.is_relayed:
                 await handle_reminder_delivery_failure(reminder=reminder,
-                                                       error=e)
-        await self.reminder_component.handle_reminder_post_delivery(reminder_id=reminder.user_reminder_id)
+                                                       error=error)
@@ -1,42 +1,56 @@
 import asyncio
+import heapq
+import random
+import time
 from datetime import datetime
 from types import coroutine
 
-from constants import PERIODIC_WORKER_FREQUENCY, AppLogCategory, WORKER_RETRY_ON_ERROR_DELAY
+from common import metrics
+from constants import PERIODIC_WORKER_FREQUENCY, AppLogCategory, WORKER_RETRY_ON_ERROR_DELAY, PERIODIC_WORKER_JITTER
 from common.app_logger import AppLogger
 from utils.helpers.context_helpers import create_isolated_task
 
 
 class WorkerManagerService:
     """
-    This class will be responsible for knowing when each periodic or scheduled task should run using an
-    asyncio.PriorityQueue.
+    This class will be responsible for knowing when each periodic or scheduled task should run using a min-heap of
+    next run times. The scheduler sleeps until the earliest one is due, or until a worker is added.
 
     Workers can be of two types: periodic or scheduled.
 
     Periodic workers will have a predefined interval/frequency at which they should run (countdown to next run will
-    start after the previous run is finished).
+    start after the previous run is finished), optionally spread by a random jitter (PERIODIC_WORKER_JITTER).
 
     Scheduled workers however are self-scheduling, meaning they will specify how long they should wait before running
     again by returning a wait time (in seconds).
+
+    A worker is only ever scheduled or running once at a time, so runs of the same worker never overlap.
     """
     def __init__(self):
-        self._worker_queue: asyncio.PriorityQueue = None  # type: ignore
+        self._worker_heap: list[WorkerItem] = []
+        self._wake_up_event: asyncio.Event = asyncio.Event()
+        self._active_worker_names: set[str] = set()  # scheduled or running
         self._is_running: bool = False
         self.logger = AppLogger(component=self.__class__.__name__)
+        metrics.gauge("workers.scheduled", getter=lambda: len(self._worker_heap))
+        metrics.gauge("workers.running",
+                      getter=lambda: len(self._active_worker_names) - len(self._worker_heap))
 
     async def run(self):
         self.logger.debug("WorkerManagerService is running...")
         self._is_running = True
         while True:
-            last_handled_worker_item = None
-            while (worker_item := await self._worker_queue.get()).next_run <= datetime.now().timestamp():
+            now = datetime.now().timestamp()
+            while self._worker_heap and self._worker_heap[0].next_run <= now:
+                worker_item = heapq.heappop(self._worker_heap)
                 create_isolated_task(self.start_worker(worker_item=worker_item))
-                self._worker_queue.task_done()
-                last_handled_worker_item = worker_item
-            if worker_item and worker_item != last_handled_worker_item:
-                await self._worker_queue.put(worker_item)
-            await asyncio.sleep(0.1)
+
+            self._wake_up_event.clear()
+            timeout = self._worker_heap[0].next_run - now if self._worker_heap else None
+            try:
+                await asyncio.wait_for(self._wake_up_event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
 
     async def add_worker(self,
                          worker_callable: coroutine,
@@ -55,10 +69,18 @@ class WorkerManagerService:
                              f"the queue as it is not scheduled to run again.",
                              category=AppLogCategory.APP_GENERAL)
             return
-        await self._worker_queue.put(WorkerItem(next_run=next_run,
-                                                worker_callable=worker_callable,
-                                                worker_name=worker_name,
-                                                **kwargs))
+        if worker_name in self._active_worker_names:
+            self.logger.warning(f"Worker {worker_name} is already scheduled or running, not adding it again.",
+                                category=AppLogCategory.APP_GENERAL)
+            return
+        self._schedule(WorkerItem(next_run=next_run, worker_callable=worker_callable, worker_name=worker_name,
+                                  **kwargs))
+
+    def _schedule(self, worker_item: 'WorkerItem'):
+        self._active_worker_names.add(worker_item.worker_name)
+        heapq.heappush(self._worker_heap, worker_item)
+        if self._worker_heap[0] is worker_item:  # earlier than what the scheduler is sleeping until
+            self._wake_up_event.set()
 
     async def start_worker(self, worker_item: 'WorkerItem'):
         """
@@ -66,16 +88,25 @@ class WorkerManagerService:
         Args:
             worker_item (WorkerItem): The worker item containing the callback and scheduling information.
         """
+        worker_metrics = WorkerMetrics.get(worker_item.worker_name)
+        started_at = time.perf_counter()
+        worker_metrics.lag_histogram.observe(max(datetime.now().timestamp() - worker_item.next_run, 0))
         try:
             wait_time = await worker_item.worker_callable(**worker_item.kwargs)
         except Exception as e:
+            worker_metrics.failures_counter.increment()
             wait_time = WORKER_RETRY_ON_ERROR_DELAY.get(worker_item.worker_name, 300)
             self.logger.error(f"Error while running worker {worker_item.worker_name}.\n"
                               f"Retrying in {wait_time} seconds: {e}\n")
         else:
             if worker_item.worker_name in PERIODIC_WORKER_FREQUENCY:
                 wait_time = PERIODIC_WORKER_FREQUENCY[worker_item.worker_name]
+        finally:
+            worker_metrics.duration_histogram.observe(time.perf_counter() - started_at)
+            self._active_worker_names.discard(worker_item.worker_name)
 
+        if wait_time and (jitter := PERIODIC_WORKER_JITTER.get(worker_item.worker_name)):
+            wait_time += random.uniform(0, jitter)
         if wait_time:
             next_run = datetime.now().timestamp() + wait_time
         else:
@@ -90,7 +121,6 @@ class WorkerManagerService:
         """
         This method will be called on startup to register all workers with worker decorators.
         """
-        self._worker_queue = asyncio.PriorityQueue()
         from .app_workers import AppWorkers
         from clients import reminder_service, xp_service
 
@@ -101,10 +131,8 @@ class WorkerManagerService:
         worker_callables.append(app_workers.log_ingestion)
 
         worker_callables.append(reminder_service.reminder_producer)
-        worker_callables.append(reminder_service.reminder_consumer)
 
-        worker_callables.append(xp_service.message_consumer)
-        worker_callables.append(xp_service.xp_action_consumer)
+        await xp_service.start_consumers()
         worker_callables.append(xp_service.decay_producer)
         worker_callables.append(xp_service.decay_consumer)
         worker_callables.append(xp_service.xp_sync_to_database)
@@ -133,3 +161,22 @@ class WorkerItem:
 
     def __gt__(self, other):
         return self.next_run > other.next_run
+
+
+class WorkerMetrics:
+    """
+    Per-worker run duration, lag (how late a run started compared to its scheduled time) and failure count.
+    """
+    _instances: dict[str, 'WorkerMetrics'] = {}
+
+    def __init__(self, worker_name: str):
+        metric_prefix = f"workers.{worker_name.lower().replace(' ', '_')}"
+        self.duration_histogram = metrics.histogram(f"{metric_prefix}.duration_seconds")
+        self.lag_histogram = metrics.histogram(f"{metric_prefix}.lag_seconds")
+        self.failures_counter = metrics.counter(f"{metric_prefix}.failures")
+
+    @classmethod
+    def get(cls, worker_name: str) -> 'WorkerMetrics':
+        if worker_name not in cls._instances:
+            cls._instances[worker_name] = cls(worker_name)
+        return cls._instances[worker_name]
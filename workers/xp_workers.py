@@ -1,18 +1,32 @@
 import asyncio
+import time
+import traceback
 from collections import defaultdict
-from datetime import datetime, UTC, timedelta
+from datetime import datetime, UTC
+from itertools import batched
 
 import discord
 
 import cache
 from bot.utils.helpers.xp_helpers import get_user_username_for_xp
+from common import metrics
 from common.app_logger import AppLogger
 from common.decorators import periodic_worker, require_db_session
+from common.locks import ReadWriteLock
+from common.rate_limit import TokenBucket
 from components.guild_settings_components.guild_settings_component import GuildSettingsComponent
 from components.guild_user_xp_components.guild_user_xp_component import GuildUserXPComponent
 from components.guild_user_xp_components.xp_processing_component import XPProcessingComponent
-from constants import BackgroundWorker
-from models.dto.xp import XPAction, XPDecayItem
+from constants import BackgroundWorker, AppLogCategory
+from models.dto.cachables import CachedGuildSettings
+from models.dto.xp import XPAction, XPDecayItem, XPMessageEvent, XPLevelUpdate
+from settings import XP_MESSAGE_CONSUMER_SHARDS, XP_CONSUMER_BATCH_SIZE, XP_CONSUMER_BATCH_WAIT_MS
+from utils.helpers.context_helpers import create_isolated_task
+
+XP_DECAY_BATCH_SIZE = 1000  # members decayed per lock acquisition, the event loop is released between batches
+LEVEL_UPDATE_DEBOUNCE_SECONDS = 1  # wait before handling a guild's level updates so that bursts get coalesced
+LEVEL_UPDATE_RATE_PER_SECOND = 1  # Discord API calls of level updates per guild, below the member edit rate limit
+LEVEL_UPDATE_BURST = 5
 
 
 class XPService:
@@ -29,6 +43,11 @@ class XPService:
         self.guild_settings_component = GuildSettingsComponent()
 
         self._message_queue: asyncio.Queue[discord.Message] = asyncio.Queue()
+        # Sharded message consumption: shard i owns the members where hash((guild_id, member_id)) % N == i
+        self._message_shard_queues: list[asyncio.Queue[discord.Message]] = [
+            asyncio.Queue() for _ in range(XP_MESSAGE_CONSUMER_SHARDS)
+        ]
+        self._consumer_tasks: list[asyncio.Task] = []
         self._action_queue: asyncio.Queue = asyncio.Queue()
         self._decay_queue: asyncio.Queue = asyncio.PriorityQueue()
 
@@ -36,7 +55,32 @@ class XPService:
 
         # Map of (guild_id, member_id) to asyncio.Lock to prevent concurrent XP processing for the same member
         self._member_lock_map: dict[tuple[int, int], asyncio.Lock] = defaultdict(asyncio.Lock)
-        self._global_xp_lock = asyncio.Lock()
+        # Held in shared (read) mode while processing XP, and in exclusive (write) mode while syncing to the database
+        self._global_xp_lock = ReadWriteLock()
+
+        self._processed_messages_rate = metrics.rate("xp.messages.processed")
+        self._processed_message_events_rate = metrics.rate("xp.messages.coalesced_events")
+        self._message_lag_histogram = metrics.histogram("xp.messages.lag_seconds")
+        self._decayed_members_rate = metrics.rate("xp.decay.members_processed")
+
+        # guild_id -> member_id -> pending level update, each guild with pending updates has one consumer task
+        self._pending_level_updates: dict[int, dict[int, XPLevelUpdate]] = {}
+        self._level_update_tasks: dict[int, asyncio.Task] = {}
+        self._level_update_rate_limiters: dict[int, TokenBucket] = defaultdict(
+            lambda: TokenBucket(rate=LEVEL_UPDATE_RATE_PER_SECOND, capacity=LEVEL_UPDATE_BURST)
+        )
+        self._handled_level_updates_rate = metrics.rate("xp.level_updates.handled")
+        self._coalesced_level_updates_counter = metrics.counter("xp.level_updates.coalesced")
+        metrics.gauge("xp.level_updates.backlog", getter=lambda: self.level_update_backlog)
+        self._decay_batch_duration_histogram = metrics.histogram("xp.decay.batch_duration_seconds")
+        self._message_shard_lag_histograms = [metrics.histogram(f"xp.messages.shard.{shard_index}.lag_seconds")
+                                              for shard_index in range(XP_MESSAGE_CONSUMER_SHARDS)]
+        metrics.gauge("xp.messages.queue_depth", getter=lambda: self.message_queue_depth)
+        metrics.gauge("xp.actions.queue_depth", getter=self._action_queue.qsize)
+        self._message_batch_size_histogram = metrics.histogram("xp.messages.batch_size")
+        self._action_batch_size_histogram = metrics.histogram("xp.actions.batch_size")
+        for shard_index, shard_queue in enumerate(self._message_shard_queues):
+            metrics.gauge(f"xp.messages.shard.{shard_index}.queue_depth", getter=shard_queue.qsize)
 
         self.logger = AppLogger(self.__class__.__name__)
 
@@ -45,13 +89,29 @@ class XPService:
             cls._instance = super().__new__(cls)
         return cls._instance
 
+    @property
+    def message_consumer_is_sharded(self) -> bool:
+        return bool(self._message_shard_queues)
+
+    @property
+    def level_update_backlog(self) -> int:
+        return sum(len(guild_level_updates) for guild_level_updates in self._pending_level_updates.values())
+
+    @property
+    def message_queue_depth(self) -> int:
+        return self._message_queue.qsize() + sum(shard_queue.qsize() for shard_queue in self._message_shard_queues)
+
     async def add_message_to_queue(self, message: discord.Message):
         """
         Add a message to the queue for processing.
         Args:
             message (discord.Message): The message to add to the queue.
         """
-        await self._message_queue.put(message)
+        if self.message_consumer_is_sharded:
+            shard_index = hash((message.guild.id, message.author.id)) % len(self._message_shard_queues)
+            await self._message_shard_queues[shard_index].put(message)
+        else:
+            await self._message_queue.put(message)
 
     async def add_xp_action(self,
                             guild_id: int,
@@ -77,65 +137,196 @@ class XPService:
         )
         await self._action_queue.put(xp_action)
 
+    async def start_consumers(self):
+        """
+        Start the long-lived XP message consumer tasks (one per shard if sharded) and the XP action consumer task.
+        To be called once on startup.
+        """
+        if self._consumer_tasks:
+            return
+        if self.message_consumer_is_sharded:
+            for shard_queue, shard_lag_histogram in zip(self._message_shard_queues, self._message_shard_lag_histograms):
+                self._consumer_tasks.append(create_isolated_task(
+                    self._message_consumer(message_queue=shard_queue, lag_histogram=shard_lag_histogram)
+                ))
+        else:
+            self._consumer_tasks.append(create_isolated_task(self._message_consumer(message_queue=self._message_queue)))
+        self._consumer_tasks.append(create_isolated_task(self._xp_action_consumer()))
+        self.logger.info(f"Started {len(self._consumer_tasks) - 1} XP message consumers and an XP action consumer.",
+                         category=AppLogCategory.APP_GENERAL)
+
+    @staticmethod
+    async def _get_queue_batch(queue: asyncio.Queue) -> list:
+        """
+        Wait for an item, then keep taking items until XP_CONSUMER_BATCH_SIZE are taken or XP_CONSUMER_BATCH_WAIT_MS
+        have passed since the first one.
+        Args:
+            queue (asyncio.Queue): Queue to take items from.
+
+        Returns:
+            list: The items, in queue order.
+        """
+        items = [await queue.get()]
+        deadline = time.monotonic() + XP_CONSUMER_BATCH_WAIT_MS / 1000
+        while len(items) < XP_CONSUMER_BATCH_SIZE:
+            if not queue.empty():
+                items.append(queue.get_nowait())
+                continue
+            if (timeout := deadline - time.monotonic()) <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _message_consumer(self,
+                                message_queue: asyncio.Queue[discord.Message],
+                                lag_histogram: metrics.Histogram | None = None):
+        """
+        Consume a message queue forever, processing messages in micro-batches under one DB session each.
+        With sharding, a member always maps to the same shard, so messages of one member are processed in order.
+        Args:
+            message_queue (asyncio.Queue[discord.Message]): The message queue (or shard queue) to consume.
+            lag_histogram (metrics.Histogram | None): Shard lag histogram to record to, if any.
+        """
+        while True:
+            messages = await self._get_queue_batch(message_queue)
+            self._message_batch_size_histogram.observe(len(messages))
+            try:
+                await self._process_message_batch(messages=messages, lag_histogram=lag_histogram)
+            except Exception as e:
+                self.logger.error(f"Error while processing {len(messages)} messages for XP: {e}\n"
+                                  f"{traceback.format_exc()}")
+            finally:
+                for _ in messages:
+                    message_queue.task_done()
+
     @require_db_session
-    @periodic_worker(name=BackgroundWorker.XP_MESSAGE_QUEUE_CONSUMER)
-    async def message_consumer(self):
+    async def _process_message_batch(self,
+                                     messages: list[discord.Message],
+                                     lag_histogram: metrics.Histogram | None = None):
+        await self._process_messages(messages=messages, lag_histogram=lag_histogram)
+
+    async def _process_messages(self, messages: list[discord.Message], lag_histogram: metrics.Histogram | None = None):
         """
-        Consume messages from the queue and process them for XP.
+        Coalesce messages into per-member XP events and process them.
+        Args:
+            messages (list[discord.Message]): Messages taken off a message queue.
+            lag_histogram (metrics.Histogram | None): Shard lag histogram to record to, if any.
         """
-        while not self._message_queue.empty():
-            message = await self._message_queue.get()
+        if not messages:
+            return
+        self._processed_messages_rate.increment(len(messages))
+        for message_event in await self._coalesce_messages(messages):
+            try:
+                await self._process_message_event(message_event)
+            except Exception as e:
+                self.logger.error(f"Error while processing {message_event} for XP: {e}\n{traceback.format_exc()}")
+            lag = (datetime.now(UTC) - message_event.first_message_time).total_seconds()
+            self._message_lag_histogram.observe(lag)
+            if lag_histogram:
+                lag_histogram.observe(lag)
 
-            guild_settings = await self.guild_settings_component.get_guild_settings(message.guild.id)
-            if not guild_settings.xp_settings.xp_gain_enabled or \
-                    message.channel.id in guild_settings.xp_settings.ignored_channel_ids or \
-                    guild_settings.xp_settings.ignored_role_ids.intersection({role.id for role
-                                                                              in message.author.roles}):
-                self._message_queue.task_done()
+    async def _coalesce_messages(self, messages: list[discord.Message]) -> list[XPMessageEvent]:
+        """
+        Fold messages into one XP event per (guild_id, member_id), dropping messages that are not eligible for XP.
+        Guild settings are looked up once per guild instead of once per message.
+        Args:
+            messages (list[discord.Message]): Messages in the order they were queued.
+        Returns:
+            list[XPMessageEvent]: Aggregated events, ordered by each member's first message.
+        """
+        xp_settings_map: dict[int, CachedGuildSettings.XPSettings] = {}
+        message_events: dict[tuple[int, int], XPMessageEvent] = {}
+        ignored_member_keys: set[tuple[int, int]] = set()
+        for message in messages:
+            member_key = (message.guild.id, message.author.id)
+            if member_key in ignored_member_keys:
+                continue
+            if message.guild.id not in xp_settings_map:
+                xp_settings_map[message.guild.id] = \
+                    (await self.guild_settings_component.get_guild_settings(message.guild.id)).xp_settings
+            xp_settings = xp_settings_map[message.guild.id]
+            if not xp_settings.xp_gain_enabled or message.channel.id in xp_settings.ignored_channel_ids:
                 continue
 
-            if self._member_lock_map[(message.guild.id, message.author.id)].locked():
-                self._message_queue.task_done()  # member being processed by another worker, get back to it later
-                await self._message_queue.put(message)
+            if message_event := message_events.get(member_key):
+                message_event.add_message(channel_id=message.channel.id,
+                                          message_time=message.created_at,
+                                          is_booster=message.author.premium_since is not None)
+                continue
+            if xp_settings.ignored_role_ids.intersection({role.id for role in message.author.roles}):
+                ignored_member_keys.add(member_key)
                 continue
+            message_events[member_key] = XPMessageEvent(
+                guild_id=message.guild.id,
+                member_id=message.author.id,
+                username=get_user_username_for_xp(message.author),
+                channel_id=message.channel.id,
+                message_time=message.created_at,
+                is_booster=message.author.premium_since is not None
+            )
+        self._processed_message_events_rate.increment(len(message_events))
+        return list(message_events.values())
 
-            async with self._global_xp_lock:
-                async with self._member_lock_map[(message.guild.id, message.author.id)]:
-                    level_updated = await self.xp_processing_component.on_user_message(
-                        user_id=message.author.id,
-                        guild_id=message.guild.id,
-                        message_time=message.created_at,
-                        user_username=get_user_username_for_xp(message.author),
-                        is_booster=message.author.premium_since is not None,
+    async def _process_message_event(self, message_event: XPMessageEvent):
+        """
+        Process an aggregated message event for XP gain, handling level updates if any.
+        Args:
+            message_event (XPMessageEvent): The event to process.
+        """
+        async with self._global_xp_lock.read():
+            async with self._member_lock_map[(message_event.guild_id, message_event.member_id)]:
+                level_updated = await self.xp_processing_component.on_user_message(
+                    user_id=message_event.member_id,
+                    guild_id=message_event.guild_id,
+                    message_time=message_event.latest_message_time,
+                    user_username=message_event.username,
+                    is_booster=message_event.is_booster,
+                    message_count=message_event.message_count,
+                )
+                if level_updated:
+                    self.queue_level_update(
+                        guild_id=message_event.guild_id,
+                        user_id=message_event.member_id,
+                        level_change_reason="XP - level up from message",
+                        channel_id=message_event.channel_id,
                     )
-                    if level_updated:
-                        await self.handle_roles_and_level_up_message_on_level_update(
-                            guild_id=message.guild.id,
-                            user_id=message.author.id,
-                            level_change_reason="XP - level up from message",
-                            channel_id=message.channel.id,
-                        )
 
-            self._message_queue.task_done()
+    async def _xp_action_consumer(self):
+        """
+        Consume XP actions forever, processing them in micro-batches under one DB session each.
+        """
+        while True:
+            xp_actions = await self._get_queue_batch(self._action_queue)
+            self._action_batch_size_histogram.observe(len(xp_actions))
+            try:
+                await self._process_xp_actions(xp_actions)
+            except Exception as e:
+                self.logger.error(f"Error while processing {len(xp_actions)} XP actions: {e}\n"
+                                  f"{traceback.format_exc()}")
+            finally:
+                for _ in xp_actions:
+                    self._action_queue.task_done()
 
     @require_db_session
-    @periodic_worker(name=BackgroundWorker.XP_ACTION_QUEUE_CONSUMER)
-    async def xp_action_consumer(self):
+    async def _process_xp_actions(self, xp_actions: list[XPAction]):
         """
-        Consume XP actions from the queue and process them.
+        Process XP actions in order, handling level updates if any.
+        Args:
+            xp_actions (list[XPAction]): Actions taken off the action queue.
         """
-        while not self._action_queue.empty():
-            xp_action: XPAction = await self._action_queue.get()
-            async with self._global_xp_lock:
+        for xp_action in xp_actions:
+            async with self._global_xp_lock.read():
                 async with self._member_lock_map[(xp_action.guild_id, xp_action.member_id)]:
                     level_updated = await self.xp_processing_component.on_user_xp_action(xp_action=xp_action)
                     if level_updated:
-                        await self.handle_roles_and_level_up_message_on_level_update(
+                        self.queue_level_update(
                             guild_id=xp_action.guild_id,
                             user_id=xp_action.member_id,
                             level_change_reason="XP update from direct XP action",
                         )
-            self._action_queue.task_done()
 
     @require_db_session
     @periodic_worker(name=BackgroundWorker.XP_DECAY_QUEUE_PRODUCER)
@@ -147,24 +338,22 @@ class XPService:
 
         guild_ids = list(cache.CACHED_GUILD_XP.keys())
         for guild_id in guild_ids:
-            cached_guild_xp = cache.CACHED_GUILD_XP[guild_id]
+            if not (cached_guild_xp := cache.CACHED_GUILD_XP.get(guild_id)):
+                continue  # evicted meanwhile
             guild_settings = await self.guild_settings_component.get_guild_settings(guild_id)
             if guild_settings.xp_settings.xp_decay_enabled:
-                decay_grace_days = guild_settings.xp_settings.xp_decay_grace_period_days
-                decay_cutoff = datetime.now(UTC) - timedelta(days=decay_grace_days)
-                for member_xp in cached_guild_xp.get_xps_with_last_message_time_before(decay_cutoff):
+                now = datetime.now(UTC)
+                for member_xp in cached_guild_xp.pop_decay_due_xps(
+                        grace_days=guild_settings.xp_settings.xp_decay_grace_period_days, time=now
+                ):
                     if (guild_id, member_xp.user_id) in self._guild_members_pending_decay:
                         continue
-                    if member_xp.latest_decay_time:
-                        next_decay = member_xp.latest_decay_time + timedelta(days=1)
-                    else:
-                        next_decay = member_xp.latest_message_time + timedelta(days=decay_grace_days)
                     self.logger.debug(f"Queuing user {member_xp.user_username} for XP decay in guild {guild_id}")
                     await self._decay_queue.put(XPDecayItem(
                         guild_id=guild_id,
                         member_id=member_xp.user_id,
                         username=member_xp.user_username,
-                        next_decay=next_decay
+                        next_decay=now
                     ))
                     async with self._member_lock_map[(guild_id, member_xp.user_id)]:
                         self._guild_members_pending_decay.add((guild_id, member_xp.user_id))
@@ -173,50 +362,133 @@ class XPService:
     @periodic_worker(name=BackgroundWorker.XP_DECAY_QUEUE_CONSUMER, initial_delay=30)
     async def decay_consumer(self):
         """
-        Consume XP decay items from the decay queue and process them.
+        Consume due XP decay items from the decay queue and process them in bulk, in batches per guild.
+        The global XP lock is only held while a batch is applied, and role updates are only triggered for members
+        whose level actually changed.
         """
+        guild_member_ids_map: dict[int, list[int]] = defaultdict(list)
         while not self._decay_queue.empty():
-            if (decay_item := await self._decay_queue.get()).next_decay <= datetime.now(UTC):
-                self.logger.debug(f"Processing XP decay for user {decay_item.username} in guild {decay_item.guild_id}")
-                async with self._global_xp_lock:
-                    async with self._member_lock_map[(decay_item.guild_id, decay_item.member_id)]:
-                        level_updated = await self.xp_processing_component.process_user_xp_decay(decay_item=decay_item)
-                        if level_updated:
-                            await self.handle_roles_and_level_up_message_on_level_update(
-                                guild_id=decay_item.guild_id,
-                                user_id=decay_item.member_id,
-                                level_change_reason="Level adjustment from XP decay",
-                            )
-                self._decay_queue.task_done()
-            else:
-                self._decay_queue.task_done()
-                await self._decay_queue.put(decay_item)
+            decay_item = self._decay_queue.get_nowait()
+            self._decay_queue.task_done()
+            if decay_item.next_decay > datetime.now(UTC):
+                await self._decay_queue.put(decay_item)  # the queue is ordered by next decay, nothing else is due
                 break
+            guild_member_ids_map[decay_item.guild_id].append(decay_item.member_id)
+
+        for guild_id, member_ids in guild_member_ids_map.items():
+            for member_ids_batch in batched(member_ids, XP_DECAY_BATCH_SIZE):
+                self.logger.debug(f"Processing XP decay for {len(member_ids_batch)} members in guild {guild_id}")
+                batch_start = time.perf_counter()
+                try:
+                    async with self._global_xp_lock.read():
+                        level_updated_member_ids = await self.xp_processing_component.process_guild_xp_decay(
+                            guild_id=guild_id,
+                            member_ids=member_ids_batch
+                        )
+                except Exception as e:
+                    self.logger.error(f"Error while processing XP decay for guild {guild_id}: {e}\n"
+                                      f"{traceback.format_exc()}")
+                    level_updated_member_ids = []
+                finally:
+                    for member_id in member_ids_batch:
+                        self._guild_members_pending_decay.discard((guild_id, member_id))
+                self._decay_batch_duration_histogram.observe(time.perf_counter() - batch_start)
+                self._decayed_members_rate.increment(len(member_ids_batch))
+
+                for member_id in level_updated_member_ids:
+                    self.queue_level_update(
+                        guild_id=guild_id,
+                        user_id=member_id,
+                        level_change_reason="Level adjustment from XP decay",
+                    )
+                await asyncio.sleep(0)  # let message processing run between batches
 
     @require_db_session
     @periodic_worker(name=BackgroundWorker.XP_DB_SYNC)
     async def xp_sync_to_database(self):
         """
-        Periodically sync the cached XP data back to the database.
+        Periodically sync the cached XP data back to the database, then evict guild XP over the cache budget.
         """
-        async with self._global_xp_lock:
+        async with self._global_xp_lock.write():
             await self.guild_user_xp_component.sync_up_guild_user_xp()
+            self.guild_user_xp_component.evict_guild_xp_cache()
 
-    @staticmethod
-    async def handle_roles_and_level_up_message_on_level_update(guild_id: int, user_id: int,
-                                                                level_change_reason: str, channel_id: int = None):
+    def queue_level_update(self, guild_id: int, user_id: int, level_change_reason: str, channel_id: int = None):
         """
-        Handle roles and level up message on level update.
+        Queue level role and level-up message handling for a member whose level was updated.
+        Updates are handled per guild, outside the XP locks, after a short debounce. Their Discord API calls are rate
+        limited.
+        Repeated updates of a member that is still queued are coalesced into one. A level-up message is only sent if
+        a later update did not bring the member back below the level it is for.
         Args:
             guild_id (int): The guild ID.
             user_id (int): The user ID.
             level_change_reason (str): The reason for the level change.
             channel_id (int | None): The channel ID to send the level up message to (from message events).
         """
+        level_up_message_level = None
+        if channel_id and (guild_xp := cache.CACHED_GUILD_XP.get(guild_id)) \
+                and (member_xp := guild_xp.get_xp_for(user_id)):
+            level_up_message_level = member_xp.level
+        guild_level_updates = self._pending_level_updates.setdefault(guild_id, {})
+        if level_update := guild_level_updates.get(user_id):
+            level_update.add_update(level_change_reason=level_change_reason, channel_id=channel_id,
+                                    level_up_message_level=level_up_message_level)
+            self._coalesced_level_updates_counter.increment()
+        else:
+            guild_level_updates[user_id] = XPLevelUpdate(guild_id=guild_id, member_id=user_id,
+                                                         level_change_reason=level_change_reason,
+                                                         channel_id=channel_id,
+                                                         level_up_message_level=level_up_message_level)
+        if guild_id not in self._level_update_tasks:
+            self._level_update_tasks[guild_id] = create_isolated_task(self._level_update_consumer(guild_id))
+
+    async def _level_update_consumer(self, guild_id: int):
+        """
+        Handle the queued level updates of a guild until none are left, then exit.
+        Args:
+            guild_id (int): The guild ID.
+        """
+        try:
+            await asyncio.sleep(LEVEL_UPDATE_DEBOUNCE_SECONDS)
+            rate_limiter = self._level_update_rate_limiters[guild_id]
+            while guild_level_updates := self._pending_level_updates.get(guild_id):
+                level_update = guild_level_updates.pop(next(iter(guild_level_updates)))
+                try:
+                    await self._handle_level_update(level_update, rate_limiter=rate_limiter)
+                except Exception as e:
+                    self.logger.error(f"Error while handling {level_update}: {e}\n{traceback.format_exc()}")
+                self._handled_level_updates_rate.increment()
+        finally:
+            self._level_update_tasks.pop(guild_id, None)
+            if not self._pending_level_updates.get(guild_id):
+                self._pending_level_updates.pop(guild_id, None)
+            self._prune_level_update_rate_limiters()
+
+    def _prune_level_update_rate_limiters(self):
+        """
+        Drop the rate limiters of guilds without a level update consumer once they have refilled, as a new one would
+        behave the same. Limiters of idle guilds are thus only kept while they still hold back a burst.
+        """
+        for guild_id in [guild_id for guild_id, rate_limiter in self._level_update_rate_limiters.items()
+                         if guild_id not in self._level_update_tasks and rate_limiter.is_full]:
+            del self._level_update_rate_limiters[guild_id]
+
+    @staticmethod
+    @require_db_session
+    async def _handle_level_update(level_update: XPLevelUpdate, rate_limiter: TokenBucket):
+        """
+        Handle roles and level up message for a queued level update.
+        Args:
+            level_update (XPLevelUpdate): The level update to handle.
+            rate_limiter (TokenBucket): The guild's rate limiter, taken from before each Discord API call.
+        """
         from bot.utils.bot_actions.xp_actions import handle_roles_and_level_up_message_on_level_update
         await handle_roles_and_level_up_message_on_level_update(
-            guild_id=guild_id,
-            user_id=user_id,
-            level_change_reason=level_change_reason,
-            channel_id=channel_id
+            guild_id=level_update.guild_id,
+            user_id=level_update.member_id,
+            level_change_reason=level_update.level_change_reason,
+            channel_id=level_update.channel_id,
+            level_up_message_level=level_update.level_up_message_level,
+            rate_limiter=rate_limiter
         )